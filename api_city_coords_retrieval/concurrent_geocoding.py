@@ -0,0 +1,131 @@
+import csv
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .gazetteer import Gazetteer
+from .geocoding import Geocoder, GeocodingBackend, GeocodingCache, GeocodingError, normalize_query
+
+
+def create_pooled_session(pool_size: int) -> requests.Session:
+    # Worker threads share the session, so the pool has to be at least as large as the worker count
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_second: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self._interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._sleep = sleep
+
+    def acquire(self):
+        # Reserve the next slot under the lock, then sleep outside of it
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_allowed)
+            self._next_allowed = slot + self._interval
+
+        delay = slot - now
+        if delay > 0:
+            self._sleep(delay)
+
+
+class RetryPolicy:
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        # Exponential backoff with jitter so throttled workers don't retry in lockstep
+        backoff = min(self.base_delay * (2 ** attempt), self.max_delay)
+        return backoff * random.uniform(0.5, 1.0)
+
+
+class ConcurrentGeocoder(Geocoder):
+
+    def __init__(self,
+                 backend: GeocodingBackend,
+                 cache: GeocodingCache = None,
+                 max_workers: int = 8,
+                 requests_per_second: float = 10.0,
+                 retry_policy: RetryPolicy = None,
+                 gazetteer: Gazetteer = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__(backend=backend, cache=cache, gazetteer=gazetteer)
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second, clock=clock, sleep=sleep)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._sleep = sleep
+
+    def _fetch(self, query: str) -> tuple[float, float] | None:
+        # Every attempt, retries included, waits for a rate limit slot
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self.backend.geocode(query)
+            except GeocodingError as e:
+                if not e.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+
+                delay = self.retry_policy.delay(attempt, retry_after=e.retry_after)
+                logging.info(f"Retrying '{query}' in {delay:.2f}s after: {e}")
+                self._sleep(delay)
+                attempt += 1
+
+    def geocode_many(self, cities: Iterable[tuple[str, str]]) -> Iterator[tuple[str, str, tuple[float, float] | None]]:
+        # Gazetteer and cache hits are yielded straight away and never use a worker or a rate limit slot
+        misses = dict()
+        for city, state in cities:
+            hit, coords = self.lookup_offline(city, state)
+            if hit:
+                yield city, state, coords
+                continue
+
+            # Spellings of the same place are only sent to the backend once
+            misses.setdefault(normalize_query(city, state), []).append((city, state))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.geocode_online, *places[0]): places for places in misses.values()}
+            for future in as_completed(futures):
+                coords = future.result()
+                for city, state in futures[future]:
+                    yield city, state, coords
+
+
+def stream_city_coords(results: Iterable[tuple[str, str, tuple[float, float] | None]], output_path: str) -> int:
+    # Rows are flushed as they arrive so a long run keeps its progress if it's interrupted
+    rows_written = 0
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['city', 'latitude', 'longitude'])
+        for city, state, coords in results:
+            if coords is None:
+                continue
+
+            output_name = f"{city}, {state}".replace(', IA', '') if state else city
+            writer.writerow([output_name, coords[0], coords[1]])
+            f.flush()
+            rows_written += 1
+
+    return rows_written
@@ -0,0 +1,149 @@
+import difflib
+import math
+
+import pandas as pd
+from rtree import index
+
+from .geocoding import normalize_query
+
+_DEFAULT_STATE = 'IA'
+
+_EARTH_RADIUS_KM = 6371.0
+
+
+def _split_place_name(place_name: str) -> tuple[str, str]:
+    # city_coords.csv stores Iowa cities without their state, e.g. "Nora Springs" next to "Macomb, IL"
+    if ',' in place_name:
+        city, state = place_name.rsplit(',', 1)
+        return city.strip(), state.strip()
+    return place_name.strip(), _DEFAULT_STATE
+
+
+def _to_unit_vector(latitude: float, longitude: float) -> tuple[float, float, float]:
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def haversine_km(lat_1: float, lon_1: float, lat_2: float, lon_2: float) -> float:
+    phi_1, phi_2 = math.radians(lat_1), math.radians(lat_2)
+    d_phi = phi_2 - phi_1
+    d_lambda = math.radians(lon_2 - lon_1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi_1) * math.cos(phi_2) * math.sin(d_lambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GazetteerEntry:
+    __slots__ = ('place_name', 'city', 'state', 'latitude', 'longitude')
+
+    def __init__(self, place_name: str, city: str, state: str, latitude: float, longitude: float):
+        self.place_name = place_name
+        self.city = city
+        self.state = state
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def coords(self) -> tuple[float, float]:
+        return self.latitude, self.longitude
+
+
+class Gazetteer:
+
+    def __init__(self, entries: list[GazetteerEntry], fuzzy_cutoff: float = 0.85):
+        self.entries = entries
+        self.fuzzy_cutoff = fuzzy_cutoff
+
+        # Exact index on the normalized "city, state" query
+        self._by_query = dict()
+        # Name-only index so "Macomb" finds "Macomb, IL" when the state isn't known
+        self._by_city = dict()
+        # Trigram index that narrows the fuzzy candidates before scoring them
+        self._by_trigram = dict()
+        # 3D rtree over unit vectors, where the nearest chord is also the nearest great circle distance
+        self._spatial_idx = index.Index(properties=index.Property(dimension=3))
+
+        for entry_id, entry in enumerate(entries):
+            query = normalize_query(entry.city, entry.state)
+            self._by_query.setdefault(query, entry_id)
+            city_key = normalize_query(entry.city)
+            self._by_city.setdefault(city_key, []).append(entry_id)
+            for trigram in _trigrams(query):
+                self._by_trigram.setdefault(trigram, set()).add(entry_id)
+
+            if not (math.isnan(entry.latitude) or math.isnan(entry.longitude)):
+                point = _to_unit_vector(entry.latitude, entry.longitude)
+                self._spatial_idx.insert(entry_id, point + point)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, **kwargs):
+        df = df.dropna(subset=['city'])
+        entries = []
+        for place_name, latitude, longitude in zip(df['city'], df['latitude'], df['longitude']):
+            city, state = _split_place_name(place_name)
+            entries.append(GazetteerEntry(place_name=place_name, city=city, state=state,
+                                          latitude=float(latitude), longitude=float(longitude)))
+        return cls(entries, **kwargs)
+
+    @classmethod
+    def from_csv(cls, city_coords_path: str, extra_place_paths: list[str] = None, **kwargs):
+        # Later files only add places the earlier ones don't already have
+        paths = [city_coords_path] + list(extra_place_paths or [])
+        df = pd.concat([pd.read_csv(path, usecols=['city', 'latitude', 'longitude']) for path in paths],
+                       ignore_index=True)
+        return cls.from_dataframe(df, **kwargs)
+
+    def lookup_exact(self, city: str, state: str = None) -> GazetteerEntry | None:
+        if state is None:
+            city, state = _split_place_name(city)
+
+        entry_id = self._by_query.get(normalize_query(city, state))
+        return self.entries[entry_id] if entry_id is not None else None
+
+    def lookup_fuzzy(self, city: str, state: str = None) -> GazetteerEntry | None:
+        # A bare name that matches exactly one place is unambiguous, whatever its state
+        if state is None and ',' not in city:
+            entry_ids = self._by_city.get(normalize_query(city), [])
+            if len(entry_ids) == 1:
+                return self.entries[entry_ids[0]]
+
+        if state is None:
+            city, state = _split_place_name(city)
+        query = normalize_query(city, state)
+
+        candidate_counts = dict()
+        for trigram in _trigrams(query):
+            for entry_id in self._by_trigram.get(trigram, ()):
+                candidate_counts[entry_id] = candidate_counts.get(entry_id, 0) + 1
+
+        best_entry_id, best_ratio = None, self.fuzzy_cutoff
+        # Only the candidates sharing the most trigrams are worth a full comparison
+        for entry_id in sorted(candidate_counts, key=lambda e: (-candidate_counts[e], e))[:25]:
+            entry = self.entries[entry_id]
+            ratio = difflib.SequenceMatcher(None, query, normalize_query(entry.city, entry.state)).ratio()
+            if ratio > best_ratio:
+                best_entry_id, best_ratio = entry_id, ratio
+
+        return self.entries[best_entry_id] if best_entry_id is not None else None
+
+    def lookup(self, city: str, state: str = None) -> GazetteerEntry | None:
+        return self.lookup_exact(city, state) or self.lookup_fuzzy(city, state)
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> list[tuple[GazetteerEntry, float]]:
+        point = _to_unit_vector(latitude, longitude)
+        entry_ids = list(self._spatial_idx.nearest(point + point, k))[:k]
+        results = [
+            (self.entries[entry_id],
+             haversine_km(latitude, longitude, self.entries[entry_id].latitude, self.entries[entry_id].longitude))
+            for entry_id in entry_ids
+        ]
+        return sorted(results, key=lambda result: result[1])
+
+    def reverse_lookup(self, latitude: float, longitude: float) -> GazetteerEntry | None:
+        nearest = self.nearest(latitude, longitude, k=1)
+        return nearest[0][0] if nearest else None
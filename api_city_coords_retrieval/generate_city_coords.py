@@ -1,54 +1,33 @@
+import os
+
 import pandas as pd
-import requests
 
+from api_city_coords_retrieval.concurrent_geocoding import ConcurrentGeocoder, create_pooled_session, stream_city_coords
+from api_city_coords_retrieval.gazetteer import Gazetteer
+from api_city_coords_retrieval.geocoding import AzureMapsBackend, GeocodingCache
 
 cities_file_path = "C:/Users/austisnyder/programming/programming_i_o_files/resources/all_worksite_cities.csv"
-cities_df = pd.read_csv(cities_file_path)
+output_file_path = "C:/Users/austisnyder/programming/programming_i_o_files/vcc_maps/city_coords.csv"
+geocoding_cache_path = "C:/Users/austisnyder/programming/programming_i_o_files/vcc_maps/geocoding_cache.sqlite"
 
 subscription_key = '3pg63za6h9pgEr5EyONLcWBpVsyRAGYoxP5dPv6gMeoNJ27G0J5ZJQQJ99AIACYeBjFNuXIHAAAgAZMPRRNZ'
 endpoint_url = 'https://atlas.microsoft.com/search/address/json'
 
-city_coords = {
-    'city': [],
-    'latitude': [],
-    'longitude': []
-}
-
-
-def get_city_coords(row):
-    api_input_name = f"{row['City']}, {row['State']}"
-
-    output_name = api_input_name.replace(', IA', '')
-
-    params = {
-        'subscription-key': subscription_key,
-        'api-version': '1.0',
-        'query': api_input_name
-    }
-
-    # Make the request to Azure Maps
-    response = requests.get(endpoint_url, params=params)
-
-    # Check if the request was successful
-    if response.status_code == 200:
-        data = response.json()
-        # Extract the first result from the response
-        if 'results' in data and len(data['results']) > 0:
-            first_result = data['results'][0]
-            coordinates = first_result['position']
-            city_coords['city'].append(output_name)
-            city_coords['latitude'].append(coordinates['lat'])
-            city_coords['longitude'].append(coordinates['lon'])
-        else:
-            print(f"No results found for {api_input_name}.")
-    else:
-        print(f"Error: {response.status_code}")
-
-
-cities_df.apply(get_city_coords, axis=1)
-
-df = pd.DataFrame(city_coords)
-df.to_csv("C:/Users/austisnyder/programming/programming_i_o_files/vcc_maps/city_coords.csv")
-
-
-
+max_workers = 8
+requests_per_second = 10.0
+
+
+if __name__ == '__main__':
+    backend = AzureMapsBackend(subscription_key=subscription_key,
+                               endpoint_url=endpoint_url,
+                               session=create_pooled_session(pool_size=max_workers))
+    # Cities from the previous run resolve offline, only new ones are sent to the API
+    gazetteer = Gazetteer.from_csv(output_file_path) if os.path.exists(output_file_path) else None
+    geocoder = ConcurrentGeocoder(backend=backend,
+                                  cache=GeocodingCache(geocoding_cache_path),
+                                  gazetteer=gazetteer,
+                                  max_workers=max_workers,
+                                  requests_per_second=requests_per_second)
+    cities_df = pd.read_csv(cities_file_path)
+    results = geocoder.geocode_many(zip(cities_df['City'], cities_df['State']))
+    stream_city_coords(results, output_path=output_file_path)
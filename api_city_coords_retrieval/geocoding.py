@@ -0,0 +1,200 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+import pandas as pd
+import requests
+
+
+class GeocodingError(Exception):
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        # Rate limiting and server errors are worth retrying, anything else isn't
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def normalize_query(city: str, state: str = None) -> str:
+    # "  nora springs , ia" and "Nora Springs, IA" share one cache entry
+    query = f"{city}, {state}" if state else city
+    parts = [' '.join(part.split()) for part in query.split(',')]
+    return ', '.join(part for part in parts if part).casefold()
+
+
+class GeocodingBackend(ABC):
+
+    @abstractmethod
+    def geocode(self, query: str) -> tuple[float, float] | None:
+        # Returns (latitude, longitude), None when the provider has no result, and raises GeocodingError on failure
+        pass
+
+
+class AzureMapsBackend(GeocodingBackend):
+
+    def __init__(self,
+                 subscription_key: str,
+                 endpoint_url: str = 'https://atlas.microsoft.com/search/address/json',
+                 session: requests.Session = None,
+                 timeout: float = 10.0):
+        self.subscription_key = subscription_key
+        self.endpoint_url = endpoint_url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def geocode(self, query: str) -> tuple[float, float] | None:
+        params = {
+            'subscription-key': self.subscription_key,
+            'api-version': '1.0',
+            'query': query
+        }
+        try:
+            response = self.session.get(self.endpoint_url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GeocodingError(f"Request for '{query}' failed: {e}", retryable=True) from e
+
+        if response.status_code != 200:
+            retry_after = response.headers.get('Retry-After')
+            raise GeocodingError(f"Request for '{query}' returned status {response.status_code}.",
+                                 retryable=response.status_code == 429 or response.status_code >= 500,
+                                 retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+        data = response.json()
+        if 'results' not in data or len(data['results']) == 0:
+            return None
+
+        coordinates = data['results'][0]['position']
+        return coordinates['lat'], coordinates['lon']
+
+
+class FixtureBackend(GeocodingBackend):
+
+    def __init__(self, fixture: dict[str, tuple[float, float]]):
+        self._fixture = {normalize_query(query): coords for query, coords in fixture.items()}
+        self.queries = []
+
+    @classmethod
+    def from_csv(cls, fixture_path: str):
+        # Same layout as vcc_maps/city_coords.csv, where Iowa cities are stored without their state
+        df = pd.read_csv(fixture_path).dropna(subset=['city'])
+        return cls({
+            city if ',' in city else f"{city}, IA": (lat, lon)
+            for city, lat, lon in zip(df['city'], df['latitude'], df['longitude'])
+        })
+
+    def geocode(self, query: str) -> tuple[float, float] | None:
+        self.queries.append(query)
+        return self._fixture.get(normalize_query(query))
+
+
+class GeocodingCache:
+
+    def __init__(self,
+                 db_path: str,
+                 ttl_seconds: float = 365 * 24 * 3600,
+                 negative_ttl_seconds: float = 7 * 24 * 3600,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # One connection is shared between geocoding threads, so every statement goes through the lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "query TEXT PRIMARY KEY, "
+            "latitude REAL, "
+            "longitude REAL, "
+            "found INTEGER NOT NULL, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, query: str, now: float = None) -> tuple[bool, tuple[float, float] | None]:
+        # Returns (hit, coords). A hit with coords of None is a cached "no result"
+        now = now if now is not None else self._clock()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT latitude, longitude, found, fetched_at FROM geocodes WHERE query = ?", (query,)
+            ).fetchone()
+        if row is None:
+            return False, None
+
+        latitude, longitude, found, fetched_at = row
+        ttl = self.ttl_seconds if found else self.negative_ttl_seconds
+        if now - fetched_at > ttl:
+            return False, None
+
+        return True, (latitude, longitude) if found else None
+
+    def put(self, query: str, coords: tuple[float, float] | None, now: float = None):
+        now = now if now is not None else self._clock()
+        latitude, longitude = coords if coords is not None else (None, None)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO geocodes (query, latitude, longitude, found, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (query, latitude, longitude, int(coords is not None), now)
+            )
+            self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class Geocoder:
+
+    def __init__(self, backend: GeocodingBackend, cache: GeocodingCache = None, gazetteer: 'Gazetteer' = None):
+        self.backend = backend
+        self.cache = cache
+        self.gazetteer = gazetteer
+
+    def lookup_offline(self, city: str, state: str = None) -> tuple[bool, tuple[float, float] | None]:
+        # Returns (hit, coords) from the gazetteer, then the cache, without going near the backend
+        if self.gazetteer:
+            entry = self.gazetteer.lookup_exact(city, state)
+            if entry:
+                return True, entry.coords
+
+        if self.cache:
+            return self.cache.get(normalize_query(city, state))
+
+        return False, None
+
+    def _fetch(self, query: str) -> tuple[float, float] | None:
+        return self.backend.geocode(query)
+
+    def geocode_online(self, city: str, state: str = None) -> tuple[float, float] | None:
+        query = f"{city}, {state}" if state else city
+        try:
+            coords = self._fetch(query)
+        except GeocodingError as e:
+            # Failures aren't cached so the next run tries again
+            logging.error(e)
+            return None
+
+        if coords is None:
+            logging.warning(f"No results found for {query}.")
+
+        if self.cache:
+            self.cache.put(normalize_query(city, state), coords)
+
+        return coords
+
+    def geocode(self, city: str, state: str = None) -> tuple[float, float] | None:
+        # Places already in the offline gazetteer or the cache never reach the backend
+        hit, coords = self.lookup_offline(city, state)
+        if hit:
+            return coords
+
+        return self.geocode_online(city, state)
@@ -16,8 +16,9 @@ class ConfigManager:
         if cls._initialized:
             return
 
-        config = configparser.ConfigParser()
-        self.config = config.read(config_path)
+        self.config = configparser.ConfigParser()
+        self.config.read(config_path)
+        cls._initialized = True
 
     def __call__(self, key: str, cast_type):
         value = self.config
@@ -0,0 +1 @@
+from .joined_data import JoinedDataStage, CityCoordsIndex, create_joined_data
@@ -0,0 +1,127 @@
+import logging
+
+import pandas as pd
+
+from api_city_coords_retrieval.gazetteer import Gazetteer
+from entities.ingest import VCC_COLUMN_DTYPES, invert_city_name_changes, normalize_hcp_ids
+
+RAW_COLUMN_RENAMES = {
+    'consultant': 'consultant_name'
+}
+
+JOINED_COLUMNS = ['specialty', 'visiting_city', 'visiting_site', 'visiting_lat', 'visiting_lon', 'frequency',
+                  'origin_site', 'origin_city', 'origin_lat', 'origin_lon', 'consultant_name', 'hcp_id']
+
+
+def normalize_city_keys(city_names: pd.Series) -> pd.Series:
+    # Iowa cities are stored without their state abbreviation in city_coords.csv
+    keys = city_names.astype(str).str.strip().str.replace(r'\s+', ' ', regex=True).str.casefold()
+    return keys.str.replace(r',\s*ia$', '', regex=True)
+
+
+class CityCoordsIndex:
+
+    def __init__(self, city_coords_df: pd.DataFrame):
+        index_df = pd.DataFrame({
+            'city_key': normalize_city_keys(city_coords_df['city']),
+            'lat': city_coords_df['latitude'].astype(float),
+            'lon': city_coords_df['longitude'].astype(float)
+        })
+        # First occurrence wins so the index stays unique for the many-to-one merge
+        self.index_df = index_df.drop_duplicates(subset='city_key').set_index('city_key')
+
+    @classmethod
+    def from_csv(cls, city_coords_path: str):
+        return cls(pd.read_csv(city_coords_path))
+
+    def join_coordinates(self, df: pd.DataFrame, city_column: str, prefix: str) -> pd.DataFrame:
+        keys = normalize_city_keys(df[city_column]).rename('city_key')
+        coords = self.index_df.reindex(keys.to_numpy())
+        df[f'{prefix}_lat'] = coords['lat'].to_numpy()
+        df[f'{prefix}_lon'] = coords['lon'].to_numpy()
+        return df
+
+
+class JoinedDataResult:
+
+    def __init__(self, df: pd.DataFrame, unmatched_cities: list[str]):
+        self.df = df
+        self.unmatched_cities = unmatched_cities
+
+
+class JoinedDataStage:
+
+    def __init__(self, city_coords_index: CityCoordsIndex, city_name_changes: dict = None, gazetteer: Gazetteer = None):
+        self.city_coords_index = city_coords_index
+        self.gazetteer = gazetteer
+        self._city_name_replacements = invert_city_name_changes(city_name_changes)
+
+    def normalize(self, raw_df: pd.DataFrame) -> pd.DataFrame:
+        df = raw_df.rename(columns=lambda column: column.strip().lstrip('\ufeff'))
+        df = df.rename(columns=RAW_COLUMN_RENAMES)
+
+        for column in ['origin_city', 'visiting_city', 'origin_site', 'visiting_site', 'specialty', 'consultant_name']:
+            df[column] = df[column].astype(str).str.strip()
+
+        for column in ['origin_city', 'visiting_city']:
+            df[column] = df[column].replace(self._city_name_replacements)
+
+        # Exports without provider ids carry the missing id sentinel, which the entity ingest understands
+        return normalize_hcp_ids(df)
+
+    def _resolve_unmatched(self, df: pd.DataFrame, city_column: str, prefix: str) -> pd.DataFrame:
+        # Names like "Omaha" or "Macomb, IL" miss the exact join but are unambiguous in the gazetteer
+        missing = df[f'{prefix}_lat'].isna()
+        for city_name in df.loc[missing, city_column].unique():
+            entry = self.gazetteer.lookup(city_name)
+            if entry is None:
+                continue
+
+            logging.info(f"Resolved '{city_name}' to '{entry.place_name}' with the gazetteer.")
+            rows = missing & (df[city_column] == city_name)
+            df.loc[rows, f'{prefix}_lat'] = entry.latitude
+            df.loc[rows, f'{prefix}_lon'] = entry.longitude
+
+        return df
+
+    def join(self, raw_df: pd.DataFrame) -> JoinedDataResult:
+        df = self.normalize(raw_df)
+        for city_column, prefix in [('origin_city', 'origin'), ('visiting_city', 'visiting')]:
+            df = self.city_coords_index.join_coordinates(df, city_column=city_column, prefix=prefix)
+            if self.gazetteer:
+                df = self._resolve_unmatched(df, city_column=city_column, prefix=prefix)
+
+        unmatched = pd.concat([
+            df.loc[df['origin_lat'].isna(), 'origin_city'],
+            df.loc[df['visiting_lat'].isna(), 'visiting_city']
+        ]).unique().tolist()
+        if unmatched:
+            logging.warning(f"No coordinates found for {len(unmatched)} cities: {sorted(unmatched)}")
+
+        df = df[JOINED_COLUMNS]
+        # Match the dtypes the entity ingest reads the joined data with, hcp_id stays an integer with its sentinel
+        df = df.astype({column: VCC_COLUMN_DTYPES[column] for column in JOINED_COLUMNS if column != 'hcp_id'})
+        return JoinedDataResult(df=df, unmatched_cities=sorted(unmatched))
+
+
+def write_joined_data(df: pd.DataFrame, output_path: str):
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    elif output_path.endswith('.feather'):
+        df.reset_index(drop=True).to_feather(output_path)
+    else:
+        df.to_csv(output_path, index=False)
+
+
+def create_joined_data(raw_data_path: str,
+                       city_coords_path: str,
+                       output_path: str,
+                       city_name_changes: dict = None,
+                       extra_place_paths: list[str] = None) -> JoinedDataResult:
+    stage = JoinedDataStage(city_coords_index=CityCoordsIndex.from_csv(city_coords_path),
+                            city_name_changes=city_name_changes,
+                            gazetteer=Gazetteer.from_csv(city_coords_path, extra_place_paths=extra_place_paths))
+    result = stage.join(pd.read_csv(raw_data_path, encoding='utf-8-sig'))
+    write_joined_data(result.df, output_path)
+    logging.info(f"Wrote {len(result.df)} joined rows to {output_path}.")
+    return result
@@ -0,0 +1,106 @@
+import numpy as np
+
+from .columnar import ColumnarEntitiesContainer
+from .entity_classes import AggregateCounters
+from .factory import EntitiesContainer
+
+
+class CityAggregates:
+
+    def __init__(self,
+                 cities: list,
+                 visiting_providers: np.ndarray,
+                 visiting_specialties: np.ndarray,
+                 leaving_providers: np.ndarray,
+                 worksites: np.ndarray,
+                 origin_cities: np.ndarray,
+                 visiting_clinics: np.ndarray):
+        # Every array is aligned with cities
+        self.cities = cities
+        self.visiting_providers = visiting_providers
+        self.visiting_specialties = visiting_specialties
+        self.leaving_providers = leaving_providers
+        self.worksites = worksites
+        self.origin_cities = origin_cities
+        self.visiting_clinics = visiting_clinics
+
+        self._ranges = dict()
+
+    def cities_in_range(self, aggregate: str, minimum: float, maximum: float = np.inf) -> frozenset:
+        # Same exclusive bounds the conditions controllers use, each range is one pass over the array
+        key = (aggregate, minimum, maximum)
+        if key not in self._ranges:
+            counts = getattr(self, aggregate)
+            indices = np.flatnonzero((counts > minimum) & (counts < maximum))
+            self._ranges[key] = frozenset(self.cities[idx] for idx in indices)
+
+        return self._ranges[key]
+
+
+class WorksiteAggregates:
+
+    def __init__(self,
+                 worksites: list,
+                 visiting_providers: np.ndarray,
+                 visiting_specialties: np.ndarray,
+                 leaving_providers: np.ndarray,
+                 origin_cities: np.ndarray):
+        # Every array is aligned with worksites
+        self.worksites = worksites
+        self.visiting_providers = visiting_providers
+        self.visiting_specialties = visiting_specialties
+        self.leaving_providers = leaving_providers
+        self.origin_cities = origin_cities
+
+
+def _distinct_counts(counters: list[AggregateCounters], aggregate: str) -> np.ndarray:
+    return np.fromiter((len(getattr(counter, aggregate)) for counter in counters), dtype=np.int32, count=len(counters))
+
+
+def _count_distinct(group_ids: np.ndarray, value_ids: np.ndarray, num_groups: int) -> np.ndarray:
+    # Distinct (group, value) pairs, then how many pairs each group has
+    pairs = np.unique(np.stack([group_ids, value_ids]), axis=1)
+    return np.bincount(pairs[0], minlength=num_groups).astype(np.int32)
+
+
+def create_columnar_city_aggregates(columnar: ColumnarEntitiesContainer, cities: list = None) -> CityAggregates:
+    num_cities = columnar.num_cities
+    origin_city_ids = columnar.origin_city_ids
+    visiting_city_ids = columnar.visiting_city_ids
+
+    return CityAggregates(
+        cities=cities if cities is not None else columnar.cities,
+        visiting_providers=_count_distinct(visiting_city_ids, columnar.provider_ids, num_cities),
+        visiting_specialties=_count_distinct(visiting_city_ids, columnar.specialty_ids, num_cities),
+        leaving_providers=_count_distinct(origin_city_ids, columnar.provider_ids, num_cities),
+        worksites=np.bincount(columnar.site_city_ids, minlength=num_cities).astype(np.int32),
+        origin_cities=_count_distinct(visiting_city_ids, origin_city_ids, num_cities),
+        visiting_clinics=_count_distinct(visiting_city_ids, columnar.visiting_site_ids, num_cities)
+    )
+
+
+def create_city_aggregates(container: EntitiesContainer) -> CityAggregates:
+    # The counters are kept up to date as assignments are linked and removed, so this is one pass over the cities
+    cities = list(container.cities)
+    counters = [city.counters for city in cities]
+    return CityAggregates(
+        cities=cities,
+        visiting_providers=_distinct_counts(counters, 'visiting_providers'),
+        visiting_specialties=_distinct_counts(counters, 'visiting_specialties'),
+        leaving_providers=_distinct_counts(counters, 'leaving_providers'),
+        worksites=np.fromiter((city.num_worksites for city in cities), dtype=np.int32, count=len(cities)),
+        origin_cities=_distinct_counts(counters, 'origin_cities'),
+        visiting_clinics=_distinct_counts(counters, 'visiting_clinics')
+    )
+
+
+def create_worksite_aggregates(container: EntitiesContainer) -> WorksiteAggregates:
+    worksites = list(container.worksites)
+    counters = [worksite.counters for worksite in worksites]
+    return WorksiteAggregates(
+        worksites=worksites,
+        visiting_providers=_distinct_counts(counters, 'visiting_providers'),
+        visiting_specialties=_distinct_counts(counters, 'visiting_specialties'),
+        leaving_providers=_distinct_counts(counters, 'leaving_providers'),
+        origin_cities=_distinct_counts(counters, 'origin_cities')
+    )
@@ -0,0 +1,292 @@
+import numpy as np
+
+from shared.projection import BatchProjector
+from shared.shared_utils import Coordinate
+from .ingest import hcp_id_or_none
+
+
+class CityView:
+    __slots__ = ('_container', 'city_id')
+
+    def __init__(self, container: 'ColumnarEntitiesContainer', city_id: int):
+        self._container = container
+        self.city_id = city_id
+
+    def __hash__(self):
+        return self.city_id
+
+    def __eq__(self, other):
+        if not isinstance(other, CityView):
+            return False
+
+        return self._container is other._container and self.city_id == other.city_id
+
+    @property
+    def city_name(self) -> str:
+        return self._container.city_names[self.city_id]
+
+    @property
+    def city_coord(self) -> Coordinate:
+        return Coordinate(longitude=float(self._container.city_lons[self.city_id]),
+                          latitude=float(self._container.city_lats[self.city_id]))
+
+    @property
+    def worksites(self) -> list['WorksiteView']:
+        site_ids = np.flatnonzero(self._container.site_city_ids == self.city_id)
+        return [WorksiteView(self._container, int(site_id)) for site_id in site_ids]
+
+
+class WorksiteView:
+    __slots__ = ('_container', 'site_id')
+
+    def __init__(self, container: 'ColumnarEntitiesContainer', site_id: int):
+        self._container = container
+        self.site_id = site_id
+
+    def __hash__(self):
+        return self.site_id
+
+    def __eq__(self, other):
+        if not isinstance(other, WorksiteView):
+            return False
+
+        return self._container is other._container and self.site_id == other.site_id
+
+    @property
+    def site_name(self) -> str:
+        return self._container.site_names[self.site_id]
+
+    @property
+    def city(self) -> CityView:
+        return CityView(self._container, int(self._container.site_city_ids[self.site_id]))
+
+    @property
+    def visiting_specialties(self) -> set[str]:
+        mask = self._container.visiting_site_ids == self.site_id
+        specialty_ids = np.unique(self._container.specialty_ids[mask])
+        return set(self._container.specialties[specialty_ids])
+
+
+class ProviderView:
+    __slots__ = ('_container', 'provider_id')
+
+    def __init__(self, container: 'ColumnarEntitiesContainer', provider_id: int):
+        self._container = container
+        self.provider_id = provider_id
+
+    def __hash__(self):
+        return self.provider_id
+
+    def __eq__(self, other):
+        if not isinstance(other, ProviderView):
+            return False
+
+        return self._container is other._container and self.provider_id == other.provider_id
+
+    @property
+    def provider_name(self) -> str:
+        return self._container.provider_names[self.provider_id]
+
+    @property
+    def hcp_id(self) -> int | None:
+        # Same as Provider.hcp_id, the missing id sentinel reads as None
+        return hcp_id_or_none(self._container.provider_hcp_ids[self.provider_id])
+
+
+class ProviderAssignmentView:
+    __slots__ = ('_container', 'assignment_id')
+
+    def __init__(self, container: 'ColumnarEntitiesContainer', assignment_id: int):
+        self._container = container
+        self.assignment_id = assignment_id
+
+    def __hash__(self):
+        return self.assignment_id
+
+    def __eq__(self, other):
+        if not isinstance(other, ProviderAssignmentView):
+            return False
+
+        return self._container is other._container and self.assignment_id == other.assignment_id
+
+    @property
+    def provider(self) -> ProviderView:
+        return ProviderView(self._container, int(self._container.provider_ids[self.assignment_id]))
+
+    @property
+    def specialty(self) -> str:
+        return self._container.specialties[self._container.specialty_ids[self.assignment_id]]
+
+    @property
+    def origin_site(self) -> WorksiteView:
+        return WorksiteView(self._container, int(self._container.origin_site_ids[self.assignment_id]))
+
+    @property
+    def visiting_site(self) -> WorksiteView:
+        return WorksiteView(self._container, int(self._container.visiting_site_ids[self.assignment_id]))
+
+    @property
+    def origin_city(self) -> CityView:
+        return self.origin_site.city
+
+    @property
+    def visiting_city(self) -> CityView:
+        return self.visiting_site.city
+
+
+class ColumnarEntitiesContainer:
+
+    def __init__(self,
+                 city_names: np.ndarray,
+                 city_lons: np.ndarray,
+                 city_lats: np.ndarray,
+                 site_names: np.ndarray,
+                 site_city_ids: np.ndarray,
+                 provider_names: np.ndarray,
+                 provider_hcp_ids: np.ndarray,
+                 specialties: np.ndarray,
+                 provider_ids: np.ndarray,
+                 specialty_ids: np.ndarray,
+                 origin_site_ids: np.ndarray,
+                 visiting_site_ids: np.ndarray):
+        # Cities
+        self.city_names = city_names
+        self.city_lons = np.asarray(city_lons, dtype=np.float64)
+        self.city_lats = np.asarray(city_lats, dtype=np.float64)
+
+        # Worksites
+        self.site_names = site_names
+        self.site_city_ids = np.asarray(site_city_ids, dtype=np.int32)
+
+        # Providers and specialties
+        self.provider_names = provider_names
+        self.provider_hcp_ids = provider_hcp_ids
+        self.specialties = specialties
+
+        # Provider assignments
+        self.provider_ids = np.asarray(provider_ids, dtype=np.int32)
+        self.specialty_ids = np.asarray(specialty_ids, dtype=np.int32)
+        self.origin_site_ids = np.asarray(origin_site_ids, dtype=np.int32)
+        self.visiting_site_ids = np.asarray(visiting_site_ids, dtype=np.int32)
+
+        # Lazily built (order, offsets) pairs, see _assignment_index
+        self._indexes = dict()
+        # Projected (xs, ys) city arrays by projection key, see project_cities
+        self._projections = dict()
+
+    @property
+    def num_cities(self) -> int:
+        return len(self.city_names)
+
+    @property
+    def num_assignments(self) -> int:
+        return len(self.provider_ids)
+
+    @property
+    def origin_city_ids(self) -> np.ndarray:
+        return self.site_city_ids[self.origin_site_ids]
+
+    @property
+    def visiting_city_ids(self) -> np.ndarray:
+        return self.site_city_ids[self.visiting_site_ids]
+
+    @property
+    def cities(self) -> list[CityView]:
+        return [CityView(self, city_id) for city_id in range(self.num_cities)]
+
+    @property
+    def worksites(self) -> list[WorksiteView]:
+        return [WorksiteView(self, site_id) for site_id in range(len(self.site_names))]
+
+    @property
+    def providers(self) -> list[ProviderView]:
+        return [ProviderView(self, provider_id) for provider_id in range(len(self.provider_names))]
+
+    @property
+    def provider_assignments(self) -> list[ProviderAssignmentView]:
+        return [ProviderAssignmentView(self, assignment_id) for assignment_id in range(self.num_assignments)]
+
+    def city_ids_for_names(self, city_names) -> np.ndarray:
+        return np.flatnonzero(np.isin(self.city_names, list(city_names)))
+
+    def assignments_mask(self,
+                         origin_city_ids=None,
+                         visiting_city_ids=None,
+                         specialties=None,
+                         provider_ids=None) -> np.ndarray:
+        mask = np.ones(self.num_assignments, dtype=bool)
+        if origin_city_ids is not None:
+            mask &= np.isin(self.origin_city_ids, origin_city_ids)
+        if visiting_city_ids is not None:
+            mask &= np.isin(self.visiting_city_ids, visiting_city_ids)
+        if specialties is not None:
+            specialty_ids = np.flatnonzero(np.isin(self.specialties, list(specialties)))
+            mask &= np.isin(self.specialty_ids, specialty_ids)
+        if provider_ids is not None:
+            mask &= np.isin(self.provider_ids, provider_ids)
+
+        return mask
+
+    def project_cities(self, projector: BatchProjector) -> tuple[np.ndarray, np.ndarray]:
+        if projector.key not in self._projections:
+            self._projections[projector.key] = projector.project(self.city_lons, self.city_lats)
+
+        return self._projections[projector.key]
+
+    def filter_assignments(self, mask: np.ndarray) -> 'ColumnarEntitiesContainer':
+        # Entity tables are shared with the filtered container, only the assignment columns are subset
+        filtered = ColumnarEntitiesContainer(
+            city_names=self.city_names,
+            city_lons=self.city_lons,
+            city_lats=self.city_lats,
+            site_names=self.site_names,
+            site_city_ids=self.site_city_ids,
+            provider_names=self.provider_names,
+            provider_hcp_ids=self.provider_hcp_ids,
+            specialties=self.specialties,
+            provider_ids=self.provider_ids[mask],
+            specialty_ids=self.specialty_ids[mask],
+            origin_site_ids=self.origin_site_ids[mask],
+            visiting_site_ids=self.visiting_site_ids[mask]
+        )
+        # Same city table, so the projected coordinates carry over
+        filtered._projections = self._projections
+        return filtered
+
+    def _assignment_index(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        if name not in self._indexes:
+            keys, num_keys = {
+                'origin_city': (self.origin_city_ids, self.num_cities),
+                'visiting_city': (self.visiting_city_ids, self.num_cities),
+                'specialty': (self.specialty_ids, len(self.specialties)),
+                'provider': (self.provider_ids, len(self.provider_names))
+            }[name]
+            # Assignment ids grouped by key, with offsets[key]:offsets[key + 1] bounding each group
+            order = np.argsort(keys, kind='stable').astype(np.int32)
+            offsets = np.zeros(num_keys + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(keys, minlength=num_keys))
+            self._indexes[name] = (order, offsets)
+
+        return self._indexes[name]
+
+    def _lookup(self, name: str, key: int) -> np.ndarray:
+        order, offsets = self._assignment_index(name)
+        return order[offsets[key]:offsets[key + 1]]
+
+    def assignment_ids_leaving(self, city_id: int) -> np.ndarray:
+        return self._lookup('origin_city', city_id)
+
+    def assignment_ids_visiting(self, city_id: int, specialty_id: int = None) -> np.ndarray:
+        assignment_ids = self._lookup('visiting_city', city_id)
+        if specialty_id is None:
+            return assignment_ids
+        return assignment_ids[self.specialty_ids[assignment_ids] == specialty_id]
+
+    def assignment_ids_for_specialty(self, specialty_id: int) -> np.ndarray:
+        return self._lookup('specialty', specialty_id)
+
+    def assignment_ids_for_provider(self, provider_id: int) -> np.ndarray:
+        return self._lookup('provider', provider_id)
+
+    def referenced_city_ids(self) -> np.ndarray:
+        return np.union1d(self.origin_city_ids, self.visiting_city_ids)
@@ -0,0 +1,206 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .columnar import ColumnarEntitiesContainer
+from .entity_classes import City, ProviderAssignment
+from .factory import EntitiesContainer, EntitiesFactory
+from .ingest import normalize_hcp_ids, read_vcc_chunks
+from .snapshot import EntitiesSnapshotCache, compute_snapshot_key
+
+# Every column an assignment is built from. Rows that agree on all of them are the same assignment.
+_ASSIGNMENT_COLUMNS = ['consultant_name', 'hcp_id', 'specialty',
+                       'origin_site', 'origin_city', 'origin_lon', 'origin_lat',
+                       'visiting_site', 'visiting_city', 'visiting_lon', 'visiting_lat']
+
+_ASSIGNMENT_DTYPES = {
+    'consultant_name': object,
+    'hcp_id': np.int64,
+    'specialty': object,
+    'origin_site': object,
+    'origin_city': object,
+    'origin_lon': np.float64,
+    'origin_lat': np.float64,
+    'visiting_site': object,
+    'visiting_city': object,
+    'visiting_lon': np.float64,
+    'visiting_lat': np.float64
+}
+
+
+def _assignment_key(provider_assignment: ProviderAssignment) -> tuple:
+    # Identifies "the same" assignment across exports while ignoring the attributes that can change between them
+    return (
+        provider_assignment.provider.provider_name,
+        provider_assignment.provider.hcp_id,
+        provider_assignment.origin_site.site_name,
+        provider_assignment.origin_city.city_name,
+        provider_assignment.visiting_site.site_name,
+        provider_assignment.visiting_city.city_name
+    )
+
+
+def _group_by_key(provider_assignments) -> dict:
+    groups = dict()
+    for provider_assignment in provider_assignments:
+        groups.setdefault(_assignment_key(provider_assignment), set()).add(provider_assignment)
+    return groups
+
+
+class AssignmentsDiff:
+
+    def __init__(self,
+                 added: set[ProviderAssignment],
+                 removed: set[ProviderAssignment],
+                 changed: list[tuple[frozenset, frozenset]]):
+        self.added = added
+        self.removed = removed
+        # (previous assignments, new assignments) for every key whose assignments differ between exports
+        self.changed = changed
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    @property
+    def provider_assignments(self) -> set[ProviderAssignment]:
+        # Every assignment that was added or removed, on either side of a change
+        provider_assignments = self.added | self.removed
+        for previous_assignments, new_assignments in self.changed:
+            provider_assignments.update(previous_assignments)
+            provider_assignments.update(new_assignments)
+        return provider_assignments
+
+    @property
+    def affected_cities(self) -> set[City]:
+        cities = set()
+        for provider_assignment in self.provider_assignments:
+            cities.add(provider_assignment.origin_city)
+            cities.add(provider_assignment.visiting_city)
+        return cities
+
+
+class ExportUpdate:
+
+    def __init__(self,
+                 entities_container: EntitiesContainer,
+                 diff: AssignmentsDiff | None,
+                 key: str,
+                 previous_key: str | None):
+        self.entities_container = entities_container
+        # None when there was no previous snapshot of the export to diff against
+        self.diff = diff
+        # Snapshot keys of this export and of the one it was diffed against
+        self.key = key
+        self.previous_key = previous_key
+
+
+def diff_entities(previous: EntitiesContainer, current: EntitiesContainer) -> AssignmentsDiff:
+    # Assignments present in both exports are equal by value, so only the symmetric difference needs grouping
+    previous_only = previous.provider_assignments - current.provider_assignments
+    current_only = current.provider_assignments - previous.provider_assignments
+
+    previous_groups = _group_by_key(previous_only)
+    current_groups = _group_by_key(current_only)
+
+    added = set()
+    removed = set()
+    changed = []
+    for key, new_assignments in current_groups.items():
+        if key in previous_groups:
+            changed.append((frozenset(previous_groups[key]), frozenset(new_assignments)))
+        else:
+            added.update(new_assignments)
+
+    for key, previous_assignments in previous_groups.items():
+        if key not in current_groups:
+            removed.update(previous_assignments)
+
+    return AssignmentsDiff(added=added, removed=removed, changed=changed)
+
+
+def apply_diff(container: EntitiesContainer, diff: AssignmentsDiff):
+    for provider_assignment in diff.removed:
+        container.remove_provider_assignment(provider_assignment)
+
+    for previous_assignments, new_assignments in diff.changed:
+        for provider_assignment in previous_assignments:
+            container.remove_provider_assignment(provider_assignment)
+        for provider_assignment in new_assignments:
+            container.add_provider_assignment(provider_assignment)
+
+    for provider_assignment in diff.added:
+        container.add_provider_assignment(provider_assignment)
+
+
+def _assignment_rows(df: pd.DataFrame) -> pd.DataFrame:
+    return normalize_hcp_ids(df)[_ASSIGNMENT_COLUMNS].astype(_ASSIGNMENT_DTYPES).drop_duplicates()
+
+
+def read_assignment_rows(csv_path: str, chunksize: int = 50000, city_name_changes: dict = None) -> pd.DataFrame:
+    # One row per distinct assignment of the export, read in chunks like the entity ingest
+    chunks = [_assignment_rows(chunk)
+              for chunk in read_vcc_chunks(csv_path, chunksize=chunksize, city_name_changes=city_name_changes)]
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in _ASSIGNMENT_DTYPES.items()})
+    return pd.concat(chunks, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def columnar_assignment_rows(columnar: ColumnarEntitiesContainer) -> pd.DataFrame:
+    origin_city_ids = columnar.origin_city_ids
+    visiting_city_ids = columnar.visiting_city_ids
+    return _assignment_rows(pd.DataFrame({
+        'consultant_name': columnar.provider_names[columnar.provider_ids],
+        'hcp_id': columnar.provider_hcp_ids[columnar.provider_ids],
+        'specialty': columnar.specialties[columnar.specialty_ids],
+        'origin_site': columnar.site_names[columnar.origin_site_ids],
+        'origin_city': columnar.city_names[origin_city_ids],
+        'origin_lon': columnar.city_lons[origin_city_ids],
+        'origin_lat': columnar.city_lats[origin_city_ids],
+        'visiting_site': columnar.site_names[columnar.visiting_site_ids],
+        'visiting_city': columnar.city_names[visiting_city_ids],
+        'visiting_lon': columnar.city_lons[visiting_city_ids],
+        'visiting_lat': columnar.city_lats[visiting_city_ids]
+    }))
+
+
+def diff_assignment_rows(previous_rows: pd.DataFrame, current_rows: pd.DataFrame) -> AssignmentsDiff:
+    # Only the rows that aren't in both exports become entities. Missing coordinates match each other in the merge.
+    merged = previous_rows.merge(current_rows, how='outer', on=_ASSIGNMENT_COLUMNS, indicator=True)
+    previous_only = merged.loc[merged['_merge'] == 'left_only', _ASSIGNMENT_COLUMNS]
+    current_only = merged.loc[merged['_merge'] == 'right_only', _ASSIGNMENT_COLUMNS]
+    return diff_entities(previous=EntitiesFactory.create_entities(previous_only),
+                         current=EntitiesFactory.create_entities(current_only))
+
+
+def update_entities_from_export(csv_path: str,
+                                snapshot_cache: EntitiesSnapshotCache,
+                                city_name_changes: dict = None,
+                                chunksize: int = 50000) -> ExportUpdate:
+    key = compute_snapshot_key(csv_path, city_name_changes=city_name_changes)
+    previous_key = snapshot_cache.latest_key(csv_path)
+    if previous_key == key and snapshot_cache.has_snapshot(key):
+        logging.info(f"{csv_path} is unchanged since the last snapshot.")
+        container = EntitiesFactory.convert_from_columnar(snapshot_cache.load(key))
+        return ExportUpdate(container, AssignmentsDiff(added=set(), removed=set(), changed=[]), key=key,
+                            previous_key=previous_key)
+
+    previous_columnar = snapshot_cache.load(previous_key) if previous_key else None
+    if previous_columnar is None:
+        container = EntitiesFactory.create_entities_from_csv(csv_path, chunksize=chunksize,
+                                                             city_name_changes=city_name_changes)
+        snapshot_cache.save(key, EntitiesFactory.convert_to_columnar(container), source_path=csv_path)
+        logging.info(f"No previous snapshot for {csv_path}, built entities from scratch.")
+        return ExportUpdate(container, None, key=key, previous_key=None)
+
+    # Only the changed assignments are built and applied, on top of the previous snapshot's entities
+    current_rows = read_assignment_rows(csv_path, chunksize=chunksize, city_name_changes=city_name_changes)
+    diff = diff_assignment_rows(columnar_assignment_rows(previous_columnar), current_rows)
+    container = EntitiesFactory.convert_from_columnar(previous_columnar)
+    apply_diff(container, diff)
+    snapshot_cache.save(key, EntitiesFactory.create_columnar_entities(current_rows), source_path=csv_path)
+
+    logging.info(f"Applied export diff for {csv_path}: {len(diff.added)} added, {len(diff.removed)} removed, "
+                 f"{len(diff.changed)} changed.")
+    return ExportUpdate(container, diff, key=key, previous_key=previous_key)
@@ -1,4 +1,5 @@
-
+from collections import Counter
+from collections.abc import KeysView
 from enum import Enum
 
 from shared.shared_utils import Coordinate
@@ -9,104 +10,226 @@ class AssignmentDirection(Enum):
     LEAVING = 'leaving'
 
 
+class AggregateCounters:
+    """
+    How many of a city's or worksite's assignments each provider, specialty, origin city and visiting clinic takes
+    part in.
+
+    The container updates these as it links and removes assignments, so the number of distinct values of each is
+    len() of its counter and stays exact when an assignment goes away.
+    """
+    __slots__ = ('visiting_providers', 'visiting_specialties', 'leaving_providers', 'origin_cities', 'visiting_clinics')
+
+    def __init__(self):
+        self.visiting_providers = Counter()
+        self.visiting_specialties = Counter()
+        self.leaving_providers = Counter()
+        self.origin_cities = Counter()
+        self.visiting_clinics = Counter()
+
+    @staticmethod
+    def _update(counter: Counter, key, step: int):
+        counter[key] += step
+        if counter[key] <= 0:
+            del counter[key]
+
+    def count_visiting(self, provider_assignment: 'ProviderAssignment', step: int = 1):
+        self._update(self.visiting_providers, provider_assignment.provider, step)
+        self._update(self.visiting_specialties, provider_assignment.specialty, step)
+        self._update(self.origin_cities, provider_assignment.origin_city, step)
+        self._update(self.visiting_clinics, provider_assignment.visiting_site, step)
+
+    def count_leaving(self, provider_assignment: 'ProviderAssignment', step: int = 1):
+        self._update(self.leaving_providers, provider_assignment.provider, step)
+
+
 class Provider:
+    __slots__ = ('_provider_name', '_hcp_id', '_hash')
+
+    def __init__(self, name: str, hcp_id: int | None):
+        self._provider_name = name
+        # None when the export has no id for the provider, the name alone identifies them then
+        self._hcp_id = hcp_id
+
+        self._hash = hash((name, hcp_id))
+
+    @property
+    def provider_name(self) -> str:
+        return self._provider_name
 
-    def __init__(self, name: str, hcp_id: int):
-        self.provider_name = name
-        self.hcp_id = hcp_id
+    @property
+    def hcp_id(self) -> int | None:
+        return self._hcp_id
 
     def __hash__(self):
-        return self.hcp_id
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, Provider):
             return False
 
-        return self.provider_name == other.provider_name and self.hcp_id == other.hcp_id
+        return self._hcp_id == other._hcp_id and self._provider_name == other._provider_name
 
 
 class City:
+    __slots__ = ('_city_name', '_city_coord', '_hash', '_worksites', '_counters')
 
     def __init__(self, city_name: str, city_coord: Coordinate):
-        self.city_name = city_name
-        self.city_coord = city_coord
+        self._city_name = city_name
+        self._city_coord = city_coord
+
+        # Hashing happens once here instead of on every set/dict operation
+        self._hash = hash((city_name, city_coord))
 
         self._worksites = set()
+        self._counters = AggregateCounters()
+
+    @property
+    def city_name(self) -> str:
+        return self._city_name
+
+    @property
+    def city_coord(self) -> Coordinate:
+        return self._city_coord
 
     def __hash__(self):
-        return hash((self.city_name, self.city_coord))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, City):
             return False
 
-        return self.city_name == other.city_name and self.city_coord == other.city_coord
+        return (self._hash == other._hash
+                and self._city_name == other._city_name
+                and self._city_coord == other._city_coord)
 
     def add_worksite(self, worksite: 'Worksite'):
         self._worksites.add(worksite)
 
+    def remove_worksite(self, worksite: 'Worksite'):
+        self._worksites.discard(worksite)
+
+    @property
+    def has_worksites(self) -> bool:
+        return bool(self._worksites)
+
+    @property
+    def num_worksites(self) -> int:
+        return len(self._worksites)
+
+    @property
+    def counters(self) -> AggregateCounters:
+        return self._counters
+
 
 class ProviderAssignment:
+    __slots__ = ('_provider', '_specialty', '_origin_site', '_visiting_site', '_hash')
 
     def __init__(self, provider: Provider, specialty: str, origin_site: 'Worksite', visiting_site: 'Worksite'):
-        self.provider = provider
-        self.specialty = specialty
-        self.origin_site = origin_site
-        self.visiting_site = visiting_site
+        self._provider = provider
+        self._specialty = specialty
+        self._origin_site = origin_site
+        self._visiting_site = visiting_site
+
+        # Nested entities already cache their own hashes, so this doesn't recurse through the graph
+        self._hash = hash((provider, specialty, origin_site, visiting_site))
+
+    @property
+    def provider(self) -> Provider:
+        return self._provider
+
+    @property
+    def specialty(self) -> str:
+        return self._specialty
+
+    @property
+    def origin_site(self) -> 'Worksite':
+        return self._origin_site
+
+    @property
+    def visiting_site(self) -> 'Worksite':
+        return self._visiting_site
 
     def __hash__(self):
-        return hash((
-            self.provider,
-            self.specialty,
-            self.origin_site,
-            self.visiting_site
-        ))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, ProviderAssignment):
             return False
 
-        return (self.provider == other.provider
-                and self.specialty == other.specialty
-                and self.origin_site == other.origin_site
-                and self.visiting_site == other.visiting_site)
+        return (self._hash == other._hash
+                and self._provider == other._provider
+                and self._specialty == other._specialty
+                and self._origin_site == other._origin_site
+                and self._visiting_site == other._visiting_site)
 
     @property
     def origin_city(self):
-        return self.origin_site.city
+        return self._origin_site.city
 
     @property
     def visiting_city(self):
-        return self.visiting_site.city
+        return self._visiting_site.city
 
 
 class Worksite:
+    __slots__ = ('_site_name', '_city', '_hash', '_provider_assignments', '_counters')
 
     def __init__(self, site_name: str, city: 'City'):
-        self.site_name = site_name
-        self.city = city
-        
+        self._site_name = site_name
+        self._city = city
+
+        self._hash = hash((site_name, city))
+
         self._provider_assignments = {
             AssignmentDirection.LEAVING: set(),
             AssignmentDirection.VISITING: set()
         }
+        self._counters = AggregateCounters()
+
+    @property
+    def site_name(self) -> str:
+        return self._site_name
+
+    @property
+    def city(self) -> City:
+        return self._city
 
     def __hash__(self):
-        return hash((self.site_name, self.city))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, Worksite):
             return False
 
-        return self.site_name == other.site_name and self.city == other.city
+        return self._hash == other._hash and self._site_name == other._site_name and self._city == other._city
 
     def add_assignment(self, provider_assignment: ProviderAssignment, direction: AssignmentDirection):
         self._provider_assignments[direction].add(provider_assignment)
 
+    def remove_assignment(self, provider_assignment: ProviderAssignment, direction: AssignmentDirection):
+        self._provider_assignments[direction].discard(provider_assignment)
+
     @property
-    def visiting_specialties(self) -> set[str]:
-        specialties = set(provider_assignment.specialty 
-                          for provider_assignment in self._provider_assignments[AssignmentDirection.VISITING])
-        return specialties
+    def has_assignments(self) -> bool:
+        return any(self._provider_assignments.values())
 
+    @property
+    def counters(self) -> AggregateCounters:
+        return self._counters
 
+    @property
+    def visiting_specialties(self) -> KeysView[str]:
+        return self._counters.visiting_specialties.keys()
@@ -1,7 +1,14 @@
+import numpy as np
 import pandas as pd
 
+from shared.projection import BatchProjector
 from shared.shared_utils import Coordinate
+from .columnar import ColumnarEntitiesContainer
 from .entity_classes import City, Worksite, Provider, ProviderAssignment, AssignmentDirection
+from .ingest import (MISSING_HCP_ID, find_city_coords, hcp_id_or_none, invert_city_name_changes, normalize_hcp_ids,
+                     read_vcc_chunks, rename_cities)
+from .projection import ProjectedCities
+from .snapshot import EntitiesSnapshotCache, compute_snapshot_key
 
 
 class EntitiesContainer:
@@ -13,13 +20,363 @@ class EntitiesContainer:
         self.providers = dict()
         self.provider_assignments = set()
 
+        # Secondary indexes over provider_assignments, kept in sync by link/remove
+        self._assignments_by_origin_city = dict()
+        self._assignments_by_visiting_city = dict()
+        self._assignments_by_specialty = dict()
+        self._assignments_by_provider = dict()
+
+        # Projected city coordinates by projection key, see project_cities
+        self._projected_cities = dict()
+
+    def _index_entries(self, provider_assignment: ProviderAssignment) -> list[tuple[dict, object]]:
+        return [
+            (self._assignments_by_origin_city, provider_assignment.origin_city),
+            (self._assignments_by_visiting_city, provider_assignment.visiting_city),
+            (self._assignments_by_specialty, provider_assignment.specialty),
+            (self._assignments_by_provider, provider_assignment.provider)
+        ]
+
+    def _add_to_indexes(self, provider_assignment: ProviderAssignment):
+        for index, key in self._index_entries(provider_assignment):
+            if key not in index:
+                index[key] = set()
+            index[key].add(provider_assignment)
+
+    def _remove_from_indexes(self, provider_assignment: ProviderAssignment):
+        for index, key in self._index_entries(provider_assignment):
+            assignments = index.get(key)
+            if assignments is None:
+                continue
+
+            assignments.discard(provider_assignment)
+            if not assignments:
+                del index[key]
+
+    @staticmethod
+    def _lookup(index: dict, key) -> frozenset[ProviderAssignment]:
+        return frozenset(index.get(key, ()))
+
+    def assignments_leaving(self, origin_city: City) -> frozenset[ProviderAssignment]:
+        return self._lookup(self._assignments_by_origin_city, origin_city)
+
+    def assignments_visiting(self, visiting_city: City, specialty: str = None) -> frozenset[ProviderAssignment]:
+        visiting = self._assignments_by_visiting_city.get(visiting_city, set())
+        if specialty is None:
+            return frozenset(visiting)
+
+        # Walk the smaller of the two buckets
+        with_specialty = self._assignments_by_specialty.get(specialty, set())
+        smaller, larger = sorted([visiting, with_specialty], key=len)
+        return frozenset(pa for pa in smaller if pa in larger)
+
+    def assignments_for_specialty(self, specialty: str) -> frozenset[ProviderAssignment]:
+        return self._lookup(self._assignments_by_specialty, specialty)
+
+    def assignments_for_provider(self, provider: Provider) -> frozenset[ProviderAssignment]:
+        return self._lookup(self._assignments_by_provider, provider)
+
+    @property
+    def origin_cities(self) -> set[City]:
+        return set(self._assignments_by_origin_city)
+
+    @property
+    def visiting_cities(self) -> set[City]:
+        return set(self._assignments_by_visiting_city)
+
+    def project_cities(self, projector: BatchProjector) -> ProjectedCities:
+        # City coordinates never change, so cities added since the last call are the only ones projected.
+        # Rows of removed cities are left in place, they are never looked up again.
+        projected = self._projected_cities.get(projector.key, ProjectedCities.empty())
+        projected = projected.extend(projector, list(self.cities))
+        self._projected_cities[projector.key] = projected
+        return projected
+
+    def _count(self, provider_assignment: ProviderAssignment, step: int):
+        # Kept up to date as assignments come and go, so aggregates never rescan the assignments.
+        # Counted on the container's own worksites and cities, the assignment may come from another container.
+        origin_site = self.worksites[provider_assignment.origin_site]
+        visiting_site = self.worksites[provider_assignment.visiting_site]
+        visiting_site.counters.count_visiting(provider_assignment, step=step)
+        visiting_site.city.counters.count_visiting(provider_assignment, step=step)
+        origin_site.counters.count_leaving(provider_assignment, step=step)
+        origin_site.city.counters.count_leaving(provider_assignment, step=step)
+
+    def link_provider_assignment(self, provider_assignment: ProviderAssignment):
+        # The assignment's provider and worksites must already be the container's own instances
+        if provider_assignment in self.provider_assignments:
+            return
+
+        self.provider_assignments.add(provider_assignment)
+        self._add_to_indexes(provider_assignment)
+        self._count(provider_assignment, step=1)
+        provider_assignment.origin_site.add_assignment(
+            direction=AssignmentDirection.LEAVING,
+            provider_assignment=provider_assignment
+        )
+        provider_assignment.visiting_site.add_assignment(
+            direction=AssignmentDirection.VISITING,
+            provider_assignment=provider_assignment
+        )
+
+    def _resolve_city(self, city: City) -> City:
+        if city not in self.cities:
+            self.cities[city] = City(city_name=city.city_name, city_coord=city.city_coord)
+
+        return self.cities[city]
+
+    def _resolve_worksite(self, worksite: Worksite) -> Worksite:
+        if worksite not in self.worksites:
+            city = self._resolve_city(worksite.city)
+            new_worksite = Worksite(site_name=worksite.site_name, city=city)
+            self.worksites[new_worksite] = new_worksite
+            city.add_worksite(new_worksite)
+
+        return self.worksites[worksite]
+
+    def add_provider_assignment(self, provider_assignment: ProviderAssignment) -> ProviderAssignment:
+        if provider_assignment in self.provider_assignments:
+            return provider_assignment
+
+        provider = provider_assignment.provider
+        if provider not in self.providers:
+            self.providers[provider] = Provider(name=provider.provider_name, hcp_id=provider.hcp_id)
+
+        # Assignments from another container are rebuilt on top of this container's entities
+        new_assignment = ProviderAssignment(
+            provider=self.providers[provider],
+            specialty=provider_assignment.specialty,
+            origin_site=self._resolve_worksite(provider_assignment.origin_site),
+            visiting_site=self._resolve_worksite(provider_assignment.visiting_site)
+        )
+        self.link_provider_assignment(new_assignment)
+        return new_assignment
+
+    def remove_provider_assignment(self, provider_assignment: ProviderAssignment):
+        if provider_assignment not in self.provider_assignments:
+            return
+
+        self.provider_assignments.discard(provider_assignment)
+        self._remove_from_indexes(provider_assignment)
+        self._count(provider_assignment, step=-1)
+        origin_site = self.worksites[provider_assignment.origin_site]
+        visiting_site = self.worksites[provider_assignment.visiting_site]
+        origin_site.remove_assignment(provider_assignment=provider_assignment,
+                                      direction=AssignmentDirection.LEAVING)
+        visiting_site.remove_assignment(provider_assignment=provider_assignment,
+                                        direction=AssignmentDirection.VISITING)
+
+        # Drop worksites and cities that no longer take part in any assignment
+        for worksite in {origin_site, visiting_site}:
+            if worksite.has_assignments:
+                continue
+
+            del self.worksites[worksite]
+            city = self.cities[worksite.city]
+            city.remove_worksite(worksite)
+            if not city.has_worksites:
+                del self.cities[city]
+
+
+def _factorize_columns(df: pd.DataFrame, columns: list[str]) -> tuple[np.ndarray, pd.DataFrame]:
+    # Group numbers are assigned in order of first appearance, which matches the row order of drop_duplicates
+    codes = df.groupby(columns, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    uniques = df[columns].drop_duplicates().reset_index(drop=True)
+    return codes, uniques
+
+
+class _FactorizedFrame:
+
+    def __init__(self, df: pd.DataFrame):
+        df = normalize_hcp_ids(df)
+        num_rows = len(df)
+
+        # Origin and visiting columns are stacked so that each unique city and worksite is only seen once
+        cities_df = pd.DataFrame({
+            'city_name': np.concatenate([df['origin_city'].to_numpy(), df['visiting_city'].to_numpy()]),
+            'lon': np.concatenate([df['origin_lon'].to_numpy(), df['visiting_lon'].to_numpy()]),
+            'lat': np.concatenate([df['origin_lat'].to_numpy(), df['visiting_lat'].to_numpy()])
+        })
+        city_codes, self.unique_cities = _factorize_columns(cities_df, ['city_name', 'lon', 'lat'])
+
+        worksites_df = pd.DataFrame({
+            'site_name': np.concatenate([df['origin_site'].to_numpy(), df['visiting_site'].to_numpy()]),
+            'city_id': city_codes
+        })
+        worksite_codes, self.unique_worksites = _factorize_columns(worksites_df, ['site_name', 'city_id'])
+
+        provider_codes, self.unique_providers = _factorize_columns(df, ['consultant_name', 'hcp_id'])
+        specialty_codes, specialties = pd.factorize(df['specialty'], use_na_sentinel=False)
+        self.specialties = np.asarray(specialties, dtype=object)
+
+        self.assignments = pd.DataFrame({
+            'provider_id': provider_codes,
+            'specialty_id': specialty_codes,
+            'origin_site_id': worksite_codes[:num_rows],
+            'visiting_site_id': worksite_codes[num_rows:]
+        }).drop_duplicates()
+
+
+class _BatchEntitiesBuilder:
+
+    def __init__(self, container: EntitiesContainer):
+        self.container = container
+
+    @staticmethod
+    def _handle_new_entities(entities: list, dict_: dict) -> list:
+        resolved = []
+        for entity in entities:
+            if entity not in dict_:
+                dict_[entity] = entity
+            resolved.append(dict_[entity])
+
+        return resolved
+
+    def _create_cities(self, frame: _FactorizedFrame) -> list[City]:
+        cities = [
+            City(city_name=city_name, city_coord=Coordinate(longitude=lon, latitude=lat))
+            for city_name, lon, lat in frame.unique_cities.itertuples(index=False)
+        ]
+        return self._handle_new_entities(entities=cities, dict_=self.container.cities)
+
+    def _create_worksites(self, frame: _FactorizedFrame, cities: list[City]) -> list[Worksite]:
+        worksites = [
+            Worksite(site_name=site_name, city=cities[city_id])
+            for site_name, city_id in frame.unique_worksites.itertuples(index=False)
+        ]
+        worksites = self._handle_new_entities(entities=worksites, dict_=self.container.worksites)
+        for worksite in worksites:
+            worksite.city.add_worksite(worksite)
+
+        return worksites
+
+    def _create_providers(self, frame: _FactorizedFrame) -> list[Provider]:
+        providers = [
+            Provider(name=name, hcp_id=hcp_id_or_none(hcp_id))
+            for name, hcp_id in frame.unique_providers.itertuples(index=False)
+        ]
+        return self._handle_new_entities(entities=providers, dict_=self.container.providers)
+
+    def add_frame(self, df: pd.DataFrame):
+        if len(df) == 0:
+            return
+
+        frame = _FactorizedFrame(df)
+        cities = self._create_cities(frame)
+        worksites = self._create_worksites(frame, cities=cities)
+        providers = self._create_providers(frame)
+
+        for provider_id, specialty_id, origin_id, visiting_id in frame.assignments.itertuples(index=False):
+            origin_worksite = worksites[origin_id]
+            visiting_worksite = worksites[visiting_id]
+            provider_assignment = ProviderAssignment(
+                provider=providers[provider_id],
+                specialty=frame.specialties[specialty_id],
+                origin_site=origin_worksite,
+                visiting_site=visiting_worksite
+            )
+            if provider_assignment in self.container.provider_assignments:
+                continue
+
+            self.container.link_provider_assignment(provider_assignment)
+
+
+def _build_columnar_container(df: pd.DataFrame) -> ColumnarEntitiesContainer:
+    frame = _FactorizedFrame(df)
+    return ColumnarEntitiesContainer(
+        city_names=frame.unique_cities['city_name'].to_numpy(dtype=object),
+        city_lons=frame.unique_cities['lon'].to_numpy(),
+        city_lats=frame.unique_cities['lat'].to_numpy(),
+        site_names=frame.unique_worksites['site_name'].to_numpy(dtype=object),
+        site_city_ids=frame.unique_worksites['city_id'].to_numpy(),
+        provider_names=frame.unique_providers['consultant_name'].to_numpy(dtype=object),
+        provider_hcp_ids=frame.unique_providers['hcp_id'].to_numpy(),
+        specialties=frame.specialties,
+        provider_ids=frame.assignments['provider_id'].to_numpy(),
+        specialty_ids=frame.assignments['specialty_id'].to_numpy(),
+        origin_site_ids=frame.assignments['origin_site_id'].to_numpy(),
+        visiting_site_ids=frame.assignments['visiting_site_id'].to_numpy()
+    )
+
+
+def _build_columnar_from_container(container: EntitiesContainer) -> ColumnarEntitiesContainer:
+    cities = list(container.cities)
+    city_ids = {city: city_id for city_id, city in enumerate(cities)}
+    worksites = list(container.worksites)
+    site_ids = {worksite: site_id for site_id, worksite in enumerate(worksites)}
+    providers = list(container.providers)
+    provider_ids = {provider: provider_id for provider_id, provider in enumerate(providers)}
+
+    assignments = list(container.provider_assignments)
+    specialty_codes, specialties = pd.factorize(pd.Series([pa.specialty for pa in assignments], dtype=object),
+                                                use_na_sentinel=False)
+
+    return ColumnarEntitiesContainer(
+        city_names=np.array([city.city_name for city in cities], dtype=object),
+        city_lons=np.array([city.city_coord.lon for city in cities], dtype=np.float64),
+        city_lats=np.array([city.city_coord.lat for city in cities], dtype=np.float64),
+        site_names=np.array([worksite.site_name for worksite in worksites], dtype=object),
+        site_city_ids=np.array([city_ids[worksite.city] for worksite in worksites], dtype=np.int32),
+        provider_names=np.array([provider.provider_name for provider in providers], dtype=object),
+        # Same sentinel for missing hcp ids as the columns built from a frame
+        provider_hcp_ids=np.array([MISSING_HCP_ID if provider.hcp_id is None else provider.hcp_id
+                                   for provider in providers], dtype=np.int64),
+        specialties=np.asarray(specialties, dtype=object),
+        provider_ids=np.array([provider_ids[pa.provider] for pa in assignments], dtype=np.int32),
+        specialty_ids=specialty_codes,
+        origin_site_ids=np.array([site_ids[pa.origin_site] for pa in assignments], dtype=np.int32),
+        visiting_site_ids=np.array([site_ids[pa.visiting_site] for pa in assignments], dtype=np.int32)
+    )
+
+
+def _build_container_from_columnar(columnar: ColumnarEntitiesContainer) -> EntitiesContainer:
+    container = EntitiesContainer()
+
+    cities = [
+        City(city_name=str(city_name), city_coord=Coordinate(longitude=lon, latitude=lat))
+        for city_name, lon, lat in zip(columnar.city_names, columnar.city_lons.tolist(), columnar.city_lats.tolist())
+    ]
+    container.cities = {city: city for city in cities}
+
+    worksites = [
+        Worksite(site_name=str(site_name), city=cities[city_id])
+        for site_name, city_id in zip(columnar.site_names, columnar.site_city_ids.tolist())
+    ]
+    container.worksites = {worksite: worksite for worksite in worksites}
+    for worksite in worksites:
+        worksite.city.add_worksite(worksite)
+
+    # Snapshots store missing hcp ids as the sentinel
+    providers = [
+        Provider(name=str(name), hcp_id=hcp_id_or_none(hcp_id))
+        for name, hcp_id in zip(columnar.provider_names, columnar.provider_hcp_ids.tolist())
+    ]
+    container.providers = {provider: provider for provider in providers}
+
+    specialties = [str(specialty) for specialty in columnar.specialties]
+    for provider_id, specialty_id, origin_id, visiting_id in zip(columnar.provider_ids.tolist(),
+                                                                 columnar.specialty_ids.tolist(),
+                                                                 columnar.origin_site_ids.tolist(),
+                                                                 columnar.visiting_site_ids.tolist()):
+        origin_worksite = worksites[origin_id]
+        visiting_worksite = worksites[visiting_id]
+        provider_assignment = ProviderAssignment(
+            provider=providers[provider_id],
+            specialty=specialties[specialty_id],
+            origin_site=origin_worksite,
+            visiting_site=visiting_worksite
+        )
+        container.link_provider_assignment(provider_assignment)
+
+    return container
+
 
 class EntitiesFactory:
 
     @staticmethod
     def _handle_new_entity(entity, dict_: dict):
         if entity not in dict_:
-            entity.cities[entity] = entity
+            dict_[entity] = entity
     
         origin_city = dict_[entity]
     
@@ -61,7 +418,7 @@ class EntitiesFactory:
     
         provider = Provider(
             name=row['consultant_name'],
-            hcp_id=row['hcp_id']
+            hcp_id=hcp_id_or_none(row['hcp_id'])
         )
         provider = cls._handle_new_entity(entity=provider, dict_=container.providers)
     
@@ -71,19 +428,64 @@ class EntitiesFactory:
             origin_site=origin_worksite,
             visiting_site=visiting_worksite
         )
-        container.provider_assignments.add(provider_assignment)
-        origin_worksite.add_assignment(
-            direction=AssignmentDirection.LEAVING,
-            provider_assignment=provider_assignment
-        )
-        visiting_worksite.add_assignment(
-            direction=AssignmentDirection.VISITING,
-            provider_assignment=provider_assignment
-        )
+        container.link_provider_assignment(provider_assignment)
     
+    @staticmethod
+    def _rename_cities(df: pd.DataFrame, city_name_changes: dict = None) -> pd.DataFrame:
+        city_name_replacements = invert_city_name_changes(city_name_changes)
+        if not city_name_replacements:
+            return df
+
+        city_coords = find_city_coords([df], set(city_name_replacements.values()))
+        return rename_cities(df, city_name_replacements, city_coords)
+
     @classmethod
-    def create_entities(cls, df: pd.DataFrame) -> EntitiesContainer:
+    def create_entities(cls, df: pd.DataFrame, batch: bool = True, city_name_changes: dict = None) -> EntitiesContainer:
+        df = cls._rename_cities(df, city_name_changes=city_name_changes)
         container = EntitiesContainer()
-        df.apply(cls._apply_create_entities, args=(container,))
+        if batch:
+            _BatchEntitiesBuilder(container).add_frame(df)
+        else:
+            normalize_hcp_ids(df).apply(cls._apply_create_entities, args=(container,), axis=1)
         return container
 
+    @classmethod
+    def create_entities_from_csv(cls,
+                                 csv_path: str,
+                                 chunksize: int = 50000,
+                                 city_name_changes: dict = None) -> EntitiesContainer:
+        # Each chunk is folded into the same container, so peak memory is bounded by the chunk size
+        container = EntitiesContainer()
+        builder = _BatchEntitiesBuilder(container)
+        for chunk in read_vcc_chunks(csv_path, chunksize=chunksize, city_name_changes=city_name_changes):
+            builder.add_frame(chunk)
+        return container
+
+    @classmethod
+    def create_columnar_entities(cls, df: pd.DataFrame) -> ColumnarEntitiesContainer:
+        return _build_columnar_container(df)
+
+    @classmethod
+    def convert_to_columnar(cls, container: EntitiesContainer) -> ColumnarEntitiesContainer:
+        return _build_columnar_from_container(container)
+
+    @classmethod
+    def convert_from_columnar(cls, columnar: ColumnarEntitiesContainer) -> EntitiesContainer:
+        return _build_container_from_columnar(columnar)
+
+    @classmethod
+    def load_or_create_entities(cls,
+                                csv_path: str,
+                                snapshot_cache: EntitiesSnapshotCache,
+                                city_name_changes: dict = None,
+                                chunksize: int = 50000) -> EntitiesContainer:
+        key = compute_snapshot_key(csv_path, city_name_changes=city_name_changes)
+        columnar = snapshot_cache.load(key)
+        if columnar is not None:
+            return _build_container_from_columnar(columnar)
+
+        container = cls.create_entities_from_csv(csv_path, chunksize=chunksize, city_name_changes=city_name_changes)
+        snapshot_cache.save(key,
+                            _build_columnar_from_container(container),
+                            source_path=csv_path)
+        return container
@@ -0,0 +1,128 @@
+from collections.abc import Iterator
+
+import numpy as np
+import pandas as pd
+
+# Repeated labels are read as categories so each chunk only holds one copy of every city, site and specialty string
+VCC_COLUMN_DTYPES = {
+    'specialty': 'category',
+    'visiting_city': 'category',
+    'visiting_site': 'category',
+    'visiting_lat': np.float64,
+    'visiting_lon': np.float64,
+    'frequency': 'category',
+    'origin_site': 'category',
+    'origin_city': 'category',
+    'origin_lat': np.float64,
+    'origin_lon': np.float64,
+    'consultant_name': str,
+    # Optional, read as float so a missing id is NaN instead of a nullable pd.NA
+    'hcp_id': np.float64
+}
+
+# Stands in for a missing hcp_id, providers without one are identified by name alone
+MISSING_HCP_ID = -1
+
+
+def normalize_hcp_ids(df: pd.DataFrame) -> pd.DataFrame:
+    # Exports without an hcp_id column, and rows without an id, get the sentinel
+    if 'hcp_id' not in df.columns:
+        return df.assign(hcp_id=MISSING_HCP_ID)
+
+    hcp_ids = pd.to_numeric(df['hcp_id'], errors='coerce').astype(np.float64)
+    return df.assign(hcp_id=hcp_ids.fillna(MISSING_HCP_ID).astype(np.int64))
+
+
+def hcp_id_or_none(hcp_id) -> int | None:
+    return None if hcp_id == MISSING_HCP_ID else int(hcp_id)
+
+
+def read_vcc_csv_chunks(csv_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(csv_path,
+                         dtype=VCC_COLUMN_DTYPES,
+                         usecols=lambda column: column in VCC_COLUMN_DTYPES,
+                         chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def read_vcc_parquet_chunks(parquet_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    for batch in parquet_file.iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def read_vcc_feather_chunks(feather_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.feather as feather
+
+    table = feather.read_table(feather_path, memory_map=True)
+    for batch in table.to_batches(max_chunksize=chunksize):
+        yield batch.to_pandas()
+
+
+def _read_vcc_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    # Joined data written by data_preparation as parquet or feather keeps its dtypes, everything else is read as CSV
+    if path.endswith('.parquet'):
+        return read_vcc_parquet_chunks(path, chunksize=chunksize)
+    if path.endswith('.feather'):
+        return read_vcc_feather_chunks(path, chunksize=chunksize)
+    return read_vcc_csv_chunks(path, chunksize=chunksize)
+
+
+def invert_city_name_changes(city_name_changes: dict) -> dict:
+    # {'Des Moines': ['West Des Moines', 'Ankeny']} -> {'West Des Moines': 'Des Moines', 'Ankeny': 'Des Moines'}
+    return {
+        old_name: new_name
+        for new_name, old_names in (city_name_changes or {}).items()
+        for old_name in old_names
+    }
+
+
+def find_city_coords(chunks, city_names: set[str]) -> dict[str, tuple[float, float]]:
+    # (lat, lon) of the first row that has coordinates for each of the cities
+    city_coords = dict()
+    for chunk in chunks:
+        for prefix in ['origin', 'visiting']:
+            rows = chunk[chunk[f'{prefix}_city'].astype(object).isin(city_names) & chunk[f'{prefix}_lat'].notna()]
+            for city_name, lat, lon in zip(rows[f'{prefix}_city'], rows[f'{prefix}_lat'], rows[f'{prefix}_lon']):
+                city_coords.setdefault(city_name, (lat, lon))
+
+    return city_coords
+
+
+def rename_cities(df: pd.DataFrame, city_name_replacements: dict, city_coords: dict) -> pd.DataFrame:
+    """
+    Replaces the city names in city_name_replacements with their new names.
+
+    A renamed city also takes the coordinates its new name has in city_coords, so it becomes the same city as the
+    one it was renamed to. Without coordinates for the new name it keeps its own.
+    """
+    df = df.copy()
+    for prefix in ['origin', 'visiting']:
+        city_names = df[f'{prefix}_city'].astype(object)
+        renamed = city_names.isin(city_name_replacements)
+        new_names = city_names.where(~renamed, city_names.map(city_name_replacements))
+        df[f'{prefix}_city'] = new_names
+
+        with_coords = renamed & new_names.isin(city_coords)
+        coords = [city_coords[city_name] for city_name in new_names[with_coords]]
+        if coords:
+            lats, lons = zip(*coords)
+            df.loc[with_coords, f'{prefix}_lat'] = lats
+            df.loc[with_coords, f'{prefix}_lon'] = lons
+
+    return df
+
+
+def read_vcc_chunks(path: str, chunksize: int, city_name_changes: dict = None) -> Iterator[pd.DataFrame]:
+    city_name_replacements = invert_city_name_changes(city_name_changes)
+    if not city_name_replacements:
+        return _read_vcc_chunks(path, chunksize=chunksize)
+
+    # A renamed city may come before any row of the city it's renamed to, so their coordinates are found first
+    city_coords = find_city_coords(_read_vcc_chunks(path, chunksize=chunksize), set(city_name_replacements.values()))
+    return (rename_cities(chunk, city_name_replacements, city_coords)
+            for chunk in _read_vcc_chunks(path, chunksize=chunksize))
@@ -0,0 +1,46 @@
+import numpy as np
+
+from shared.projection import BatchProjector
+from .entity_classes import City
+
+
+class ProjectedCities:
+
+    def __init__(self, cities: list[City], xs: np.ndarray, ys: np.ndarray):
+        self.cities = cities
+        self.xs = xs
+        self.ys = ys
+
+        self._row_by_city = {city: row for row, city in enumerate(cities)}
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __contains__(self, city: City):
+        return city in self._row_by_city
+
+    def rows(self, cities) -> np.ndarray:
+        return np.fromiter((self._row_by_city[city] for city in cities), dtype=np.int64)
+
+    def coord(self, city: City) -> tuple[float, float]:
+        row = self._row_by_city[city]
+        return float(self.xs[row]), float(self.ys[row])
+
+    def coords(self, cities) -> tuple[np.ndarray, np.ndarray]:
+        rows = self.rows(cities)
+        return self.xs[rows], self.ys[rows]
+
+    def extend(self, projector: BatchProjector, cities: list[City]) -> 'ProjectedCities':
+        # Only the cities that haven't been projected yet go through the projection
+        new_cities = [city for city in cities if city not in self._row_by_city]
+        if not new_cities:
+            return self
+
+        xs, ys = projector.project_coordinates(city.city_coord for city in new_cities)
+        return ProjectedCities(cities=self.cities + new_cities,
+                               xs=np.concatenate([self.xs, xs]),
+                               ys=np.concatenate([self.ys, ys]))
+
+    @classmethod
+    def empty(cls):
+        return cls(cities=[], xs=np.empty(0, dtype=np.float64), ys=np.empty(0, dtype=np.float64))
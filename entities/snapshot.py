@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .columnar import ColumnarEntitiesContainer
+from .ingest import MISSING_HCP_ID
+
+# Every array needed to rebuild a ColumnarEntitiesContainer, saved as one .npy file each so they can be memory-mapped
+_SNAPSHOT_ARRAYS = [
+    'city_names',
+    'city_lons',
+    'city_lats',
+    'site_names',
+    'site_city_ids',
+    'provider_names',
+    'provider_hcp_ids',
+    'specialties',
+    'provider_ids',
+    'specialty_ids',
+    'origin_site_ids',
+    'visiting_site_ids'
+]
+
+_STRING_ARRAYS = {'city_names', 'site_names', 'provider_names', 'specialties'}
+
+_SNAPSHOT_VERSION = 2
+
+
+def compute_snapshot_key(csv_path: str, city_name_changes: dict = None, block_size: int = 1 << 20) -> str:
+    hasher = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            hasher.update(block)
+
+    # The name changes alter the entities built from the same file, so they are part of the key.
+    # The order of the old names doesn't change the renaming, so it doesn't change the key either.
+    city_name_changes = {new_name: sorted(old_names) for new_name, old_names in (city_name_changes or {}).items()}
+    hasher.update(json.dumps(city_name_changes, sort_keys=True).encode('utf-8'))
+    hasher.update(str(_SNAPSHOT_VERSION).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _to_storable_array(name: str, values: np.ndarray) -> np.ndarray:
+    if name in _STRING_ARRAYS:
+        # Fixed-width unicode arrays can be memory-mapped, object arrays can't
+        return np.asarray(values).astype(str)
+    if name == 'provider_hcp_ids':
+        values = np.asarray(values, dtype=object)
+        missing = np.array([value is None or value != value for value in values], dtype=bool)
+        values[missing] = MISSING_HCP_ID
+        return values.astype(np.int64)
+    return np.asarray(values)
+
+
+class EntitiesSnapshotCache:
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _snapshot_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def has_snapshot(self, key: str) -> bool:
+        snapshot_dir = self._snapshot_dir(key)
+        return all(os.path.exists(os.path.join(snapshot_dir, f"{name}.npy")) for name in _SNAPSHOT_ARRAYS)
+
+    def load(self, key: str) -> ColumnarEntitiesContainer | None:
+        if not self.has_snapshot(key):
+            return None
+
+        snapshot_dir = self._snapshot_dir(key)
+        arrays = {
+            name: np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode='r')
+            for name in _SNAPSHOT_ARRAYS
+        }
+        logging.info(f"Loaded entities snapshot {key}.")
+        return ColumnarEntitiesContainer(**arrays)
+
+    def _latest_path(self, source_path: str) -> str:
+        # Keyed on the resolved path, so exports with the same file name in different directories don't share it
+        source_key = hashlib.sha256(os.path.realpath(source_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{source_key}.latest")
+
+    def latest_key(self, source_path: str) -> str | None:
+        latest_path = self._latest_path(source_path)
+        if not os.path.exists(latest_path):
+            return None
+
+        with open(latest_path, 'r') as f:
+            return f.read().strip()
+
+    def load_latest(self, source_path: str) -> ColumnarEntitiesContainer | None:
+        key = self.latest_key(source_path)
+        return self.load(key) if key else None
+
+    def save(self, key: str, container: ColumnarEntitiesContainer, source_path: str = None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write into a temporary directory first so a half-written snapshot is never picked up
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=f".{key}.")
+        try:
+            for name in _SNAPSHOT_ARRAYS:
+                array = _to_storable_array(name, getattr(container, name))
+                np.save(os.path.join(temp_dir, f"{name}.npy"), array, allow_pickle=False)
+
+            snapshot_dir = self._snapshot_dir(key)
+            if os.path.exists(snapshot_dir):
+                shutil.rmtree(snapshot_dir)
+            os.replace(temp_dir, snapshot_dir)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        # Remember which snapshot was built last for this source so the next export can be diffed against it
+        if source_path:
+            with open(self._latest_path(source_path), 'w') as f:
+                f.write(key)
+
+        logging.info(f"Saved entities snapshot {key}.")
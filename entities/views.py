@@ -0,0 +1,117 @@
+from collections.abc import Callable, Iterable
+
+from .entity_classes import City, ProviderAssignment
+from .factory import EntitiesContainer
+
+
+class EntitiesView:
+
+    def __init__(self, container: EntitiesContainer, provider_assignments: Iterable[ProviderAssignment] = None):
+        self.container = container
+
+        # None means every assignment in the container. Otherwise the view only references the selected
+        # assignments, nothing in the entity graph is copied
+        self._provider_assignments = None if provider_assignments is None else frozenset(provider_assignments)
+
+        self._origin_cities = None
+        self._cities = None
+        self._worksites = None
+        self._providers = None
+
+    def _check_same_container(self, other: 'EntitiesView'):
+        if self.container is not other.container:
+            raise ValueError("Only views over the same EntitiesContainer can be combined.")
+
+    @property
+    def is_unfiltered(self) -> bool:
+        return self._provider_assignments is None
+
+    def __and__(self, other: 'EntitiesView') -> 'EntitiesView':
+        self._check_same_container(other)
+        if self.is_unfiltered:
+            return other
+        if other.is_unfiltered:
+            return self
+
+        smaller, larger = sorted([self._provider_assignments, other._provider_assignments], key=len)
+        return EntitiesView(self.container, (pa for pa in smaller if pa in larger))
+
+    def __or__(self, other: 'EntitiesView') -> 'EntitiesView':
+        self._check_same_container(other)
+        if self.is_unfiltered or other.is_unfiltered:
+            return EntitiesView(self.container)
+
+        return EntitiesView(self.container, self._provider_assignments | other._provider_assignments)
+
+    def __len__(self):
+        return len(self.provider_assignments)
+
+    def filter(self, predicate: Callable[[ProviderAssignment], bool]) -> 'EntitiesView':
+        return EntitiesView(self.container, (pa for pa in self.provider_assignments if predicate(pa)))
+
+    def _filter_by_lookup(self, keys: Iterable, lookup: Callable) -> 'EntitiesView':
+        # The container's indexes give the matching assignments directly, so only selected assignments are touched
+        selected = set()
+        for key in keys:
+            selected.update(lookup(key))
+
+        if self.is_unfiltered:
+            return EntitiesView(self.container, selected)
+        return self & EntitiesView(self.container, selected)
+
+    def filter_origin_cities(self, origin_cities: set[City]) -> 'EntitiesView':
+        return self._filter_by_lookup(origin_cities, self.container.assignments_leaving)
+
+    def filter_visiting_cities(self, visiting_cities: set[City]) -> 'EntitiesView':
+        return self._filter_by_lookup(visiting_cities, self.container.assignments_visiting)
+
+    def filter_specialties(self, specialties: set[str]) -> 'EntitiesView':
+        return self._filter_by_lookup(specialties, self.container.assignments_for_specialty)
+
+    @property
+    def provider_assignments(self) -> set[ProviderAssignment] | frozenset[ProviderAssignment]:
+        if self.is_unfiltered:
+            return self.container.provider_assignments
+        return self._provider_assignments
+
+    def _collect_entities(self):
+        origin_cities = set()
+        cities = set()
+        worksites = set()
+        providers = set()
+        for pa in self.provider_assignments:
+            origin_cities.add(pa.origin_city)
+            cities.add(pa.origin_city)
+            cities.add(pa.visiting_city)
+            worksites.add(pa.origin_site)
+            worksites.add(pa.visiting_site)
+            providers.add(pa.provider)
+
+        self._origin_cities = frozenset(origin_cities)
+        self._cities = frozenset(cities)
+        self._worksites = frozenset(worksites)
+        self._providers = frozenset(providers)
+
+    @property
+    def origin_cities(self) -> frozenset:
+        if self._origin_cities is None:
+            self._collect_entities()
+        return self._origin_cities
+
+    @property
+    def cities(self) -> frozenset:
+        if self._cities is None:
+            self._collect_entities()
+        return self._cities
+
+    @property
+    def worksites(self) -> frozenset:
+        if self._worksites is None:
+            self._collect_entities()
+        return self._worksites
+
+    @property
+    def providers(self) -> frozenset:
+        if self._providers is None:
+            self._collect_entities()
+        return self._providers
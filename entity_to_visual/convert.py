@@ -1,13 +1,65 @@
+import logging
+
+import numpy as np
 
 from config_manager import ConfigManager
-from entities.entity_classes import City
+from entities.entity_classes import City, ProviderAssignment
+from entities.factory import EntitiesContainer
+from polygons.polygon_factory import PolygonFactory
+from shared.projection import BatchProjector
+from visualization_elements.element_classes import CityScatter, Line
+
+
+def _log_unplottable(plottable: np.ndarray, entity_name: str) -> np.ndarray:
+    # Cities the joined data had no coordinates for project to NaN and can't be drawn
+    num_unplottable = int(np.count_nonzero(~plottable))
+    if num_unplottable:
+        logging.warning(f"Skipping {num_unplottable} {entity_name} without coordinates.")
+    return plottable
 
 
 class EntityToVisualizationElement:
 
-    def __init__(self, config: ConfigManager = None):
+    def __init__(self, projector: BatchProjector, config: ConfigManager = None):
+        self.projector = projector
         self.config = config or ConfigManager()
 
-    def convert_city_to_scatter(self, city: City):
+    def scatter_radius(self, scatter_size: float = None) -> float:
+        scatter_size = scatter_size or self.config('map_display.scatter_size', float)
+        return scatter_size * self.config('dimensions.units_radius_per_1_scatter_size', float)
+
+    def line_width(self, linewidth: float = None) -> float:
+        linewidth = linewidth or self.config('map_display.linewidth', float)
+        return linewidth * self.config('dimensions.units_per_1_linewidth', float)
+
+    def convert_cities_to_scatters(self,
+                                   entities_container: EntitiesContainer,
+                                   cities: list[City],
+                                   scatter_size: float = None) -> list[CityScatter]:
+        # Projected once per city and cached on the container, then all scatter polygons are built in one call
+        xs, ys = entities_container.project_cities(self.projector).coords(cities)
+        plottable = _log_unplottable(np.isfinite(xs) & np.isfinite(ys), 'cities')
+        polygons = PolygonFactory.create_scatters(xs[plottable], ys[plottable], radius=self.scatter_radius(scatter_size))
+        cities = [city for city, keep in zip(cities, plottable) if keep]
+        # Label placement names its text boxes by the scatter's city_name
+        return [CityScatter(polygon=polygon, algorithm_attributes={'city': city, 'city_name': city.city_name})
+                for city, polygon in zip(cities, polygons)]
 
+    def convert_city_to_scatter(self, entities_container: EntitiesContainer, city: City,
+                                scatter_size: float = None) -> CityScatter:
+        return self.convert_cities_to_scatters(entities_container, [city], scatter_size=scatter_size)[0]
 
+    def convert_assignments_to_lines(self,
+                                     entities_container: EntitiesContainer,
+                                     provider_assignments: list[ProviderAssignment],
+                                     linewidth: float = None) -> list[Line]:
+        projected = entities_container.project_cities(self.projector)
+        x_0, y_0 = projected.coords(assignment.origin_city for assignment in provider_assignments)
+        x_1, y_1 = projected.coords(assignment.visiting_city for assignment in provider_assignments)
+        plottable = _log_unplottable(np.isfinite(x_0) & np.isfinite(y_0) & np.isfinite(x_1) & np.isfinite(y_1),
+                                     'provider assignments')
+        polygons = PolygonFactory.create_lines(x_0[plottable], y_0[plottable], x_1[plottable], y_1[plottable],
+                                               line_width=self.line_width(linewidth))
+        provider_assignments = [assignment for assignment, keep in zip(provider_assignments, plottable) if keep]
+        return [Line(polygon=polygon, algorithm_attributes={'provider_assignment': assignment})
+                for assignment, polygon in zip(provider_assignments, polygons)]
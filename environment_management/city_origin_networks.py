@@ -36,8 +36,8 @@ class CityNetworksHandler:
         return self._networks[assignment.origin_city]
 
     def fill_networks(self, entities_container: EntitiesContainer):
-        for pa in entities_container.provider_assignments:
-            if pa.origin_city in self._networks:
+        for origin_city in entities_container.origin_cities:
+            if origin_city in self._networks:
                 continue
 
-            self._networks[pa.origin_city] = self._get_color()
+            self._networks[origin_city] = self._get_color()
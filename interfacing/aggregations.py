@@ -0,0 +1,80 @@
+from enum import Enum
+
+import pandas as pd
+
+
+class VolumeMetric(Enum):
+    PROVIDERS = 'providers'
+    ASSIGNMENTS = 'assignments'
+    SPECIALTIES = 'specialties'
+    VISITING_SITES = 'visiting_sites'
+
+
+_METRIC_COLUMNS = {
+    VolumeMetric.PROVIDERS: 'consultant_name',
+    VolumeMetric.SPECIALTIES: 'specialty',
+    VolumeMetric.VISITING_SITES: 'visiting_site'
+}
+
+# Approximate visits per month for each frequency code in the VCC export
+FREQUENCY_WEIGHTS = {
+    '<1/MO': 0.5,
+    'PRN': 0.5,
+    '1/MO': 1.0,
+    '1/3WK': 1.44,
+    '2/MO': 2.0,
+    '3/MO': 3.0,
+    '3+/MO': 3.0,
+    '4+/MO': 4.0,
+    '1/WK': 4.33,
+    '2/WK': 8.67,
+    '3+/WK': 13.0
+}
+
+
+def _frequency_weights(df: pd.DataFrame) -> pd.Series:
+    # Unknown or missing frequencies count as a single monthly visit
+    return df['frequency'].astype(object).map(FREQUENCY_WEIGHTS).fillna(1.0).astype(float)
+
+
+def compute_volumes(df: pd.DataFrame,
+                    metric: VolumeMetric = VolumeMetric.ASSIGNMENTS,
+                    group_column: str = 'origin_city',
+                    weighted: bool = False) -> pd.Series:
+    if metric == VolumeMetric.ASSIGNMENTS:
+        if not weighted:
+            return df.groupby(group_column, observed=True, sort=False).size()
+        return _frequency_weights(df).groupby(df[group_column], observed=True, sort=False).sum()
+
+    value_column = _METRIC_COLUMNS[metric]
+    if not weighted:
+        return df.groupby(group_column, observed=True, sort=False)[value_column].nunique()
+
+    # Each distinct (group, value) pair contributes the visit frequency of its most frequent assignment
+    pairs = pd.DataFrame({
+        'group': df[group_column].to_numpy(),
+        'value': df[value_column].to_numpy(),
+        'weight': _frequency_weights(df).to_numpy()
+    })
+    pair_weights = pairs.groupby(['group', 'value'], sort=False)['weight'].max()
+    return pair_weights.groupby(level='group', sort=False).sum()
+
+
+def top_k(volumes: pd.Series, k: int) -> pd.Series:
+    if k <= 0:
+        return volumes.iloc[:0]
+
+    # Groups that never occur aren't candidates, even when fewer than k groups occur
+    volumes = volumes[volumes > 0]
+
+    # Partial selection instead of a full sort, ties go to the group that comes first in the aggregation
+    return volumes.nlargest(k, keep='first')
+
+
+def top_volume_groups(df: pd.DataFrame,
+                      num_results: int,
+                      metric: VolumeMetric = VolumeMetric.ASSIGNMENTS,
+                      group_column: str = 'origin_city',
+                      weighted: bool = False) -> list:
+    volumes = compute_volumes(df, metric=metric, group_column=group_column, weighted=weighted)
+    return top_k(volumes, num_results).index.tolist()
@@ -13,6 +13,7 @@ from plotting import VisualizationElementResult
 from text_box_algorithm.rtree_elements_manager import RtreeElementsManager
 from text_box_algorithm.textbox_placement_algorithm import TextboxPlacementAlgorithm
 from . import data_functions, helper_functions
+from entities.aggregates import create_city_aggregates
 from entities.factory import EntitiesFactory
 from text_box_algorithm
 
@@ -42,10 +43,12 @@ class ApplicationManager:
         highest_volume_cities = data_functions.get_top_volume_origin_cities(df=self.df,
                                                                             num_results=number_of_results)
 
-        provider_assignments = self.entities_container.provider_assignments
+        high_volume_origin_cities = [city for city in self.entities_container.origin_cities
+                                     if city.city_name in highest_volume_cities]
         visiting_from_high_vol_city = set(
-            assignment.visiting_city_name for assignment in provider_assignments
-            if assignment.origin_city_name in highest_volume_cities
+            assignment.visiting_city.city_name
+            for origin_city in high_volume_origin_cities
+            for assignment in self.entities_container.assignments_leaving(origin_city)
         )
         all_plot_cities = set(highest_volume_cities) | visiting_from_high_vol_city
         conditions_map = plotting.HighestOriginVolumeController(
@@ -70,7 +73,10 @@ class ApplicationManager:
     def create_number_of_visiting_providers_map(self):
         logging.info("Creating number of providers by visiting site mapping.")
 
-        conditions_map = plotting.NumberOfVisitingProvidersConditionsController(config=self.config)
+        conditions_map = plotting.NumberOfVisitingProvidersConditionsController(
+            config=self.config,
+            city_aggregates=create_city_aggregates(self.entities_container)
+        )
         vis_element_plot_controller = plotting.PlotController(
             config=self.config,
             show_line=False,
@@ -1,74 +1,272 @@
-import copy
 import logging
+import os
 
-import matplotlib
+import numpy as np
 import pandas as pd
 
 from config_manager import ConfigManager
+from entities.aggregates import create_city_aggregates
+from entities.diff import AssignmentsDiff, ExportUpdate, update_entities_from_export
+from entities.entity_classes import City, ProviderAssignment
 from entities.factory import EntitiesFactory, EntitiesContainer
+from entities.snapshot import EntitiesSnapshotCache
+from entities.views import EntitiesView
+from entity_to_visual.convert import EntityToVisualizationElement
 from environment_management.city_origin_networks import CityNetworksHandler
 from mapping import MapPlotter
-from plotting import NumberOfVisitingProvidersConditionsController, PlotController, PlotManager
-from text_box_algorithm.rtree_elements_manager import RtreeElementsManager
-from text_box_algorithm.textbox_placement_algorithm import TextboxPlacementAlgorithm
-from . import application_manager
+from mapping.text_metrics import TextMeasurer
+from polygons.polygon_factory import PolygonFactory
+from shared.projection import create_iowa_projector
+from text_box_algorithm import AlgorithmHandler
+from text_box_algorithm.global_placement import PlacementRequest
+from text_box_algorithm.incremental_layout import LayoutCache
+from visualization_elements.element_classes import CityScatter, Line, TextBox
 from .power_bi_output_formatter import PowerBiOutputFormatter
 
 
+class MapLayout:
+
+    def __init__(self, city_scatters: list[CityScatter], lines: list[Line], text_boxes: dict[CityScatter, TextBox]):
+        self.city_scatters = city_scatters
+        self.lines = lines
+        # CityScatter -> TextBox for every labeled city
+        self.text_boxes = text_boxes
+
+
 class OperationsCoordinator:
 
-    def __init__(self, vcc_df: pd.DataFrame):
-        self._entities_container = EntitiesFactory.create_entities(vcc_df)
-        self._city_networks_handler = CityNetworksHandler().fill_networks(entities_container=self._entities_container)
+    def __init__(self,
+                 vcc_df: pd.DataFrame = None,
+                 entities_container: EntitiesContainer = None,
+                 export_update: ExportUpdate = None,
+                 layout_cache: LayoutCache = None):
+        self._entities_container = entities_container or EntitiesFactory.create_entities(vcc_df)
+        # With both, maps keep the labels of the previous export that its changes couldn't have moved
+        self._export_update = export_update
+        self._layout_cache = layout_cache
+        self._city_networks_handler = CityNetworksHandler()
+        self._city_networks_handler.fill_networks(entities_container=self._entities_container)
 
-        config = ConfigManager()
-        self.text_box_algorithm = TextboxPlacementAlgorithm(
-            rtree_manager=RtreeElementsManager(),
-            city_buffer=config('text_box_algorithm.city_to_text_box_buffer', int),
-            number_of_search_steps=config('text_box_algorithm.search_steps', int)
-        )
+        self.config = ConfigManager()
 
-        if config('display.show_display', bool):
+        # Placement only needs the projection, the Basemap figure is built only when it will be shown
+        self.projector = create_iowa_projector()
+        self.entity_converter = EntityToVisualizationElement(self.projector, config=self.config)
+        fig_size = (self.config('display.fig_size_x', int), self.config('display.fig_size_y', int))
+        self.map_plotter = None
+        if self.config('map_display.show_display', bool):
             self.map_plotter = MapPlotter(
-                config_=config,
-                display_fig_size=(config('display.fig_size_x', int),
-                                  config('display.fig_size_y', int)
-                                  ),
-                county_line_width=config('display.county_line_width', float)
+                config_=self.config,
+                display_fig_size=fig_size,
+                county_line_width=self.config('display.county_line_width', float)
             )
+            self.text_measurer = self.map_plotter.text_measurer
+        else:
+            self.text_measurer = TextMeasurer.for_figure(self.projector, fig_size=fig_size)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, city_name_changes: dict = None, chunksize: int = None, use_snapshot: bool = True):
+        config = ConfigManager()
+        chunksize = chunksize or config('ingest.chunksize', int)
+        if not use_snapshot:
+            return cls(entities_container=EntitiesFactory.create_entities_from_csv(
+                csv_path, chunksize=chunksize, city_name_changes=city_name_changes))
+
+        # A changed export is applied as a diff to its previous snapshot, and the diff decides which labels move
+        snapshot_dir = config('ingest.snapshot_dir', str)
+        export_update = update_entities_from_export(
+            csv_path,
+            snapshot_cache=EntitiesSnapshotCache(snapshot_dir),
+            city_name_changes=city_name_changes,
+            chunksize=chunksize
+        )
+        return cls(entities_container=export_update.entities_container,
+                   export_update=export_update,
+                   layout_cache=LayoutCache(os.path.join(snapshot_dir, 'layouts')))
+
+    @staticmethod
+    def _format_city_label(city_name: str) -> str:
+        # We don't want Iowa cities to have the state abbreviation
+        return city_name.replace(', IA', '')
+
+    def _create_placement_requests(self, city_scatters: list[CityScatter]) -> list[PlacementRequest]:
+        # Measured from font metrics in one batch, no figure is needed
+        font, font_size, font_weight = self.config.fetch_config_values('map_display.text',
+                                                                       ['font', 'fontsize', 'fontweight'],
+                                                                       [str, float, str])
+        widths, heights = self.text_measurer.measure_many(
+            [self._format_city_label(scatter.algorithm_attributes['city_name']) for scatter in city_scatters],
+            font=font,
+            size=font_size,
+            weight=font_weight
+        )
+        return [PlacementRequest(city_scatter, text_width=width, text_height=height)
+                for city_scatter, width, height in zip(city_scatters, widths.tolist(), heights.tolist())]
+
+    def _changed_polygons(self, diff: AssignmentsDiff) -> list:
+        # Scatters and lines of everything the diff touched, removed ones included, so they are projected here
+        # instead of through the container
+        cities = list(diff.affected_cities)
+        xs, ys = self.projector.project(np.array([city.city_coord.lon for city in cities], dtype=np.float64),
+                                        np.array([city.city_coord.lat for city in cities], dtype=np.float64))
+        plottable = np.isfinite(xs) & np.isfinite(ys)
+        polygons = list(PolygonFactory.create_scatters(xs[plottable], ys[plottable],
+                                                       radius=self.entity_converter.scatter_radius()))
+
+        coords = dict(zip(cities, zip(xs.tolist(), ys.tolist())))
+        segments = np.array([(*coords[pa.origin_city], *coords[pa.visiting_city])
+                             for pa in diff.provider_assignments], dtype=np.float64).reshape(-1, 4)
+        segments = segments[np.isfinite(segments).all(axis=1)]
+        polygons.extend(PolygonFactory.create_lines(*segments.T, line_width=self.entity_converter.line_width()))
+        return polygons
+
+    def _reuse_text_boxes(self,
+                          algorithm_handler: AlgorithmHandler,
+                          requests: list[PlacementRequest],
+                          lines: list[Line],
+                          map_name: str) -> dict[City, TextBox]:
+        export_update = self._export_update
+        if self._layout_cache is None or map_name is None or export_update is None or export_update.diff is None:
+            return dict()
+
+        previous_text_boxes = self._layout_cache.load(export_update.previous_key, map_name)
+        if not previous_text_boxes:
+            return dict()
 
-    def create_map(self, conditions_controller):
+        # A label is only kept while its city's label still measures the same
+        text_boxes = dict()
+        new_cities = set()
+        for request in requests:
+            city = request.city_scatter.algorithm_attributes['city']
+            text_box = previous_text_boxes.pop(city, None)
+            if text_box is None:
+                new_cities.add(city)
+                continue
 
-    def create_high_volume_line_map(self, number_of_origin_cities: int):
+            x_min, y_min, x_max, y_max = text_box.polygon.bounds
+            if np.allclose((x_max - x_min, y_max - y_min), (request.text_width, request.text_height)):
+                text_boxes[city] = text_box
+                algorithm_handler.add_visualization_element(text_box)
 
+        # Besides the diff, the map itself can gain or lose cities, like when the highest volume cities change
+        changed_polygons = self._changed_polygons(export_update.diff)
+        changed_polygons.extend(text_box.polygon for text_box in previous_text_boxes.values())
+        changed_polygons.extend(request.city_scatter.polygon for request in requests
+                                if request.city_scatter.algorithm_attributes['city'] in new_cities)
+        changed_polygons.extend(line.polygon for line in lines
+                                if {line.algorithm_attributes['provider_assignment'].origin_city,
+                                    line.algorithm_attributes['provider_assignment'].visiting_city} & new_cities)
 
-    def create_line_map(self, entities_container: EntitiesContainer = None):
-        entities_container = entities_container or self._entities_container
+        updater = algorithm_handler.create_incremental_updater()
+        stale_cities = updater.find_stale_cities(export_update.diff.affected_cities, changed_polygons, text_boxes)
+        updater.release_text_boxes(stale_cities, text_boxes)
+        logging.info(f"Kept {len(text_boxes)} labels of the previous '{map_name}' map.")
+        return text_boxes
 
-    def create_number_of_visiting_providers_map(self, output_path: str, **kwargs):
+    def create_map(self,
+                   cities: list[City],
+                   provider_assignments: list[ProviderAssignment] = (),
+                   scatter_sizes: list[float] = None,
+                   map_name: str = None) -> MapLayout:
+        # Every scatter and line comes from the container's cached projection, built in one batch each
+        if scatter_sizes is None:
+            city_scatters = self.entity_converter.convert_cities_to_scatters(self._entities_container, cities)
+        else:
+            city_scatters = []
+            for scatter_size in sorted(set(scatter_sizes)):
+                sized_cities = [city for city, size in zip(cities, scatter_sizes) if size == scatter_size]
+                city_scatters.extend(self.entity_converter.convert_cities_to_scatters(
+                    self._entities_container, sized_cities, scatter_size=scatter_size))
+        lines = self.entity_converter.convert_assignments_to_lines(self._entities_container,
+                                                                   list(provider_assignments))
+
+        algorithm_handler = AlgorithmHandler(config=self.config, polygon_factory_=PolygonFactory())
+        for element in [*lines, *city_scatters]:
+            algorithm_handler.add_visualization_element(element)
+
+        requests = self._create_placement_requests(city_scatters)
+        kept_text_boxes = self._reuse_text_boxes(algorithm_handler, requests, lines, map_name)
+        result = algorithm_handler.place_text_boxes(
+            [request for request in requests
+             if request.city_scatter.algorithm_attributes['city'] not in kept_text_boxes],
+            city_buffer=self.config('algo.city_to_text_box_buffer', int),
+            number_of_steps=self.config('algo.search_steps', int)
+        )
+        text_boxes = {city_scatter: kept_text_boxes.get(city_scatter.algorithm_attributes['city'])
+                      or result.text_boxes[city_scatter] for city_scatter in city_scatters}
+
+        if self._layout_cache is not None and map_name is not None and self._export_update is not None:
+            self._layout_cache.save(self._export_update.key, map_name,
+                                    {city_scatter.algorithm_attributes['city']: text_box
+                                     for city_scatter, text_box in text_boxes.items()})
+        return MapLayout(city_scatters=city_scatters, lines=lines, text_boxes=text_boxes)
+
+    def create_high_volume_line_map(self, number_of_origin_cities: int) -> MapLayout:
+        logging.info("Creating highest volume line mapping.")
+
+        # Volume is the number of distinct providers leaving each origin city
+        city_aggregates = create_city_aggregates(self._entities_container)
+        volumes = dict(zip(city_aggregates.cities, city_aggregates.leaving_providers.tolist()))
+        origin_cities = sorted(self._entities_container.origin_cities,
+                               key=lambda city: (-volumes[city], city.city_name))[:number_of_origin_cities]
+
+        view = EntitiesView(self._entities_container).filter_origin_cities(set(origin_cities))
+        return self.create_line_map(view.provider_assignments,
+                                    map_name=f'highest_volume_{number_of_origin_cities}')
+
+    def create_line_map(self, provider_assignments=None, map_name: str = 'line') -> MapLayout:
+        provider_assignments = sorted(provider_assignments if provider_assignments is not None
+                                      else self._entities_container.provider_assignments,
+                                      key=_assignment_sort_key)
+        cities = sorted({city for provider_assignment in provider_assignments
+                         for city in (provider_assignment.origin_city, provider_assignment.visiting_city)},
+                        key=lambda city: city.city_name)
+        return self.create_map(cities=cities, provider_assignments=provider_assignments, map_name=map_name)
+
+    def _visiting_providers_ranges(self) -> list[tuple[float, float, float]]:
+        # (min, max, scatter size) from the num_visiting_providers.range_<n> sections, the last range has no max
+        ranges = []
+        while f'num_visiting_providers.range_{len(ranges) + 1}' in self.config.config:
+            section = self.config.config[f'num_visiting_providers.range_{len(ranges) + 1}']
+            ranges.append((float(section['min']), float(section.get('max', np.inf)), float(section['scatter_size'])))
+        return ranges
+
+    def create_number_of_visiting_providers_map(self, output_path: str, **kwargs) -> MapLayout:
         logging.info("Creating number of providers by visiting site mapping.")
 
-        conditions_map = NumberOfVisitingProvidersConditionsController(config=self.config)
-        vis_element_plot_controller = PlotController(
-            config=self.config,
-            show_line=False,
-            show_visiting_text_box=False)
-        plotter = PlotManager(algorithm_handler=self.algorithm_handler,
-                              map_plotter=self.map_plotter,
-                              plot_controller=vis_element_plot_controller)
-
-        plotted_elements = self._create_map(conditions_map=conditions_map,
-                                            plot_controller=vis_element_plot_controller,
-                                            plot_manager=plotter)
-
-        return plotted_elements
-
-        self.pbif.add_visualization_elements(vis_elements)
-        df = self.pbif.create_df()
-        df.to_csv(output_path)
-
-    def create_highest_volume_line_map(self, output_path: str, results: int):
-        vis_elements = self.application_manager.create_highest_volume_line_map(number_of_results=results)
-        self.pbif.add_visualization_elements(vis_elements)
-        df = self.pbif.create_df()
-        df.to_csv(output_path)
+        city_aggregates = create_city_aggregates(self._entities_container)
+        cities, scatter_sizes = [], []
+        for minimum, maximum, scatter_size in self._visiting_providers_ranges():
+            in_range = city_aggregates.cities_in_range('visiting_providers', minimum, maximum)
+            range_cities = sorted(in_range - set(cities), key=lambda city: city.city_name)
+            cities.extend(range_cities)
+            scatter_sizes.extend([scatter_size] * len(range_cities))
+
+        layout = self.create_map(cities=cities, scatter_sizes=scatter_sizes,
+                                 map_name='number_of_visiting_providers')
+        self.write_layout(layout, output_path)
+        return layout
+
+    def create_highest_volume_line_map(self, output_path: str, results: int) -> MapLayout:
+        layout = self.create_high_volume_line_map(number_of_origin_cities=results)
+        self.write_layout(layout, output_path)
+        return layout
+
+    def write_layout(self, layout: MapLayout, output_path: str):
+        # Projected coordinates of every city on the map, with the bounds of its label
+        coords_df = PowerBiOutputFormatter.create_city_coords_df(
+            self._entities_container.project_cities(self.projector),
+            cities=[city_scatter.algorithm_attributes['city'] for city_scatter in layout.city_scatters]
+        )
+        text_boxes_df = PowerBiOutputFormatter.create_text_boxes_df(
+            [layout.text_boxes[city_scatter] for city_scatter in layout.city_scatters])
+        df = pd.concat([coords_df, text_boxes_df], axis=1)
+        df.to_csv(output_path, index=False)
+        logging.info(f"Wrote {len(df)} cities to {output_path}.")
+
+
+def _assignment_sort_key(provider_assignment: ProviderAssignment) -> tuple:
+    # Sets iterate in hash order, which changes between runs, so maps are built in a fixed order instead
+    return (provider_assignment.origin_city.city_name, provider_assignment.visiting_city.city_name,
+            provider_assignment.origin_site.site_name, provider_assignment.visiting_site.site_name,
+            provider_assignment.provider.provider_name, str(provider_assignment.specialty))
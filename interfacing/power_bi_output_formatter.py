@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 
-from visualization_elements import Line, CityScatter, Best
+from entities.projection import ProjectedCities
+from visualization_elements.element_classes import Line, CityScatter, TextBox
 
 
 class PowerBiOutputFormatter:
@@ -11,13 +13,13 @@ class PowerBiOutputFormatter:
         self.vis_element_columns = {
             Line: ['x_data', 'y_data', 'color', 'linestyle', 'linewidth', 'zorder'],
             CityScatter: ['city_coord', 'marker', 'color', 'edgecolor', 'size', 'label', 'zorder'],
-            Best: ['poly_coord', 'city_name', 'fontsize', 'font', 'color', 'fontweight', 'zorder']
+            TextBox: ['poly_coord', 'city_name', 'fontsize', 'font', 'color', 'fontweight', 'zorder']
         }
 
         self.ele_type_to_col_name = {
             Line: 'line',
             CityScatter: 'scatter',
-            Best: 'text'
+            TextBox: 'text'
         }
 
         self.cols = ['type']
@@ -52,3 +54,24 @@ class PowerBiOutputFormatter:
     def create_df(self):
         return pd.DataFrame(self.rows, columns=self.cols)
 
+    @staticmethod
+    def create_city_coords_df(projected_cities: ProjectedCities, cities: list = None) -> pd.DataFrame:
+        cities = projected_cities.cities if cities is None else list(cities)
+        xs, ys = projected_cities.coords(cities)
+        return pd.DataFrame({
+            'city_name': [city.city_name for city in cities],
+            'lon': [city.city_coord.lon for city in cities],
+            'lat': [city.city_coord.lat for city in cities],
+            'x': xs,
+            'y': ys
+        })
+
+    @staticmethod
+    def create_text_boxes_df(text_boxes: list[TextBox]) -> pd.DataFrame:
+        bounds = np.array([text_box.polygon.bounds for text_box in text_boxes], dtype=np.float64).reshape(-1, 4)
+        return pd.DataFrame({
+            'text_x_min': bounds[:, 0],
+            'text_y_min': bounds[:, 1],
+            'text_x_max': bounds[:, 2],
+            'text_y_max': bounds[:, 3]
+        })
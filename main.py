@@ -4,21 +4,19 @@ from interfacing import operations_coordinator
 
 vcc_file_name = "/vcc_joined_data.csv"
 
-logging.basicConfig(level=logging.INFO)
-
-interface_ = operations_coordinator.OperationsCoordinator(
-    vcc_file_name=vcc_file_name,
-    city_name_changes={
-        'Des Moines': ['West Des Moines', 'Ankeny', 'Johnston'],
-        'Omaha, NE': ['Council Bluffs']
-    }
-)
-"""
-interface_.create_highest_volume_line_map(results=6,
-                                          output_path="C:/Users/austisnyder/programming/programming_i_o_files/visiting_providers.csv")
-"""
-interface_.create_number_of_visiting_providers_map(output_path="C:/Users/austisnyder/programming/programming_i_o_files/num_visiting_providers.csv")
-
-
-
-
+city_name_changes = {
+    'Des Moines': ['West Des Moines', 'Ankeny', 'Johnston'],
+    'Omaha, NE': ['Council Bluffs']
+}
+
+# Label placement workers re-import this module when processes are spawned (Windows), so nothing runs on import
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    interface_ = operations_coordinator.OperationsCoordinator.from_csv(csv_path=vcc_file_name,
+                                                                      city_name_changes=city_name_changes)
+    """
+    interface_.create_highest_volume_line_map(results=6,
+                                              output_path="C:/Users/austisnyder/programming/programming_i_o_files/visiting_providers.csv")
+    """
+    interface_.create_number_of_visiting_providers_map(output_path="C:/Users/austisnyder/programming/programming_i_o_files/num_visiting_providers.csv")
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+
+import matplotlib.image as mpimg
+import matplotlib.pyplot as plt
+import numpy as np
+
+from shared.projection import IOWA_MAP_PARAMETERS, create_iowa_projector
+
+
+def _map_extent() -> tuple[float, float, float, float]:
+    projector = create_iowa_projector()
+    x_min, y_min = projector.project_coord((IOWA_MAP_PARAMETERS['llcrnrlon'], IOWA_MAP_PARAMETERS['llcrnrlat']))
+    x_max, y_max = projector.project_coord((IOWA_MAP_PARAMETERS['urcrnrlon'], IOWA_MAP_PARAMETERS['urcrnrlat']))
+    return x_min, x_max, y_min, y_max
+
+
+def _axes_pixel_size(ax) -> tuple[int, int]:
+    # Where the axes end up once the equal aspect has shrunk them, in the figure's pixels
+    ax.apply_aspect()
+    bbox = ax.get_window_extent()
+    return max(int(round(bbox.width)), 1), max(int(round(bbox.height)), 1)
+
+
+def render_background(size_px: tuple[int, int], dpi: float, county_line_width: float) -> np.ndarray:
+    # map_plotter imports this module, so this import has to wait until render time
+    from .map_plotter import create_iowa_map
+
+    # The axes fill the whole figure so every pixel of the raster lies inside the map extent
+    # The canvas truncates its size to whole pixels, half a pixel extra keeps float error from losing one
+    width_px, height_px = size_px
+    fig = plt.figure(figsize=((width_px + 0.5) / dpi, (height_px + 0.5) / dpi), dpi=dpi)
+    ax = fig.add_axes((0, 0, 1, 1))
+    map_plot = create_iowa_map(ax)
+    map_plot.drawstates()
+    map_plot.drawcounties(linewidth=county_line_width)
+    ax.set_xlim(map_plot.llcrnrx, map_plot.urcrnrx)
+    ax.set_ylim(map_plot.llcrnry, map_plot.urcrnry)
+    ax.set_aspect('auto')
+    ax.set_axis_off()
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+
+    fig.canvas.draw()
+    raster = np.asarray(fig.canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    return raster
+
+
+class BackgroundLayerCache:
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir
+        self._rasters = dict()
+
+    @staticmethod
+    def create_key(size_px: tuple[int, int], dpi: float, county_line_width: float) -> tuple:
+        # The background is always the Iowa basemap, so its parameters stand in for the projection
+        return tuple(sorted(IOWA_MAP_PARAMETERS.items())), tuple(size_px), dpi, county_line_width
+
+    def _raster_path(self, key: tuple) -> str:
+        file_name = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{file_name}.png")
+
+    def get_raster(self, size_px: tuple[int, int], dpi: float, county_line_width: float) -> np.ndarray:
+        key = self.create_key(size_px, dpi=dpi, county_line_width=county_line_width)
+        if key in self._rasters:
+            return self._rasters[key]
+
+        raster_path = self._raster_path(key) if self.cache_dir else None
+        if raster_path and os.path.exists(raster_path):
+            raster = mpimg.imread(raster_path)
+        else:
+            logging.info("Rendering map background.")
+            raster = render_background(size_px, dpi=dpi, county_line_width=county_line_width)
+            if raster_path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                mpimg.imsave(raster_path, raster)
+
+        self._rasters[key] = raster
+        return raster
+
+    def draw(self, ax, county_line_width: float, zorder: int = 0):
+        x_min, x_max, y_min, y_max = _map_extent()
+        ax.set_xlim(x_min, x_max)
+        ax.set_ylim(y_min, y_max)
+        ax.set_aspect('equal')
+        ax.set_axis_off()
+
+        # Rendered at the size the axes are shown at, so imshow doesn't resample the thin county lines
+        raster = self.get_raster(_axes_pixel_size(ax), dpi=ax.figure.dpi, county_line_width=county_line_width)
+        image = ax.imshow(raster, extent=(x_min, x_max, y_min, y_max), origin='upper', zorder=zorder,
+                          interpolation='antialiased')
+        ax.set_xlim(x_min, x_max)
+        ax.set_ylim(y_min, y_max)
+        return image
+
+
+_background_layer_caches = dict()
+
+
+def get_background_layer_cache(cache_dir: str = None) -> BackgroundLayerCache:
+    # Shared by every figure in the process, so a series of maps renders the background once
+    if cache_dir not in _background_layer_caches:
+        _background_layer_caches[cache_dir] = BackgroundLayerCache(cache_dir)
+
+    return _background_layer_caches[cache_dir]
@@ -1,7 +1,10 @@
 import matplotlib.pyplot as plt
-from mpl_toolkits import basemap
 
 import config_manager
+from entities.entity_classes import City
+from shared.projection import IOWA_MAP_PARAMETERS, create_iowa_projector
+from .background import get_background_layer_cache
+from .text_metrics import TextMeasurer
 
 
 def convert_bbox_to_data_coordinates(ax, bbox):
@@ -18,13 +21,14 @@ def convert_bbox_to_data_coordinates(ax, bbox):
     return text_box_dimensions
 
 
-def _create_iowa_map(ax):
+def create_iowa_map(ax):
+    # Imported here so headless runs never load basemap or its boundary data
+    from mpl_toolkits import basemap
+
     return basemap.Basemap(projection='lcc',
                            resolution='i',
-                           lat_0=41.5, lon_0=-93.5,  # Central latitude and longitude
-                           llcrnrlon=-97, llcrnrlat=40,  # Lower-left corner
-                           urcrnrlon=-89, urcrnrlat=44,  # Upper-right corner
-                           ax=ax)
+                           ax=ax,
+                           **IOWA_MAP_PARAMETERS)
 
 
 class MapPlotter:
@@ -39,36 +43,44 @@ class MapPlotter:
 
         self.ax.set_title("Main")
 
-        self.map_plot = _create_iowa_map(self.ax)
-        self.map_plot.drawstates()
-        self.map_plot.drawcounties(linewidth=county_line_width)
+        # Same projection as create_iowa_map, so projections cached by headless runs are reused here
+        self.projector = create_iowa_projector()
+
+        background_cache = get_background_layer_cache(config_('display.background_cache_dir', str))
+        background_cache.draw(self.ax, county_line_width=county_line_width)
+
+        self.text_measurer = TextMeasurer.from_axes(self.ax)
 
     def convert_coord_to_display(self, coord: tuple):
-        lon, lat = coord
-        convert_lon, convert_lat = self.map_plot(lon, lat)
-        return convert_lon, convert_lat
+        return self.projector.project_coord(coord)
+
+    def convert_coords_to_display(self, lons, lats) -> tuple:
+        return self.projector.project(lons, lats)
 
-    def get_text_box_dimensions(self, entity: entities.City, font_size: int, font_weight: str, font: str) -> dict:
+    def project_cities(self, entities_container):
+        # Cached on the container so the algorithm, polygons and output writers share one projection pass
+        return entities_container.project_cities(self.projector)
+
+    @staticmethod
+    def _format_city_label(city_name: str) -> str:
         # We don't want Iowa cities to have the state abbreviation
-        city_name = entity.city_name.replace(', IA', '')
-        city_text = self.ax.text(0, 0, city_name,
-                                 fontsize=font_size,
-                                 font=font,
-                                 ha='center',
-                                 va='center',
-                                 color='purple',
-                                 fontweight=font_weight,
-                                 zorder=0,
-                                 bbox=dict(facecolor='white', edgecolor='white', boxstyle='square,pad=0.0'))
-        bbox = city_text.get_window_extent()
-        bbox_coords = bbox.transformed(self.ax.transData.inverted())
+        return city_name.replace(', IA', '')
+
+    def get_text_box_dimensions(self, entity: City, font_size: int, font_weight: str, font: str) -> dict:
+        x_min, y_min, x_max, y_max = self.get_text_box_bounds([entity], xs=[0], ys=[0], font_size=font_size,
+                                                              font_weight=font_weight, font=font)[0]
         return {
-            'x_min': bbox_coords.xmin,
-            'y_min': bbox_coords.ymin,
-            'x_max': bbox_coords.xmax,
-            'y_max': bbox_coords.ymax
+            'x_min': float(x_min),
+            'y_min': float(y_min),
+            'x_max': float(x_max),
+            'y_max': float(y_max)
         }
 
+    def get_text_box_bounds(self, cities, xs, ys, font_size: int, font_weight: str, font: str):
+        # Measured from font metrics, no text artists are created
+        labels = [self._format_city_label(city.city_name) for city in cities]
+        return self.text_measurer.text_box_bounds(labels, xs=xs, ys=ys, font=font, size=font_size, weight=font_weight)
+
     """
         def plot_element(self, vis_element, zorder: int,
                  override_coord: tuple = None):
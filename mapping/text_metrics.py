@@ -0,0 +1,99 @@
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import get_hinting_flag
+from matplotlib.font_manager import FontProperties, findfont, get_font
+
+from shared.projection import IOWA_MAP_PARAMETERS, BatchProjector
+
+# matplotlib's default subplot position as (left, bottom, width, height) in figure fractions
+DEFAULT_AXES_RECT = (0.125, 0.11, 0.775, 0.77)
+
+_POINTS_PER_INCH = 72
+
+
+def map_units_per_point(projector: BatchProjector,
+                        fig_size: tuple,
+                        axes_rect: tuple = DEFAULT_AXES_RECT) -> float:
+    # With an equal aspect the map is fitted inside the axes, so the tighter of the two directions sets the scale
+    x_min, y_min = projector.project_coord((IOWA_MAP_PARAMETERS['llcrnrlon'], IOWA_MAP_PARAMETERS['llcrnrlat']))
+    x_max, y_max = projector.project_coord((IOWA_MAP_PARAMETERS['urcrnrlon'], IOWA_MAP_PARAMETERS['urcrnrlat']))
+    axes_width = fig_size[0] * axes_rect[2]
+    axes_height = fig_size[1] * axes_rect[3]
+    units_per_inch = max((x_max - x_min) / axes_width, (y_max - y_min) / axes_height)
+    return units_per_inch / _POINTS_PER_INCH
+
+
+class TextMeasurer:
+
+    def __init__(self, map_units_per_point_: float, dpi: float = None):
+        self.map_units_per_point = map_units_per_point_
+        # Glyphs are hinted to whole pixels, so extents depend slightly on the dpi the map is rendered at
+        self.dpi = dpi or matplotlib.rcParams['figure.dpi']
+
+        self._font_paths = dict()
+        # (width, height) in points by (label, font, size, weight)
+        self._extents = dict()
+
+    @classmethod
+    def for_figure(cls,
+                   projector: BatchProjector,
+                   fig_size: tuple,
+                   dpi: float = None,
+                   axes_rect: tuple = DEFAULT_AXES_RECT):
+        return cls(map_units_per_point(projector, fig_size=fig_size, axes_rect=axes_rect), dpi=dpi)
+
+    @classmethod
+    def from_axes(cls, ax):
+        # Uses the axes' actual data transform, e.g. for a figure with a non-default layout
+        ax.apply_aspect()
+        inches_to_data = ax.figure.dpi_scale_trans + ax.transData.inverted()
+        (x_0, _), (x_1, _) = inches_to_data.transform([(0, 0), (1, 0)])
+        return cls(abs(x_1 - x_0) / _POINTS_PER_INCH, dpi=ax.figure.dpi)
+
+    def _get_font(self, font: str, size: float, weight: str):
+        key = (font, weight)
+        if key not in self._font_paths:
+            self._font_paths[key] = findfont(FontProperties(family=font, weight=weight))
+
+        ft2_font = get_font(self._font_paths[key])
+        ft2_font.set_size(size, self.dpi)
+        return ft2_font
+
+    def _text_metrics(self, ft2_font, text: str) -> tuple[float, float, float]:
+        # Same measurement the Agg renderer makes, in pixels
+        ft2_font.set_text(text, 0.0, flags=get_hinting_flag())
+        width, height = ft2_font.get_width_height()
+        return width / 64, height / 64, ft2_font.get_descent() / 64
+
+    def measure(self, label: str, font: str, size: float, weight: str, rotation: float = 0.0) -> tuple[float, float]:
+        key = (label, font, size, weight)
+        if key not in self._extents:
+            ft2_font = self._get_font(font, size=size, weight=weight)
+            width, height, _ = self._text_metrics(ft2_font, label)
+            # Like Text layout, a line is never shorter than one holding both an ascender and a descender
+            _, line_height, _ = self._text_metrics(ft2_font, 'lp')
+            height = max(height, line_height)
+            pixels_to_points = _POINTS_PER_INCH / self.dpi
+            self._extents[key] = (width * pixels_to_points, height * pixels_to_points)
+
+        width, height = self._extents[key]
+        if rotation % 360 == 0:
+            return width, height
+
+        # Like Text layout, a rotated label takes up the axis-aligned box around its rotated extent
+        cos, sin = abs(np.cos(np.radians(rotation))), abs(np.sin(np.radians(rotation)))
+        return float(width * cos + height * sin), float(width * sin + height * cos)
+
+    def measure_many(self, labels, font: str, size: float, weight: str,
+                     rotation: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+        extents = np.array([self.measure(label, font=font, size=size, weight=weight, rotation=rotation)
+                            for label in labels], dtype=np.float64).reshape(-1, 2)
+        return extents[:, 0] * self.map_units_per_point, extents[:, 1] * self.map_units_per_point
+
+    def text_box_bounds(self, labels, xs, ys, font: str, size: float, weight: str,
+                        rotation: float = 0.0) -> np.ndarray:
+        # (N, 4) array of x_min, y_min, x_max, y_max for labels centered on (xs, ys)
+        widths, heights = self.measure_many(labels, font=font, size=size, weight=weight, rotation=rotation)
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        return np.column_stack([xs - widths / 2, ys - heights / 2, xs + widths / 2, ys + heights / 2])
@@ -1,11 +1,11 @@
-import copy
-import logging
 from abc import ABC
 from collections.abc import Callable
 from typing import Union
 
+from entities.aggregates import CityAggregates, create_city_aggregates
 from entities.entity_classes import ProviderAssignment, City
 from entities.factory import EntitiesContainer
+from entities.views import EntitiesView
 from visualization_elements.element_classes import VisualizationElement, CityScatter, TextBox, Line, ScatterAttributes
 
 
@@ -55,8 +55,9 @@ class ConditionsController(ABC):
 
 class NumberOfVisitingClinicsConditionsController(ConditionsController):
 
-    def __init__(self, config, **kwargs):
+    def __init__(self, config, city_aggregates: CityAggregates, **kwargs):
         self.config = config
+        self.city_aggregates = city_aggregates
 
         super().__init__(conditions=self._create_conditions())
 
@@ -64,25 +65,25 @@ class NumberOfVisitingClinicsConditionsController(ConditionsController):
         range_1_min = self.config('num_visiting_clinics.range_1_min', int)
         range_1_max = self.config('num_visiting_clinics.range_1_max', int)
 
-        return range_1_min < len(city.visiting_clinics) < range_1_max
+        return city in self.city_aggregates.cities_in_range('visiting_clinics', range_1_min, range_1_max)
 
     def _range_2_condition(self, city: City, **kwargs):
         range_2_min = self.config.get_config_value('num_visiting_clinics.range_2_min', int)
         range_2_max = self.config.get_config_value('num_visiting_clinics.range_2_max', int)
 
-        return range_2_min < len(city.visiting_clinics) < range_2_max
+        return city in self.city_aggregates.cities_in_range('visiting_clinics', range_2_min, range_2_max)
 
     def _range_3_condition(self, city: City, **kwargs):
         range_3_min = self.config.get_config_value('num_visiting_clinics.range_3_min', int)
         range_3_max = self.config.get_config_value('num_visiting_clinics.range_3_max', int)
 
-        return range_3_min < len(city.visiting_clinics) < range_3_max
+        return city in self.city_aggregates.cities_in_range('visiting_clinics', range_3_min, range_3_max)
 
     def _range_4_condition(self, city: City, **kwargs):
         range_4_min = self.config.get_config_value('num_visiting_clinics.range_4_min', int)
         range_4_max = 1e5
 
-        return range_4_min < len(city.visiting_clinics) < range_4_max
+        return city in self.city_aggregates.cities_in_range('visiting_clinics', range_4_min, range_4_max)
 
     def _create_conditions(self) -> list[_Condition]:
         conditions = []
@@ -165,8 +166,8 @@ class HighestOriginVolumeController(ConditionsController):
     def _filter_entities_container(entities_container: EntitiesContainer, origin_cities_limit: int):
         # Volume (int) : set(City, City, City)
         city_volumes = dict()
-        for city in entities_container.cities:
-            num_worksites = len(city.worksites)
+        city_aggregates = create_city_aggregates(entities_container)
+        for city, num_worksites in zip(city_aggregates.cities, city_aggregates.worksites.tolist()):
             if num_worksites not in city_volumes:
                 city_volumes[num_worksites] = set()
 
@@ -179,25 +180,8 @@ class HighestOriginVolumeController(ConditionsController):
             if len(origin_cities) >= origin_cities_limit:
                 break
 
-        # Filter EntitiesContainer based on the high volume origin cities
-        entities_container = copy.deepcopy(entities_container)
-        valid_provider_assignments = set(
-            pa for pa in entities_container.provider_assignments
-            if pa.origin_city in origin_cities
-        )
-        entities_container.provider_assignments = valid_provider_assignments
-        valid_cities = set()
-        valid_worksites = set()
-        for pa in valid_provider_assignments:
-            valid_cities.add(pa.origin_city)
-            valid_cities.add(pa.visiting_city)
-
-            valid_worksites.add(pa.origin_site)
-            valid_worksites.add(pa.visiting_site)
-        entities_container.cities = valid_cities
-        entities_container.worksites = valid_worksites
-        
-        return entities_container
+        # Filter EntitiesContainer based on the high volume origin cities without copying the entity graph
+        return EntitiesView(entities_container).filter_origin_cities(origin_cities)
 
     def _create_visualization_elements(self, config, visualization_element_data: dict):
         visualization_element_1a = CityScatter(
@@ -229,7 +213,7 @@ class HighestOriginVolumeController(ConditionsController):
 
 class NumberOfVisitingProvidersConditionsController(ConditionsController):
 
-    def __init__(self, config):
+    def __init__(self, config, city_aggregates: CityAggregates):
         condition_funcs = [self.range_1_condition,
                            self.range_2_condition,
                            self.range_3_condition,
@@ -242,6 +226,7 @@ class NumberOfVisitingProvidersConditionsController(ConditionsController):
 
         self.conditions = conditions
         self.config = config
+        self.city_aggregates = city_aggregates
         self.entity_types = [City]
 
     def _create_visualization_elements(self, config) -> Union[list[CityScatter], list[CityScatterAndText]]:
@@ -285,35 +270,35 @@ class NumberOfVisitingProvidersConditionsController(ConditionsController):
         range_1_min = self.config.get_config_value('num_visiting_providers.range_1_min', int)
         range_1_max = self.config.get_config_value('num_visiting_providers.range_1_max', int)
 
-        logging.info(f"Found {len(entity.visiting_providers)} visiting providers for {entity.city_name}")
-        return range_1_min < len(entity.visiting_providers) < range_1_max
+        return entity in self.city_aggregates.cities_in_range('visiting_providers', range_1_min, range_1_max)
 
     @apply_to_type(City)
     def range_2_condition(self, entity: Entity, **kwargs):
         range_2_min = self.config.get_config_value('num_visiting_providers.range_2_min', int)
         range_2_max = self.config.get_config_value('num_visiting_providers.range_2_max', int)
 
-        return range_2_min < len(entity.visiting_providers) < range_2_max
+        return entity in self.city_aggregates.cities_in_range('visiting_providers', range_2_min, range_2_max)
 
     @apply_to_type(City)
     def range_3_condition(self, entity: Entity, **kwargs):
         range_3_min = self.config.get_config_value('num_visiting_providers.range_3_min', int)
         range_3_max = self.config.get_config_value('num_visiting_providers.range_3_max', int)
 
-        return range_3_min < len(entity.visiting_providers) < range_3_max
+        return entity in self.city_aggregates.cities_in_range('visiting_providers', range_3_min, range_3_max)
 
     @apply_to_type(City)
     def range_4_condition(self, entity: Entity, **kwargs):
         range_4_min = self.config.get_config_value('num_visiting_providers.range_4_min', int)
         range_4_max = 1e5
 
-        return range_4_min < len(entity.visiting_providers) < range_4_max
+        return entity in self.city_aggregates.cities_in_range('visiting_providers', range_4_min, range_4_max)
 
 
 class NumberOfVisitingSpecialtiesConditionsController(ConditionsController):
 
-    def __init__(self, config):
+    def __init__(self, config, city_aggregates: CityAggregates):
         self.config = config
+        self.city_aggregates = city_aggregates
         self.entity_types = [City]
         condition_funcs = [self.range_1_condition,
                            self.range_2_condition,
@@ -344,16 +329,16 @@ class NumberOfVisitingSpecialtiesConditionsController(ConditionsController):
         range_1_min = self.config.get_config_value('num_visiting_specialties.range_1_min', int)
         range_1_max = self.config.get_config_value('num_visiting_specialties.range_1_max', int)
 
-        return range_1_min < len(entity.visiting_specialties) < range_1_max
+        return entity in self.city_aggregates.cities_in_range('visiting_specialties', range_1_min, range_1_max)
 
     def range_2_condition(self, entity: Entity, **kwargs):
         range_2_min = self.config.get_config_value('num_visiting_specialties.range_2_min', int)
         range_2_max = self.config.get_config_value('num_visiting_specialties.range_2_max', int)
 
-        return range_2_min < len(entity.visiting_specialties) < range_2_max
+        return entity in self.city_aggregates.cities_in_range('visiting_specialties', range_2_min, range_2_max)
 
     def range_3_condition(self, entity: Entity, **kwargs):
         range_3_min = self.config.get_config_value('num_visiting_specialties.range_3_min', int)
         range_3_max = self.config.get_config_value('num_visiting_specialties.range_3_max', int)
 
-        return range_3_min < len(entity.visiting_specialties) < range_3_max
+        return entity in self.city_aggregates.cities_in_range('visiting_specialties', range_3_min, range_3_max)
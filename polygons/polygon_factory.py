@@ -1,8 +1,8 @@
 import numpy as np
+import shapely
 from shapely.geometry import Polygon, LineString, box
 
 from shared.shared_utils import Coordinate
-from . import polygon_utils
 
 
 class PolygonFactory:
@@ -35,3 +35,27 @@ class PolygonFactory:
                          y_max) -> Polygon:
         return box(x_min, y_min, x_max, y_max)
 
+    @staticmethod
+    def create_lines(x_0: np.ndarray,
+                     y_0: np.ndarray,
+                     x_1: np.ndarray,
+                     y_1: np.ndarray,
+                     line_width: float
+                     ) -> np.ndarray:
+        # One (N, 2, 2) coordinate array instead of a LineString per edge
+        coords = np.stack([np.column_stack([x_0, y_0]), np.column_stack([x_1, y_1])], axis=1)
+        lines = shapely.linestrings(coords)
+        # Same rounding as LineString.buffer in create_line, shapely.buffer defaults to half its segments
+        return shapely.buffer(lines, line_width / 2, quad_segs=16)
+
+    @staticmethod
+    def create_scatters(xs: np.ndarray,
+                        ys: np.ndarray,
+                        radius: int = 100,
+                        num_points=8
+                        ) -> np.ndarray:
+        angles = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
+        angles = np.append(angles, angles[0])  # Close the polygon rings
+        ring_xs = np.asarray(xs, dtype=np.float64)[:, None] + radius * np.cos(angles)
+        ring_ys = np.asarray(ys, dtype=np.float64)[:, None] + radius * np.sin(angles)
+        return shapely.polygons(np.stack([ring_xs, ring_ys], axis=-1))
@@ -1,16 +1,13 @@
 import matplotlib.pyplot as plt
-from mpl_toolkits import basemap
+
+from config_manager import ConfigManager
+from mapping.background import get_background_layer_cache
 
 display_fig_size = (20, 15)
 county_line_width = 0.05
 fig, ax = plt.subplots(figsize=display_fig_size)
-iowa_map = basemap.Basemap(projection='lcc', resolution='i',
-                           lat_0=41.5, lon_0=-93.5,  # Central latitude and longitude
-                           llcrnrlon=-97, llcrnrlat=40,  # Lower-left corner
-                           urcrnrlon=-89, urcrnrlat=44,  # Upper-right corner
-                           ax=ax)
-iowa_map.drawstates()
-iowa_map.drawcounties(linewidth=county_line_width)
+get_background_layer_cache(ConfigManager()('display.background_cache_dir', str)).draw(
+    ax, county_line_width=county_line_width)
 
 line_zorder = 0
 scatter_zorder = 2
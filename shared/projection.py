@@ -0,0 +1,106 @@
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+from .shared_utils import Coordinate
+
+# Same map as mapping.map_plotter.create_iowa_map, shared so the headless projection can't drift from it
+IOWA_MAP_PARAMETERS = {
+    'lat_0': 41.5, 'lon_0': -93.5,  # Central latitude and longitude
+    'llcrnrlon': -97, 'llcrnrlat': 40,  # Lower-left corner
+    'urcrnrlon': -89, 'urcrnrlat': 44  # Upper-right corner
+}
+
+# Basemap's default sphere radius in meters
+BASEMAP_SPHERE_RADIUS = 6370997.0
+
+
+class BatchProjector:
+
+    def __init__(self, transform: Callable[[np.ndarray, np.ndarray], tuple], key: tuple):
+        # transform takes whole lon/lat arrays, e.g. a Basemap instance, and key identifies the projection in caches
+        self._transform = transform
+        self.key = key
+
+    @classmethod
+    def from_basemap(cls, map_plot):
+        key = ('basemap',
+               tuple(sorted(map_plot.projparams.items())),
+               map_plot.llcrnrlon, map_plot.llcrnrlat, map_plot.urcrnrlon, map_plot.urcrnrlat)
+        return cls(transform=map_plot, key=key)
+
+    def project(self, lons, lats) -> tuple[np.ndarray, np.ndarray]:
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        if lons.size == 0:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+
+        xs, ys = self._transform(lons, lats)
+        return np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+
+    def project_coordinates(self, coords: Iterable[Coordinate]) -> tuple[np.ndarray, np.ndarray]:
+        coords = list(coords)
+        return self.project([coord.lon for coord in coords], [coord.lat for coord in coords])
+
+    def project_coord(self, coord) -> tuple[float, float]:
+        lon, lat = (coord.lon, coord.lat) if isinstance(coord, Coordinate) else coord
+        xs, ys = self.project([lon], [lat])
+        return float(xs[0]), float(ys[0])
+
+
+class LambertConformalConic:
+
+    def __init__(self,
+                 lat_0: float,
+                 lon_0: float,
+                 llcrnrlon: float,
+                 llcrnrlat: float,
+                 lat_1: float = None,
+                 lat_2: float = None,
+                 rsphere: float = BASEMAP_SPHERE_RADIUS):
+        # Basemap defaults to a tangent cone at lat_0 and moves the lower-left corner to (0, 0)
+        lat_1 = lat_0 if lat_1 is None else lat_1
+        lat_2 = lat_1 if lat_2 is None else lat_2
+        self.key = ('lcc', lat_0, lon_0, lat_1, lat_2, rsphere, llcrnrlon, llcrnrlat)
+
+        phi_0, phi_1, phi_2 = np.radians([lat_0, lat_1, lat_2])
+        if np.isclose(phi_1, phi_2):
+            self._n = np.sin(phi_1)
+        else:
+            self._n = (np.log(np.cos(phi_1) / np.cos(phi_2))
+                       / np.log(np.tan(np.pi / 4 + phi_2 / 2) / np.tan(np.pi / 4 + phi_1 / 2)))
+        self._rf = rsphere * np.cos(phi_1) * np.tan(np.pi / 4 + phi_1 / 2) ** self._n / self._n
+        self._rho_0 = self._rho(phi_0)
+        self._lam_0 = np.radians(lon_0)
+
+        self._x_0, self._y_0 = 0.0, 0.0
+        x_0, y_0 = self(np.array([llcrnrlon]), np.array([llcrnrlat]))
+        self._x_0, self._y_0 = float(x_0[0]), float(y_0[0])
+
+    def _rho(self, phi):
+        return self._rf / np.tan(np.pi / 4 + phi / 2) ** self._n
+
+    def __call__(self, lons: np.ndarray, lats: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        rho = self._rho(np.radians(lats))
+        theta = self._n * (np.radians(lons) - self._lam_0)
+        xs = rho * np.sin(theta) - self._x_0
+        ys = self._rho_0 - rho * np.cos(theta) - self._y_0
+        return xs, ys
+
+    def inverse(self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        xs = np.asarray(xs, dtype=np.float64) + self._x_0
+        dys = self._rho_0 - (np.asarray(ys, dtype=np.float64) + self._y_0)
+        rho = np.sign(self._n) * np.hypot(xs, dys)
+        theta = np.arctan2(np.sign(self._n) * xs, np.sign(self._n) * dys)
+        lats = 2 * np.arctan((self._rf / rho) ** (1 / self._n)) - np.pi / 2
+        lons = theta / self._n + self._lam_0
+        return np.degrees(lons), np.degrees(lats)
+
+
+def create_iowa_projector() -> BatchProjector:
+    # Headless stand-in for the Basemap projection, no figure or boundary data is loaded
+    lcc = LambertConformalConic(lat_0=IOWA_MAP_PARAMETERS['lat_0'],
+                                lon_0=IOWA_MAP_PARAMETERS['lon_0'],
+                                llcrnrlon=IOWA_MAP_PARAMETERS['llcrnrlon'],
+                                llcrnrlat=IOWA_MAP_PARAMETERS['llcrnrlat'])
+    return BatchProjector(transform=lcc, key=lcc.key)
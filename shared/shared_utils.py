@@ -1,20 +1,40 @@
 from enum import Enum
 
 
+def _coordinate_key(value: float):
+    # NaN never equals itself, so a missing coordinate is compared as None instead
+    return None if value != value else value
+
+
 class Coordinate:
+    __slots__ = ('_lon', '_lat', '_key', '_hash')
 
     def __init__(self, longitude: float, latitude: float):
-        self.lon = longitude
-        self.lat = latitude
+        self._lon = longitude
+        self._lat = latitude
+
+        self._key = (_coordinate_key(longitude), _coordinate_key(latitude))
+        self._hash = hash(self._key)
+
+    @property
+    def lon(self):
+        return self._lon
+
+    @property
+    def lat(self):
+        return self._lat
 
     def __hash__(self):
-        return hash((self.lon, self.lat))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, Coordinate):
             return False
 
-        return self.lon == other.lon and self.lat == other.lat
+        return self._hash == other._hash and self._key == other._key
 
 
 class Direction(Enum):
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+@pytest.fixture
+def joined_csv_path() -> str:
+    return os.path.join(REPO_ROOT, 'vcc_maps', 'vcc_joined_data.csv')
+
+
+@pytest.fixture
+def raw_csv_path() -> str:
+    return os.path.join(REPO_ROOT, 'vcc_maps', 'vcc_raw_data.csv')
+
+
+@pytest.fixture
+def city_coords_path() -> str:
+    return os.path.join(REPO_ROOT, 'vcc_maps', 'city_coords.csv')
+
+
+@pytest.fixture
+def config(monkeypatch):
+    from config_manager import ConfigManager
+
+    # ConfigManager reads config.ini from the working directory
+    monkeypatch.chdir(REPO_ROOT)
+    return ConfigManager()
@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+import numpy as np
+
+from entities.aggregates import create_city_aggregates, create_columnar_city_aggregates, create_worksite_aggregates
+from entities.factory import EntitiesFactory
+
+
+def _expected_counts(container) -> dict:
+    distinct = defaultdict(lambda: defaultdict(set))
+    for pa in container.provider_assignments:
+        distinct['visiting_providers'][pa.visiting_city].add(pa.provider)
+        distinct['visiting_specialties'][pa.visiting_city].add(pa.specialty)
+        distinct['leaving_providers'][pa.origin_city].add(pa.provider)
+        distinct['origin_cities'][pa.visiting_city].add(pa.origin_city)
+        distinct['visiting_clinics'][pa.visiting_city].add(pa.visiting_site)
+    for worksite in container.worksites:
+        distinct['worksites'][worksite.city].add(worksite)
+
+    return {aggregate: {city: len(values) for city, values in by_city.items()}
+            for aggregate, by_city in distinct.items()}
+
+
+def test_city_aggregates_match_assignments(joined_csv_path):
+    container = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    aggregates = create_city_aggregates(container)
+    expected = _expected_counts(container)
+
+    assert aggregates.cities == list(container.cities)
+    for aggregate, by_city in expected.items():
+        counts = getattr(aggregates, aggregate)
+        assert counts.tolist() == [by_city.get(city, 0) for city in aggregates.cities], aggregate
+
+
+def test_columnar_aggregates_match_container(joined_csv_path):
+    container = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    aggregates = create_city_aggregates(container)
+    columnar_aggregates = create_columnar_city_aggregates(EntitiesFactory.convert_to_columnar(container))
+
+    for aggregate in ('visiting_providers', 'visiting_specialties', 'leaving_providers', 'worksites',
+                      'origin_cities', 'visiting_clinics'):
+        np.testing.assert_array_equal(getattr(aggregates, aggregate), getattr(columnar_aggregates, aggregate))
+
+
+def test_cities_in_range_uses_exclusive_bounds(joined_csv_path):
+    container = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    aggregates = create_city_aggregates(container)
+    expected = _expected_counts(container)['visiting_providers']
+
+    in_range = aggregates.cities_in_range('visiting_providers', 2, 10)
+    assert in_range == {city for city in container.cities if 2 < expected.get(city, 0) < 10}
+    assert aggregates.cities_in_range('visiting_providers', 2, 10) is in_range
+
+
+def _expected_worksite_counts(container) -> dict:
+    distinct = defaultdict(lambda: defaultdict(set))
+    for pa in container.provider_assignments:
+        distinct['visiting_providers'][pa.visiting_site].add(pa.provider)
+        distinct['visiting_specialties'][pa.visiting_site].add(pa.specialty)
+        distinct['leaving_providers'][pa.origin_site].add(pa.provider)
+        distinct['origin_cities'][pa.visiting_site].add(pa.origin_city)
+
+    return {aggregate: {worksite: len(values) for worksite, values in by_worksite.items()}
+            for aggregate, by_worksite in distinct.items()}
+
+
+def _assert_aggregates_match(container):
+    aggregates = create_city_aggregates(container)
+    for aggregate, by_city in _expected_counts(container).items():
+        assert getattr(aggregates, aggregate).tolist() == [by_city.get(city, 0) for city in aggregates.cities], \
+            aggregate
+
+    worksite_aggregates = create_worksite_aggregates(container)
+    for aggregate, by_worksite in _expected_worksite_counts(container).items():
+        assert getattr(worksite_aggregates, aggregate).tolist() == \
+            [by_worksite.get(worksite, 0) for worksite in worksite_aggregates.worksites], aggregate
+
+
+def test_worksite_aggregates_match_assignments(joined_csv_path):
+    container = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    _assert_aggregates_match(container)
+
+    for worksite in container.worksites:
+        assert set(worksite.visiting_specialties) == {pa.specialty for pa in container.provider_assignments
+                                                      if pa.visiting_site == worksite}
+
+
+def test_counters_follow_removed_and_added_assignments(joined_csv_path, monkeypatch):
+    container = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    other = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    # Aggregates come from the counters kept at ingest, not from a columnar pass over every assignment
+    monkeypatch.setattr(EntitiesFactory, 'convert_to_columnar', None)
+
+    removed = sorted(other.provider_assignments, key=hash)[::3]
+    for provider_assignment in removed:
+        container.remove_provider_assignment(provider_assignment)
+    _assert_aggregates_match(container)
+
+    for provider_assignment in removed:
+        container.add_provider_assignment(provider_assignment)
+    _assert_aggregates_match(container)
+    assert len(container.provider_assignments) == len(other.provider_assignments)
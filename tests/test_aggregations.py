@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from interfacing.aggregations import VolumeMetric, compute_volumes, top_k, top_volume_groups
+
+
+def test_ties_go_to_the_first_group_in_the_export(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+    volumes = compute_volumes(df)
+    # Mason City and West Des Moines tie on assignments, and West Des Moines comes first in the file
+    assert volumes['Mason City'] == volumes['West Des Moines']
+
+    assert top_volume_groups(df, 4) == ['Omaha, NE', 'Des Moines', 'Iowa City', 'West Des Moines']
+    assert top_volume_groups(df, 5)[-2:] == ['West Des Moines', 'Mason City']
+
+
+@pytest.mark.parametrize('metric', list(VolumeMetric))
+@pytest.mark.parametrize('weighted', [False, True])
+def test_top_k_matches_a_stable_full_sort(joined_csv_path, metric, weighted):
+    df = pd.read_csv(joined_csv_path)
+    volumes = compute_volumes(df, metric=metric, weighted=weighted)
+    expected = volumes.sort_values(ascending=False, kind='stable')
+
+    for k in (1, 5, 20, len(volumes) + 1):
+        assert top_k(volumes, k).index.tolist() == expected.index[:k].tolist()
+
+
+def test_unobserved_categories_are_not_ranked(joined_csv_path):
+    df = pd.read_csv(joined_csv_path, dtype={'origin_city': 'category'})
+    df = df[df['origin_city'] != 'Des Moines']
+
+    volumes = compute_volumes(df)
+    assert 'Des Moines' not in volumes.index
+    assert (volumes > 0).all()
+
+    num_groups = df['origin_city'].nunique()
+    assert len(top_k(volumes, num_groups + 10)) == num_groups
+    assert 'Des Moines' not in top_k(pd.Series({'Des Moines': 0, 'Ames': 2}), 2).index
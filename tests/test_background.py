@@ -0,0 +1,43 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pytest
+
+from mapping import background
+from mapping.background import BackgroundLayerCache
+
+
+@pytest.fixture
+def axes():
+    # A title and a non-square figure, so the axes are smaller than the figure and get shrunk by the equal aspect
+    fig, ax = plt.subplots(figsize=(4, 2), dpi=100)
+    ax.set_title("Main")
+    yield ax
+    plt.close(fig)
+
+
+def test_background_is_rendered_at_the_axes_pixel_size(axes, tmp_path):
+    image = BackgroundLayerCache(str(tmp_path)).draw(axes, county_line_width=0.05)
+
+    bbox = axes.get_window_extent()
+    height, width = image.get_array().shape[:2]
+    assert (width, height) == (round(bbox.width), round(bbox.height))
+    assert (width, height) != (400, 200)
+
+
+def test_background_is_rendered_once_per_size(axes, tmp_path, monkeypatch):
+    calls = []
+    render_background = background.render_background
+
+    def counting_render(*args, **kwargs):
+        calls.append(args)
+        return render_background(*args, **kwargs)
+
+    monkeypatch.setattr(background, 'render_background', counting_render)
+
+    BackgroundLayerCache(str(tmp_path)).draw(axes, county_line_width=0.05)
+    # A fresh cache over the same directory reads the raster back instead of rendering it
+    BackgroundLayerCache(str(tmp_path)).draw(axes, county_line_width=0.05)
+    assert len(calls) == 1
@@ -0,0 +1,257 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from polygons.polygon_factory import PolygonFactory
+from shared.shared_utils import Coordinate
+from text_box_algorithm.budget import PlacementBudget
+from text_box_algorithm.candidates import PerimeterCandidates, PerimeterPath, perimeter_candidate_bounds
+from text_box_algorithm.rtree_elements_manager import RtreeElementsManager
+from text_box_algorithm.textbox_placement_algorithm import (TextboxPlacementAlgorithm, inherit_neighbors,
+                                                            score_finalists, select_finalists)
+from visualization_elements.element_classes import CityScatter, TextBoxClassification
+
+TEXT_WIDTH = 40000
+TEXT_HEIGHT = 7600
+
+
+def _city_scatter(city_name: str, x: float, y: float) -> CityScatter:
+    return CityScatter(polygon=PolygonFactory.create_scatter(Coordinate(longitude=x, latitude=y), radius=1500),
+                       algorithm_attributes={'city_name': city_name})
+
+
+def _text_box(width: float = TEXT_WIDTH, height: float = TEXT_HEIGHT) -> SimpleNamespace:
+    # find_best_poly only reads the text box's bounds
+    return SimpleNamespace(x_min=0.0, y_min=0.0, x_max=width, y_max=height)
+
+
+def _stepped_perimeter_bounds(city_bounds: tuple,
+                              text_width: float,
+                              text_height: float,
+                              city_buffer: float,
+                              number_of_search_steps: int) -> np.ndarray:
+    # The text box walk as it was done before candidate generation was vectorized, one move at a time
+    city_x_min, city_y_min, city_x_max, city_y_max = city_bounds
+    city_x_min, city_y_min = city_x_min - city_buffer, city_y_min - city_buffer
+    city_x_max, city_y_max = city_x_max + city_buffer, city_y_max + city_buffer
+
+    perimeter_movement_amount = (2 * text_height + 2 * text_width) / number_of_search_steps
+    x_step = min(perimeter_movement_amount, text_width)
+    y_step = min(perimeter_movement_amount, text_height)
+
+    x_min, y_min = city_x_min - text_width, city_y_min - text_height
+    bounds = []
+    while x_min < city_x_max:
+        x_min += x_step
+        bounds.append((x_min, y_min, x_min + text_width, y_min + text_height))
+    while y_min < city_y_max:
+        y_min += y_step
+        bounds.append((x_min, y_min, x_min + text_width, y_min + text_height))
+    while x_min + text_width > city_x_min:
+        x_min -= x_step
+        bounds.append((x_min, y_min, x_min + text_width, y_min + text_height))
+    while y_min + text_height > city_y_min:
+        y_min -= y_step
+        bounds.append((x_min, y_min, x_min + text_width, y_min + text_height))
+    return np.array(bounds)
+
+
+@pytest.mark.parametrize('city_bounds, text_width, text_height, city_buffer, number_of_search_steps', [
+    ((-1500, -1500, 1500, 1500), TEXT_WIDTH, TEXT_HEIGHT, 0, 10),
+    ((-1500, -1500, 1500, 1500), TEXT_WIDTH, TEXT_HEIGHT, 0, 40),
+    ((-1500, -1500, 1500, 1500), TEXT_WIDTH, TEXT_HEIGHT, 500, 7),
+    # Uneven, but exactly representable, so the stepped walk has no rounding to trip over
+    ((250.5, -80.25, 2990.75, 3001.5), 12345.5, 2345.25, 120.25, 16),
+    ((0, 0, 100, 100), 10, 10, 0, 3),
+])
+def test_perimeter_candidates_match_the_stepped_walk(city_bounds, text_width, text_height, city_buffer,
+                                                     number_of_search_steps):
+    expected = _stepped_perimeter_bounds(city_bounds, text_width, text_height, city_buffer, number_of_search_steps)
+    bounds = perimeter_candidate_bounds(city_bounds=city_bounds, text_width=text_width, text_height=text_height,
+                                        city_buffer=city_buffer, number_of_search_steps=number_of_search_steps)
+
+    assert bounds.shape == expected.shape
+    np.testing.assert_allclose(bounds, expected, rtol=0, atol=1e-6)
+
+
+def test_finalists_avoid_invalid_candidates_first():
+    counts = np.array([2, 1, 1, 0])
+    invalid_flags = np.array([False, False, False, True])
+    # Candidate 3 crosses nothing else, but it covers a scatter or text box
+    assert select_finalists(counts, invalid_flags).tolist() == [1, 2]
+
+
+def test_finalists_fall_back_to_fewest_intersections_when_all_are_invalid():
+    counts = np.array([3, 1, 2, 1])
+    invalid_flags = np.ones(4, dtype=bool)
+    assert select_finalists(counts, invalid_flags).tolist() == [1, 3]
+
+
+def test_scores_weight_room_to_scatters_and_text_boxes():
+    distances = np.array([[1.0, 2.0],
+                          [3.0, np.inf],
+                          [0.0, np.inf],
+                          [5.0, np.inf]])
+    invalid_mask = np.array([[False, True],
+                             [True, False],
+                             [False, False],
+                             [False, False]])
+
+    scores = score_finalists(distances, invalid_mask)
+
+    # Closest element times the closest scatter or text box squared
+    assert scores[0] == 1.0 * 2.0 ** 2
+    assert scores[1] == 3.0 * 3.0 ** 2
+    # Touching an element scores zero, even with no scatter or text box anywhere near
+    assert scores[2] == 0.0
+    # Only lines nearby leaves all the room in the world
+    assert scores[3] == np.inf
+
+
+def test_scores_without_any_neighbors_are_unbounded():
+    scores = score_finalists(np.empty((2, 0)), np.empty((2, 0), dtype=bool))
+    assert scores.tolist() == [np.inf, np.inf]
+
+
+def test_budget_counts_evaluations_against_the_map():
+    map_budget = PlacementBudget(max_evaluations=50)
+    first_city = map_budget.for_city(max_evaluations=30)
+    first_city.record(30)
+
+    assert first_city.expired
+    assert map_budget.remaining_evaluations == 20
+
+    second_city = map_budget.for_city(max_evaluations=30)
+    # The map has less left than the city's own limit
+    assert second_city.remaining_evaluations == 20
+    second_city.record(20)
+    assert second_city.expired and map_budget.expired
+
+
+def test_unset_budget_limits_nothing():
+    budget = PlacementBudget(max_seconds=0, max_evaluations=0).for_city()
+    budget.record(10 ** 6)
+
+    assert not budget.is_limited
+    assert budget.remaining_evaluations is None
+    assert not budget.expired
+
+
+def test_time_budget_expires():
+    budget = PlacementBudget(max_seconds=1e-9)
+    assert budget.is_limited
+    assert budget.expired
+    assert budget.for_city().expired
+
+
+def _crowded_city(seed: int = 3) -> tuple[RtreeElementsManager, CityScatter]:
+    # A city with neighbors close enough that most of its candidates cross one of them
+    rng = np.random.default_rng(seed)
+    rtree_manager = RtreeElementsManager()
+    city_scatter = _city_scatter('city', 0, 0)
+    rtree_manager.add_visualization_element(city_scatter)
+    for i, (x, y) in enumerate(zip(rng.uniform(-60000, 60000, 12), rng.uniform(-15000, 15000, 12))):
+        rtree_manager.add_visualization_element(_city_scatter(f'neighbor_{i}', x, y))
+    return rtree_manager, city_scatter
+
+
+def _best_text_box(algorithm: TextboxPlacementAlgorithm, city_scatter: CityScatter):
+    for elements, classification in algorithm.find_best_poly(text_box=_text_box(), city_scatter=city_scatter):
+        if classification == TextBoxClassification.BEST:
+            return elements[0]
+
+
+def test_anytime_search_stops_after_the_city_budget():
+    rtree_manager, city_scatter = _crowded_city()
+    map_budget = PlacementBudget()
+    algorithm = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=40,
+                                          budget=map_budget, city_max_evaluations=20, batch_size=8)
+
+    best = _best_text_box(algorithm, city_scatter)
+
+    # Two full batches and what was left of the third
+    assert map_budget.evaluations == 20
+    assert best.classification == TextBoxClassification.BEST
+
+
+def test_anytime_search_always_runs_its_first_batch():
+    rtree_manager, city_scatter = _crowded_city()
+    map_budget = PlacementBudget(max_evaluations=1)
+    map_budget.record(1)
+    algorithm = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=40,
+                                          budget=map_budget, batch_size=8)
+
+    assert _best_text_box(algorithm, city_scatter) is not None
+    assert map_budget.evaluations == 1 + 8
+
+
+def test_anytime_search_with_room_to_finish_matches_the_exhaustive_search():
+    rtree_manager, city_scatter = _crowded_city()
+    exhaustive = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=40)
+    anytime = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=40,
+                                        city_max_evaluations=10 ** 6, batch_size=8)
+
+    expected = _best_text_box(exhaustive, city_scatter)
+    best = _best_text_box(anytime, city_scatter)
+    assert best.algorithm_attributes == expected.algorithm_attributes
+    assert best.polygon.equals(expected.polygon)
+
+
+def test_children_inherit_their_parents_neighbors():
+    rows = np.array([0, 0, 1, 2, 2, 2])
+    element_ids = np.array([10, 11, 20, 30, 31, 32])
+    # Parent 3 has no neighbors, parent 2 has two children
+    parent_ids = np.array([2, 0, 3, 2])
+
+    child_rows, child_element_ids = inherit_neighbors(rows, element_ids, num_parents=4, parent_ids=parent_ids)
+
+    expected = [(child, element_id)
+                for child, parent in enumerate(parent_ids)
+                for element_id in element_ids[rows == parent]]
+    assert list(zip(child_rows.tolist(), child_element_ids.tolist())) == expected
+
+
+def _exhaustive_best_bounds(rtree_manager: RtreeElementsManager,
+                            city_scatter: CityScatter,
+                            number_of_search_steps: int) -> np.ndarray:
+    # Every position of the finest grid, ranked the same way the search ranks them
+    path = PerimeterPath(city_bounds=city_scatter.polygon.bounds, text_width=TEXT_WIDTH, text_height=TEXT_HEIGHT,
+                         city_buffer=0)
+    offsets = path.length / number_of_search_steps * np.arange(number_of_search_steps)
+    candidates = PerimeterCandidates(city_name='city', bounds=path.bounds_at(offsets))
+
+    intersections = rtree_manager.query_intersections(candidates.polygons, elements_to_ignore=[city_scatter])
+    distances, invalid_mask = rtree_manager.nearest_element_distances(candidates.polygons,
+                                                                      elements_to_ignore=[city_scatter])
+    scores = score_finalists(distances, invalid_mask)
+    order = np.lexsort((np.arange(len(candidates)), -scores, intersections.counts, intersections.invalid_flags))
+    return candidates.bounds[order[0]]
+
+
+@pytest.mark.parametrize('neighbor', [(-150000, -60000), (120000, 90000), (30000, -140000)])
+def test_coarse_to_fine_search_finds_the_exhaustive_best(neighbor):
+    rtree_manager = RtreeElementsManager()
+    city_scatter = _city_scatter('city', 0, 0)
+    rtree_manager.add_visualization_element(city_scatter)
+    rtree_manager.add_visualization_element(_city_scatter('neighbor', *neighbor))
+
+    algorithm = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=10,
+                                          refinement_levels=3, refinement_candidates=3)
+    best = _best_text_box(algorithm, city_scatter)
+
+    # Three levels halve the coarse spacing three times, the same grid as 80 evenly spaced positions
+    expected = _exhaustive_best_bounds(rtree_manager, city_scatter, number_of_search_steps=10 * 2 ** 3)
+    np.testing.assert_allclose(best.polygon.bounds, expected, rtol=0, atol=1e-6)
+
+
+def test_coarse_to_fine_search_stays_on_the_finest_grid():
+    rtree_manager, city_scatter = _crowded_city()
+    algorithm = TextboxPlacementAlgorithm(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=10,
+                                          refinement_levels=2, refinement_candidates=3)
+    best = _best_text_box(algorithm, city_scatter)
+
+    path = PerimeterPath(city_bounds=city_scatter.polygon.bounds, text_width=TEXT_WIDTH, text_height=TEXT_HEIGHT,
+                         city_buffer=0)
+    grid_bounds = path.bounds_at(path.length / 40 * np.arange(40))
+    assert np.isclose(grid_bounds, best.polygon.bounds, rtol=0, atol=1e-6).all(axis=1).any()
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from entities.factory import EntitiesFactory
+from entities.snapshot import EntitiesSnapshotCache
+
+CITY_NAME_CHANGES = {'Des Moines': ['West Des Moines', 'Johnston']}
+
+
+def _cities_named(container, city_name: str) -> list:
+    return [city for city in container.cities if city.city_name == city_name]
+
+
+def _check_renamed(container, original):
+    assert not _cities_named(container, 'West Des Moines')
+    assert not _cities_named(container, 'Johnston')
+
+    # The renamed cities collapse into the existing Des Moines, coordinates and all
+    des_moines, = _cities_named(container, 'Des Moines')
+    original_des_moines, = _cities_named(original, 'Des Moines')
+    assert des_moines.city_coord == original_des_moines.city_coord
+
+    renamed_names = {'Des Moines', 'West Des Moines', 'Johnston'}
+    expected = sum(1 for pa in original.provider_assignments if pa.origin_city.city_name in renamed_names)
+    assert len(container.assignments_leaving(des_moines)) == expected
+    assert len(container.provider_assignments) == len(original.provider_assignments)
+
+
+def test_renamed_city_collapses_into_target_from_dataframe(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+    original = EntitiesFactory.create_entities(df)
+    _check_renamed(EntitiesFactory.create_entities(df, city_name_changes=CITY_NAME_CHANGES), original)
+
+
+@pytest.mark.parametrize('chunksize', [50, 5000])
+def test_renamed_city_collapses_into_target_from_csv(joined_csv_path, chunksize):
+    original = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    renamed = EntitiesFactory.create_entities_from_csv(joined_csv_path, chunksize=chunksize,
+                                                       city_name_changes=CITY_NAME_CHANGES)
+    _check_renamed(renamed, original)
+
+
+def test_snapshot_applies_city_name_changes(joined_csv_path, tmp_path):
+    original = EntitiesFactory.create_entities_from_csv(joined_csv_path)
+    snapshot_cache = EntitiesSnapshotCache(str(tmp_path))
+
+    built = EntitiesFactory.load_or_create_entities(joined_csv_path, snapshot_cache=snapshot_cache,
+                                                    city_name_changes=CITY_NAME_CHANGES)
+    _check_renamed(built, original)
+    loaded = EntitiesFactory.load_or_create_entities(joined_csv_path, snapshot_cache=snapshot_cache,
+                                                     city_name_changes=CITY_NAME_CHANGES)
+    _check_renamed(loaded, original)
+
+    # Without the renames the same file maps to a different snapshot
+    unchanged = EntitiesFactory.load_or_create_entities(joined_csv_path, snapshot_cache=snapshot_cache)
+    assert _cities_named(unchanged, 'West Des Moines')
@@ -0,0 +1,164 @@
+import pytest
+
+from api_city_coords_retrieval.concurrent_geocoding import ConcurrentGeocoder, RateLimiter, RetryPolicy
+from api_city_coords_retrieval.geocoding import AzureMapsBackend, GeocodingCache
+
+MASON_CITY = (43.15357, -93.20104)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, headers: dict = None, data: dict = None):
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+
+def _found(coords: tuple[float, float]) -> FakeResponse:
+    return FakeResponse(200, data={'results': [{'position': {'lat': coords[0], 'lon': coords[1]}}]})
+
+
+class FakeSession:
+    """Answers requests with the queued responses, in order, and records when each request was made."""
+
+    def __init__(self, responses: list[FakeResponse], clock: FakeClock):
+        self._responses = list(responses)
+        self._clock = clock
+        self.request_times = []
+
+    def get(self, url: str, params: dict, timeout: float) -> FakeResponse:
+        self.request_times.append(self._clock())
+        return self._responses.pop(0)
+
+
+def _geocoder(responses: list[FakeResponse], clock: FakeClock, requests_per_second: float = 0.0,
+              retry_policy: RetryPolicy = None, cache: GeocodingCache = None) -> tuple[ConcurrentGeocoder, FakeSession]:
+    session = FakeSession(responses, clock=clock)
+    geocoder = ConcurrentGeocoder(AzureMapsBackend(subscription_key='test', session=session),
+                                  cache=cache,
+                                  max_workers=1,
+                                  requests_per_second=requests_per_second,
+                                  retry_policy=retry_policy,
+                                  clock=clock,
+                                  sleep=clock.sleep)
+    return geocoder, session
+
+
+def test_rate_limiter_spaces_acquisitions():
+    clock = FakeClock()
+    rate_limiter = RateLimiter(requests_per_second=4, clock=clock, sleep=clock.sleep)
+
+    acquired_at = []
+    for _ in range(5):
+        rate_limiter.acquire()
+        acquired_at.append(clock.now)
+
+    assert acquired_at == pytest.approx([0.0, 0.25, 0.5, 0.75, 1.0])
+
+
+def test_rate_limiter_doesnt_wait_after_idle_time():
+    clock = FakeClock()
+    rate_limiter = RateLimiter(requests_per_second=4, clock=clock, sleep=clock.sleep)
+
+    rate_limiter.acquire()
+    clock.now += 10.0
+    rate_limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_retry_after_is_respected(tmp_path):
+    clock = FakeClock()
+    cache = GeocodingCache(str(tmp_path / 'geocodes.db'))
+    geocoder, session = _geocoder([FakeResponse(429, headers={'Retry-After': '3'}), _found(MASON_CITY)],
+                                  clock=clock, cache=cache)
+
+    assert list(geocoder.geocode_many([('Mason City', 'IA')])) == [('Mason City', 'IA', MASON_CITY)]
+    assert clock.sleeps == [3.0]
+    assert session.request_times == [0.0, 3.0]
+    assert cache.get('mason city, ia', now=0.0) == (True, MASON_CITY)
+
+
+def test_retry_after_is_capped_by_max_delay():
+    clock = FakeClock()
+    geocoder, _ = _geocoder([FakeResponse(429, headers={'Retry-After': '120'}), _found(MASON_CITY)],
+                            clock=clock, retry_policy=RetryPolicy(max_delay=10.0))
+
+    assert list(geocoder.geocode_many([('Mason City', 'IA')])) == [('Mason City', 'IA', MASON_CITY)]
+    assert clock.sleeps == [10.0]
+
+
+def test_backoff_grows_exponentially_without_retry_after():
+    clock = FakeClock()
+    retry_policy = RetryPolicy(base_delay=0.5, max_delay=30.0)
+    geocoder, _ = _geocoder([FakeResponse(429), FakeResponse(503), FakeResponse(429), _found(MASON_CITY)],
+                            clock=clock, retry_policy=retry_policy)
+
+    assert list(geocoder.geocode_many([('Mason City', 'IA')])) == [('Mason City', 'IA', MASON_CITY)]
+    assert len(clock.sleeps) == 3
+    # Jitter keeps each delay between half and all of base_delay * 2 ** attempt
+    for attempt, delay in enumerate(clock.sleeps):
+        backoff = 0.5 * 2 ** attempt
+        assert 0.5 * backoff <= delay <= backoff
+
+
+def test_gives_up_after_max_retries(tmp_path):
+    clock = FakeClock()
+    cache = GeocodingCache(str(tmp_path / 'geocodes.db'))
+    geocoder, session = _geocoder([FakeResponse(429)] * 3, clock=clock, retry_policy=RetryPolicy(max_retries=2),
+                                  cache=cache)
+
+    assert list(geocoder.geocode_many([('Mason City', 'IA')])) == [('Mason City', 'IA', None)]
+    assert len(session.request_times) == 3
+    # Failures aren't cached, so the next run asks again
+    assert cache.get('mason city, ia', now=0.0) == (False, None)
+
+
+def test_client_errors_are_not_retried():
+    clock = FakeClock()
+    geocoder, session = _geocoder([FakeResponse(400)], clock=clock)
+
+    assert list(geocoder.geocode_many([('Mason City', 'IA')])) == [('Mason City', 'IA', None)]
+    assert len(session.request_times) == 1
+    assert clock.sleeps == []
+
+
+def test_retries_go_through_the_rate_limiter():
+    clock = FakeClock()
+    geocoder, session = _geocoder([FakeResponse(429, headers={'Retry-After': '0'}), _found(MASON_CITY),
+                                   _found(MASON_CITY)],
+                                  clock=clock, requests_per_second=2)
+
+    results = list(geocoder.geocode_many([('Mason City', 'IA'), ('Clear Lake', 'IA')]))
+
+    assert len(results) == 2
+    spacing = [later - earlier for earlier, later in zip(session.request_times, session.request_times[1:])]
+    assert all(gap >= 0.5 for gap in spacing)
+
+
+def test_repeated_places_are_fetched_once():
+    clock = FakeClock()
+    geocoder, session = _geocoder([_found(MASON_CITY)], clock=clock)
+
+    results = list(geocoder.geocode_many([('Mason City', 'IA'), (' mason city ', 'ia'), ('Mason  City', 'IA')]))
+
+    assert len(session.request_times) == 1
+    assert results == [('Mason City', 'IA', MASON_CITY), (' mason city ', 'ia', MASON_CITY),
+                       ('Mason  City', 'IA', MASON_CITY)]
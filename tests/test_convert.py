@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from entities.factory import EntitiesFactory
+from entity_to_visual.convert import EntityToVisualizationElement
+from polygons.polygon_factory import PolygonFactory
+from shared.projection import BatchProjector, create_iowa_projector
+from shared.shared_utils import Coordinate
+
+
+class CountingProjector(BatchProjector):
+
+    def __init__(self, projector: BatchProjector):
+        super().__init__(transform=projector.project, key=projector.key)
+        self.projected_points = 0
+
+    def project(self, lons, lats):
+        self.projected_points += np.size(lons)
+        return super().project(lons, lats)
+
+
+@pytest.fixture
+def entities_container(joined_csv_path):
+    return EntitiesFactory.create_entities_from_csv(joined_csv_path)
+
+
+def test_scatters_match_the_per_city_polygons(config, entities_container):
+    projector = create_iowa_projector()
+    converter = EntityToVisualizationElement(projector, config=config)
+    cities = sorted(entities_container.cities, key=lambda city: city.city_name)
+
+    scatters = converter.convert_cities_to_scatters(entities_container, cities)
+    # The fixture has cities without coordinates, those get no scatter
+    cities = [city for city in cities if not np.isnan(city.city_coord.lon)]
+    assert [scatter.algorithm_attributes['city'] for scatter in scatters] == cities
+    assert [scatter.algorithm_attributes['city_name'] for scatter in scatters] == [city.city_name for city in cities]
+    for city, scatter in zip(cities, scatters):
+        x, y = projector.project_coord(city.city_coord)
+        expected = PolygonFactory.create_scatter(Coordinate(x, y), radius=converter.scatter_radius())
+        assert scatter.polygon.equals_exact(expected, tolerance=1e-6)
+
+
+def test_lines_match_the_per_assignment_polygons(config, entities_container):
+    projector = create_iowa_projector()
+    converter = EntityToVisualizationElement(projector, config=config)
+    assignments = list(entities_container.provider_assignments)[:200]
+
+    lines = converter.convert_assignments_to_lines(entities_container, assignments)
+    assignments = [assignment for assignment in assignments
+                   if not np.isnan([assignment.origin_city.city_coord.lon, assignment.visiting_city.city_coord.lon]).any()]
+    assert [line.algorithm_attributes['provider_assignment'] for line in lines] == assignments
+    for assignment, line in zip(assignments, lines):
+        expected = PolygonFactory.create_line(projector.project_coord(assignment.origin_city.city_coord),
+                                              projector.project_coord(assignment.visiting_city.city_coord),
+                                              line_width=converter.line_width())
+        assert line.polygon.equals_exact(expected, tolerance=1e-6)
+
+
+def test_cities_are_projected_once_per_container(config, entities_container):
+    projector = CountingProjector(create_iowa_projector())
+    converter = EntityToVisualizationElement(projector, config=config)
+
+    converter.convert_cities_to_scatters(entities_container, list(entities_container.cities))
+    converter.convert_assignments_to_lines(entities_container, list(entities_container.provider_assignments))
+    assert projector.projected_points == len(entities_container.cities)
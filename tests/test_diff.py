@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+
+from entities.diff import apply_diff, diff_entities, update_entities_from_export
+from entities.factory import EntitiesFactory
+from entities.snapshot import EntitiesSnapshotCache
+
+REMOVED_ROWS = list(range(20, 25))
+CHANGED_ROW = 10
+
+
+def _edited_export(df: pd.DataFrame) -> pd.DataFrame:
+    edited = df.copy()
+    edited.loc[CHANGED_ROW, 'specialty'] = 'Changed Specialty'
+    return edited.drop(index=REMOVED_ROWS).reset_index(drop=True)
+
+
+def test_bundled_csv_has_missing_coordinates(joined_csv_path):
+    # The diff below only means something if rows with NaN coordinates are part of it
+    df = pd.read_csv(joined_csv_path)
+    assert df['visiting_lat'].isna().any()
+
+
+def test_unchanged_export_diffs_empty(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+    diff = diff_entities(EntitiesFactory.create_entities(df), EntitiesFactory.create_entities(df))
+    assert diff.is_empty
+
+
+def test_diff_reports_only_real_changes(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+    previous = EntitiesFactory.create_entities(df)
+    current = EntitiesFactory.create_entities(_edited_export(df))
+
+    diff = diff_entities(previous, current)
+
+    assert len(diff.added) == 0
+    assert len(diff.removed) == len(REMOVED_ROWS)
+    assert len(diff.changed) == 1
+    (previous_assignments, new_assignments), = diff.changed
+    assert {pa.specialty for pa in previous_assignments} == {df.loc[CHANGED_ROW, 'specialty']}
+    assert {pa.specialty for pa in new_assignments} == {'Changed Specialty'}
+
+    apply_diff(previous, diff)
+    assert previous.provider_assignments == current.provider_assignments
+
+
+def test_update_from_export_applies_diff_to_previous_snapshot(joined_csv_path, tmp_path, monkeypatch):
+    df = pd.read_csv(joined_csv_path)
+    export_path = str(tmp_path / 'vcc_joined_data.csv')
+    snapshot_cache = EntitiesSnapshotCache(str(tmp_path / 'snapshots'))
+
+    df.to_csv(export_path, index=False)
+    first = update_entities_from_export(export_path, snapshot_cache)
+    assert first.diff is None and first.previous_key is None
+
+    unchanged = update_entities_from_export(export_path, snapshot_cache)
+    assert unchanged.diff.is_empty
+    assert unchanged.key == unchanged.previous_key == first.key
+
+    expected = EntitiesFactory.create_entities(_edited_export(df)).provider_assignments
+    _edited_export(df).to_csv(export_path, index=False)
+    # Only the changed rows become entities, the rest comes from the previous snapshot
+    monkeypatch.setattr(EntitiesFactory, 'create_entities_from_csv', None)
+    update = update_entities_from_export(export_path, snapshot_cache)
+    assert (len(update.diff.added), len(update.diff.removed), len(update.diff.changed)) == (0, len(REMOVED_ROWS), 1)
+    assert update.previous_key == first.key
+    assert update.entities_container.provider_assignments == expected
+
+    # The next export is diffed against the snapshot saved for this one
+    again = update_entities_from_export(export_path, snapshot_cache)
+    assert again.diff.is_empty
+    assert again.entities_container.provider_assignments == expected
+
+
+def test_latest_snapshot_is_kept_per_export_path(joined_csv_path, tmp_path):
+    df = pd.read_csv(joined_csv_path)
+    snapshot_cache = EntitiesSnapshotCache(str(tmp_path / 'snapshots'))
+    export_paths = []
+    for directory, export in [('a', df), ('b', _edited_export(df))]:
+        os.makedirs(tmp_path / directory)
+        export_paths.append(str(tmp_path / directory / 'vcc_joined_data.csv'))
+        export.to_csv(export_paths[-1], index=False)
+
+    keys = [update_entities_from_export(export_path, snapshot_cache).key for export_path in export_paths]
+    # Exports with the same file name in different directories each keep their own previous snapshot
+    assert [snapshot_cache.latest_key(export_path) for export_path in export_paths] == keys
+    assert update_entities_from_export(export_paths[0], snapshot_cache).diff.is_empty
@@ -0,0 +1,73 @@
+import pytest
+
+from api_city_coords_retrieval.gazetteer import Gazetteer, GazetteerEntry, haversine_km
+
+
+@pytest.fixture
+def gazetteer(city_coords_path) -> Gazetteer:
+    return Gazetteer.from_csv(city_coords_path)
+
+
+def _gazetteer(*places: tuple[str, float, float], **kwargs) -> Gazetteer:
+    return Gazetteer([GazetteerEntry(place_name=name, city=name, state='XX', latitude=lat, longitude=lon)
+                      for name, lat, lon in places], **kwargs)
+
+
+def test_exact_lookup_matches_iowa_cities_with_or_without_their_state(gazetteer):
+    for city, state in [('Nora Springs', 'IA'), ('nora  springs', 'ia'), ('Nora Springs', None),
+                        ('Nora Springs, IA', None)]:
+        entry = gazetteer.lookup_exact(city, state)
+        assert entry.place_name == 'Nora Springs'
+        assert entry.coords == (43.1427, -93.0081)
+
+    assert gazetteer.lookup_exact('Macomb', 'IL').place_name == 'Macomb, IL'
+    assert gazetteer.lookup_exact('Macomb, IL').place_name == 'Macomb, IL'
+    # Without a state a name is taken to be in Iowa, and there's no Macomb there
+    assert gazetteer.lookup_exact('Macomb') is None
+    assert gazetteer.lookup_exact('Mason City', 'IL') is None
+
+
+def test_a_bare_name_with_one_place_is_found_whatever_its_state(gazetteer):
+    assert gazetteer.lookup_fuzzy('Macomb').place_name == 'Macomb, IL'
+    assert gazetteer.lookup('Macomb').place_name == 'Macomb, IL'
+
+
+@pytest.mark.parametrize('fuzzy_cutoff, expected', [(0.92, 'Mason City'), (0.93, None)])
+def test_fuzzy_lookup_around_the_cutoff(city_coords_path, fuzzy_cutoff, expected):
+    gazetteer = Gazetteer.from_csv(city_coords_path, fuzzy_cutoff=fuzzy_cutoff)
+
+    # "mason citx, ia" shares 13 of its 14 characters with "mason city, ia", a ratio of 26 / 28 = 0.9286
+    entry = gazetteer.lookup_fuzzy('Mason Citx', 'IA')
+    assert (entry.place_name if entry else None) == expected
+    assert gazetteer.lookup('Mason Citx', 'IA') is entry
+
+
+def test_fuzzy_lookup_needs_to_beat_the_cutoff(city_coords_path):
+    gazetteer = Gazetteer.from_csv(city_coords_path, fuzzy_cutoff=26 / 28)
+    assert gazetteer.lookup_fuzzy('Mason Citx', 'IA') is None
+
+
+def test_nearest_across_the_antimeridian():
+    gazetteer = _gazetteer(('east', 0.0, 179.98), ('west', 0.0, -179.5), ('far', 0.0, 170.0))
+
+    # 0.03 degrees of longitude away across the antimeridian, against 0.49 degrees on the same side
+    (entry, distance_km), = gazetteer.nearest(0.0, -179.99)
+    assert entry.place_name == 'east'
+    assert distance_km == pytest.approx(haversine_km(0.0, -179.99, 0.0, 179.98))
+    assert distance_km < 4
+
+
+def test_nearest_across_the_pole():
+    gazetteer = _gazetteer(('over the pole', 89.9, 180.0), ('same meridian', 89.0, 0.0), ('equator', 0.0, 0.0))
+
+    results = gazetteer.nearest(89.95, 0.0, k=3)
+    # 0.15 degrees over the pole is closer than 0.95 degrees down the same meridian
+    assert [entry.place_name for entry, _ in results] == ['over the pole', 'same meridian', 'equator']
+    assert [distance for _, distance in results] == sorted(distance for _, distance in results)
+    assert results[0][1] == pytest.approx(0.15 * 111.195, rel=1e-3)
+
+    assert gazetteer.reverse_lookup(-89.0, 0.0).place_name == 'equator'
+
+
+def test_reverse_lookup_finds_a_bundled_city(gazetteer):
+    assert gazetteer.reverse_lookup(43.15, -93.2).place_name == 'Mason City'
@@ -0,0 +1,73 @@
+import pytest
+
+from api_city_coords_retrieval.geocoding import FixtureBackend, Geocoder, GeocodingCache
+
+DAY = 24 * 3600
+MASON_CITY = (43.15357, -93.20104)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock) -> GeocodingCache:
+    cache = GeocodingCache(str(tmp_path / 'geocodes.db'), ttl_seconds=30 * DAY, negative_ttl_seconds=7 * DAY,
+                           clock=clock)
+    yield cache
+    cache.close()
+
+
+def test_found_places_are_cached_until_they_expire(cache, clock):
+    backend = FixtureBackend({'Mason City, IA': MASON_CITY})
+    geocoder = Geocoder(backend=backend, cache=cache)
+
+    assert geocoder.geocode('Mason City', 'IA') == MASON_CITY
+    clock.now += 30 * DAY
+    assert geocoder.geocode('mason city', 'ia') == MASON_CITY
+    assert backend.queries == ['Mason City, IA']
+
+    clock.now += 1
+    assert geocoder.geocode('Mason City', 'IA') == MASON_CITY
+    assert backend.queries == ['Mason City, IA', 'Mason City, IA']
+
+
+def test_misses_are_cached_for_the_negative_ttl(cache, clock):
+    backend = FixtureBackend({'Mason City, IA': MASON_CITY})
+    geocoder = Geocoder(backend=backend, cache=cache)
+
+    assert geocoder.geocode('Nowhere', 'IA') is None
+    assert cache.get('nowhere, ia') == (True, None)
+    clock.now += 7 * DAY
+    assert geocoder.geocode('Nowhere', 'IA') is None
+    assert backend.queries == ['Nowhere, IA']
+
+    # A miss expires much sooner than a found place, so a place added since is picked up
+    clock.now += 1
+    assert cache.get('nowhere, ia') == (False, None)
+    backend = FixtureBackend({'Nowhere, IA': (42.0, -93.0)})
+    assert Geocoder(backend=backend, cache=cache).geocode('Nowhere', 'IA') == (42.0, -93.0)
+    assert backend.queries == ['Nowhere, IA']
+
+
+def test_cache_persists_between_runs(tmp_path, clock):
+    db_path = str(tmp_path / 'geocodes.db')
+    first_run = GeocodingCache(db_path, clock=clock)
+    Geocoder(backend=FixtureBackend({'Mason City, IA': MASON_CITY}), cache=first_run).geocode('Mason City', 'IA')
+    first_run.close()
+
+    backend = FixtureBackend({})
+    second_run = GeocodingCache(db_path, clock=clock)
+    assert Geocoder(backend=backend, cache=second_run).geocode('Mason City', 'IA') == MASON_CITY
+    assert backend.queries == []
+    second_run.close()
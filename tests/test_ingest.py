@@ -0,0 +1,64 @@
+import pandas as pd
+
+from entities.factory import EntitiesFactory
+
+
+def _summary(container) -> tuple:
+    return (len(container.provider_assignments), len(container.cities), len(container.worksites),
+            len(container.providers))
+
+
+def test_bundled_csv_without_hcp_id_batch_and_chunked(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+    assert 'hcp_id' not in df.columns
+
+    batch = EntitiesFactory.create_entities(df)
+    chunked = EntitiesFactory.create_entities_from_csv(joined_csv_path, chunksize=100)
+
+    assert _summary(batch) == _summary(chunked)
+    assert len(batch.provider_assignments) == len(df.drop_duplicates(
+        subset=['consultant_name', 'specialty', 'origin_site', 'origin_city', 'visiting_site', 'visiting_city']))
+    # Without ids, providers are identified by name alone
+    assert all(provider.hcp_id is None for provider in batch.providers)
+    assert len(batch.providers) == df['consultant_name'].nunique()
+
+
+def test_missing_hcp_ids_fall_back_to_name(joined_csv_path, tmp_path):
+    df = pd.read_csv(joined_csv_path)
+    names = df['consultant_name'].astype('category').cat.codes
+    # Every provider has an id except every seventh, whose rows have none
+    df['hcp_id'] = [None if code % 7 == 0 else int(code) for code in names]
+    csv_path = tmp_path / 'with_hcp_id.csv'
+    df.to_csv(csv_path, index=False)
+
+    batch = EntitiesFactory.create_entities(pd.read_csv(csv_path))
+    chunked = EntitiesFactory.create_entities_from_csv(str(csv_path), chunksize=100)
+
+    assert _summary(batch) == _summary(chunked)
+    assert len(batch.providers) == df['consultant_name'].nunique()
+    hcp_ids = {provider.provider_name: provider.hcp_id for provider in chunked.providers}
+    for name, code in zip(df['consultant_name'], names):
+        assert hcp_ids[name] == (None if code % 7 == 0 else int(code))
+
+
+def test_batch_chunked_and_row_by_row_build_the_same_entities(joined_csv_path):
+    df = pd.read_csv(joined_csv_path)
+
+    row_by_row = EntitiesFactory.create_entities(df, batch=False)
+    batch = EntitiesFactory.create_entities(df)
+    chunked = EntitiesFactory.create_entities_from_csv(joined_csv_path, chunksize=100)
+
+    for container in (batch, chunked):
+        assert container.provider_assignments == row_by_row.provider_assignments
+        assert set(container.cities) == set(row_by_row.cities)
+        assert set(container.worksites) == set(row_by_row.worksites)
+        assert set(container.providers) == set(row_by_row.providers)
+
+
+def test_columnar_views_read_missing_hcp_ids_as_none(joined_csv_path):
+    container = EntitiesFactory.create_entities(pd.read_csv(joined_csv_path))
+    columnar = EntitiesFactory.convert_to_columnar(container)
+
+    assert {provider.provider_name: provider.hcp_id for provider in columnar.providers} == \
+           {provider.provider_name: provider.hcp_id for provider in container.providers}
+    assert all(provider.hcp_id is None for provider in columnar.providers)
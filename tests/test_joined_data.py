@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from data_preparation.joined_data import JOINED_COLUMNS, create_joined_data
+from entities.factory import EntitiesFactory
+from entities.snapshot import EntitiesSnapshotCache
+
+
+def test_prepared_data_ingests_end_to_end(raw_csv_path, city_coords_path, tmp_path):
+    output_path = str(tmp_path / 'joined.csv')
+    result = create_joined_data(raw_csv_path, city_coords_path, output_path)
+    assert list(result.df.columns) == JOINED_COLUMNS
+
+    container = EntitiesFactory.create_entities_from_csv(output_path, chunksize=200)
+    assert len(container.provider_assignments) == len(result.df.drop_duplicates(
+        subset=['consultant_name', 'specialty', 'origin_site', 'origin_city', 'visiting_site', 'visiting_city']))
+
+    cached = EntitiesFactory.load_or_create_entities(output_path,
+                                                     snapshot_cache=EntitiesSnapshotCache(str(tmp_path / 'snapshots')))
+    assert len(cached.provider_assignments) == len(container.provider_assignments)
+
+
+def test_hcp_id_is_carried_through(raw_csv_path, city_coords_path, tmp_path):
+    raw_df = pd.read_csv(raw_csv_path, encoding='utf-8-sig')
+    raw_df['hcp_id'] = raw_df['consultant'].astype('category').cat.codes + 1000
+    raw_path = str(tmp_path / 'raw.csv')
+    raw_df.to_csv(raw_path, index=False)
+
+    output_path = str(tmp_path / 'joined.csv')
+    create_joined_data(raw_path, city_coords_path, output_path)
+
+    container = EntitiesFactory.create_entities_from_csv(output_path)
+    expected = dict(zip(raw_df['consultant'].str.strip(), raw_df['hcp_id']))
+    assert {provider.provider_name: provider.hcp_id for provider in container.providers} == expected
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather'])
+def test_binary_joined_data_round_trips_through_ingest(raw_csv_path, city_coords_path, tmp_path, extension):
+    pytest.importorskip('pyarrow')
+    csv_path = str(tmp_path / 'joined.csv')
+    binary_path = str(tmp_path / f'joined.{extension}')
+    create_joined_data(raw_csv_path, city_coords_path, csv_path)
+    create_joined_data(raw_csv_path, city_coords_path, binary_path)
+
+    from_csv = EntitiesFactory.create_entities_from_csv(csv_path, chunksize=200)
+    from_binary = EntitiesFactory.create_entities_from_csv(binary_path, chunksize=200)
+    assert from_binary.provider_assignments == from_csv.provider_assignments
+    assert set(from_binary.cities) == set(from_csv.cities)
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+import shapely
+
+from polygons.polygon_factory import PolygonFactory
+from shared.shared_utils import Coordinate
+from text_box_algorithm import AlgorithmHandler
+from text_box_algorithm.candidates import perimeter_candidate_bounds
+from text_box_algorithm.global_placement import GlobalLabelPlacer, PlacementRequest
+from text_box_algorithm.parallel_placement import ParallelLabelPlacer
+from text_box_algorithm.rtree_elements_manager import RtreeElementsManager
+from visualization_elements.element_classes import CityScatter, TextBoxClassification
+
+TEXT_WIDTH = 40000
+TEXT_HEIGHT = 7600
+SEARCH_STEPS = 40
+
+
+def _city_scatter(city_name: str, x: float, y: float) -> CityScatter:
+    return CityScatter(polygon=PolygonFactory.create_scatter(Coordinate(longitude=x, latitude=y), radius=1500),
+                       algorithm_attributes={'city_name': city_name})
+
+
+def _requests(city_scatters: list[CityScatter]) -> list[PlacementRequest]:
+    return [PlacementRequest(city_scatter, text_width=TEXT_WIDTH, text_height=TEXT_HEIGHT)
+            for city_scatter in city_scatters]
+
+
+@pytest.mark.parametrize('placement_workers', ['1', '2'])
+def test_handler_places_every_text_box(config, monkeypatch, placement_workers):
+    monkeypatch.setitem(config.config['algo'], 'placement_workers', placement_workers)
+    handler = AlgorithmHandler(config=config, polygon_factory_=PolygonFactory())
+
+    # Two close cities that compete for the same space, and one far from both
+    city_scatters = [_city_scatter('a', 0, 0), _city_scatter('b', 30000, 5000), _city_scatter('c', 1e6, 1e6)]
+    result = handler.place_text_boxes(_requests(city_scatters), city_buffer=0, number_of_steps=SEARCH_STEPS)
+
+    assert set(result.text_boxes) == set(city_scatters)
+    assert result.total_cost == 0
+    text_boxes = [result.text_boxes[city_scatter] for city_scatter in city_scatters]
+    for text_box, city_scatter in zip(text_boxes, city_scatters):
+        assert text_box.classification == TextBoxClassification.BEST
+        assert text_box.algorithm_attributes['city_name'] == city_scatter.algorithm_attributes['city_name']
+        assert text_box.polygon.intersection(city_scatter.polygon).area == 0
+    for i, text_box in enumerate(text_boxes):
+        assert all(text_box.polygon.intersection(other.polygon).area == 0 for other in text_boxes[i + 1:])
+
+
+def test_equal_cost_candidates_go_to_the_roomiest():
+    rtree_manager = RtreeElementsManager()
+    city_scatter = _city_scatter('a', 0, 0)
+    # Far enough that no candidate touches it, so every candidate costs the same
+    neighbor = _city_scatter('b', -150000, 0)
+    rtree_manager.add_visualization_element(city_scatter)
+    rtree_manager.add_visualization_element(neighbor)
+
+    placer = GlobalLabelPlacer(rtree_manager=rtree_manager, city_buffer=0, number_of_search_steps=SEARCH_STEPS)
+    result = placer.place(_requests([city_scatter]), commit=False)
+
+    assert result.total_cost == 0
+    bounds = perimeter_candidate_bounds(city_bounds=city_scatter.polygon.bounds, text_width=TEXT_WIDTH,
+                                        text_height=TEXT_HEIGHT, city_buffer=0, number_of_search_steps=SEARCH_STEPS)
+    candidate_distances = shapely.distance(shapely.box(*bounds.T), neighbor.polygon)
+    # With one scatter nearby the distance score only grows with the distance to it
+    assert shapely.distance(result.text_boxes[city_scatter].polygon, neighbor.polygon) == candidate_distances.max()
+
+
+def _crowded_map(seed: int = 7, num_cities: int = 60) -> tuple[RtreeElementsManager, list[CityScatter]]:
+    rng = np.random.default_rng(seed)
+    xs, ys = rng.uniform(0, 1.5e6, num_cities), rng.uniform(0, 1e6, num_cities)
+    city_scatters = [_city_scatter(f'city_{i}', x, y) for i, (x, y) in enumerate(zip(xs, ys))]
+    rtree_manager = RtreeElementsManager()
+    for city_scatter in city_scatters:
+        rtree_manager.add_visualization_element(city_scatter)
+    return rtree_manager, city_scatters
+
+
+def _place_globally_and_in_parallel(max_workers: int, max_iterations: int = 20000, seed: int = 7,
+                                    num_cities: int = 60) -> tuple:
+    global_rtree, global_scatters = _crowded_map(seed=seed, num_cities=num_cities)
+    global_result = GlobalLabelPlacer(rtree_manager=global_rtree, city_buffer=0, number_of_search_steps=SEARCH_STEPS,
+                                      max_iterations=max_iterations).place(_requests(global_scatters))
+
+    parallel_rtree, parallel_scatters = _crowded_map(seed=seed, num_cities=num_cities)
+    parallel_result = ParallelLabelPlacer(rtree_manager=parallel_rtree, city_buffer=0,
+                                          number_of_search_steps=SEARCH_STEPS, search_width=2500, search_height=1750,
+                                          max_workers=max_workers,
+                                          max_iterations=max_iterations).place(_requests(parallel_scatters))
+    return global_scatters, global_result, parallel_scatters, parallel_result
+
+
+def _assert_same_placement(global_scatters, global_result, parallel_scatters, parallel_result):
+    assert parallel_result.total_cost == global_result.total_cost
+    for global_scatter, parallel_scatter in zip(global_scatters, parallel_scatters):
+        global_box = global_result.text_boxes[global_scatter]
+        parallel_box = parallel_result.text_boxes[parallel_scatter]
+        assert parallel_box.algorithm_attributes == global_box.algorithm_attributes
+        assert parallel_box.polygon.equals(global_box.polygon)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_parallel_placement_matches_global(max_workers):
+    global_scatters, global_result, parallel_scatters, parallel_result = _place_globally_and_in_parallel(max_workers)
+
+    _assert_same_placement(global_scatters, global_result, parallel_scatters, parallel_result)
+    # The map is crowded enough that labels don't all land on the first candidate
+    candidate_ids = {text_box.algorithm_attributes['candidate_id'] for text_box in parallel_result.text_boxes.values()}
+    assert len(candidate_ids) > 1
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_parallel_placement_matches_global_when_the_budget_runs_out(max_workers):
+    # Crowded enough for the repair to move a label, with a budget that stops it partway through its first sweep
+    global_scatters, global_result, parallel_scatters, parallel_result = _place_globally_and_in_parallel(
+        max_workers, max_iterations=8, seed=2, num_cities=450)
+
+    # Without the budget every overlap is repaired
+    assert global_result.iterations == 8
+    assert global_result.total_cost > 0
+    _assert_same_placement(global_scatters, global_result, parallel_scatters, parallel_result)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from interfacing.operations_coordinator import OperationsCoordinator
+from text_box_algorithm import AlgorithmHandler
+
+
+@pytest.fixture
+def coordinator(config, joined_csv_path, monkeypatch, tmp_path) -> OperationsCoordinator:
+    monkeypatch.setitem(config.config['ingest'], 'snapshot_dir', str(tmp_path / 'snapshots'))
+    return OperationsCoordinator.from_csv(joined_csv_path)
+
+
+def test_line_map_labels_every_city(coordinator):
+    layout = coordinator.create_line_map()
+
+    assert set(layout.text_boxes) == set(layout.city_scatters)
+    for city_scatter, text_box in layout.text_boxes.items():
+        assert text_box.algorithm_attributes['city_name'] == city_scatter.algorithm_attributes['city_name']
+        assert text_box.polygon.intersection(city_scatter.polygon).area == 0
+
+
+def test_labels_are_measured_with_the_coordinators_text_measurer(coordinator):
+    layout = coordinator.create_high_volume_line_map(number_of_origin_cities=3)
+
+    font, size, weight = coordinator.config.fetch_config_values('map_display.text', ['font', 'fontsize', 'fontweight'],
+                                                                [str, float, str])
+    for city_scatter, text_box in layout.text_boxes.items():
+        label = coordinator._format_city_label(city_scatter.algorithm_attributes['city_name'])
+        widths, heights = coordinator.text_measurer.measure_many([label], font=font, size=size, weight=weight)
+        x_min, y_min, x_max, y_max = text_box.polygon.bounds
+        assert (x_max - x_min, y_max - y_min) == pytest.approx((widths[0], heights[0]))
+
+
+def test_written_layout_uses_the_projected_coordinates(coordinator, tmp_path):
+    output_path = str(tmp_path / 'highest_volume.csv')
+    layout = coordinator.create_highest_volume_line_map(output_path=output_path, results=3)
+
+    df = pd.read_csv(output_path)
+    cities = [city_scatter.algorithm_attributes['city'] for city_scatter in layout.city_scatters]
+    assert df['city_name'].tolist() == [city.city_name for city in cities]
+    xs, ys = coordinator.projector.project([city.city_coord.lon for city in cities],
+                                           [city.city_coord.lat for city in cities])
+    np.testing.assert_allclose(df['x'], xs)
+    np.testing.assert_allclose(df['y'], ys)
+    text_bounds = np.array([layout.text_boxes[city_scatter].polygon.bounds for city_scatter in layout.city_scatters])
+    np.testing.assert_allclose(df[['text_x_min', 'text_y_min', 'text_x_max', 'text_y_max']], text_bounds)
+
+
+def test_an_edited_export_only_replaces_labels_around_its_changes(config, joined_csv_path, monkeypatch, tmp_path):
+    monkeypatch.setitem(config.config['ingest'], 'snapshot_dir', str(tmp_path / 'snapshots'))
+    df = pd.read_csv(joined_csv_path)
+    export_path = str(tmp_path / 'vcc_joined_data.csv')
+    df.to_csv(export_path, index=False)
+    previous = OperationsCoordinator.from_csv(export_path).create_line_map()
+
+    # One provider moves from one visiting city to another
+    edited = df.copy()
+    moved = edited['visiting_city'] == edited.loc[0, 'visiting_city']
+    edited.loc[moved.idxmax(), ['visiting_site', 'visiting_city', 'visiting_lon', 'visiting_lat']] = \
+        edited.loc[(~moved & edited['visiting_lon'].notna()).idxmax(),
+                   ['visiting_site', 'visiting_city', 'visiting_lon', 'visiting_lat']].tolist()
+    edited.to_csv(export_path, index=False)
+    coordinator = OperationsCoordinator.from_csv(export_path)
+
+    placed = []
+    place_text_boxes = AlgorithmHandler.place_text_boxes
+    monkeypatch.setattr(AlgorithmHandler, 'place_text_boxes',
+                        lambda self, requests, **kwargs: placed.extend(requests) or
+                        place_text_boxes(self, requests, **kwargs))
+    layout = coordinator.create_line_map()
+
+    assert set(layout.text_boxes) == set(layout.city_scatters)
+    assert 0 < len(placed) < len(layout.city_scatters)
+    affected_cities = coordinator._export_update.diff.affected_cities
+    replaced_cities = {request.city_scatter.algorithm_attributes['city'] for request in placed}
+    assert affected_cities & set(_text_bounds(layout)) <= replaced_cities
+
+    previous_bounds, bounds = _text_bounds(previous), _text_bounds(layout)
+    for city, city_bounds in bounds.items():
+        if city not in replaced_cities:
+            assert city_bounds == previous_bounds[city]
+
+
+def _text_bounds(layout) -> dict:
+    return {city_scatter.algorithm_attributes['city']: text_box.polygon.bounds
+            for city_scatter, text_box in layout.text_boxes.items()}
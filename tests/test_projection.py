@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from shared.projection import (BASEMAP_SPHERE_RADIUS, IOWA_MAP_PARAMETERS, LambertConformalConic,
+                               create_iowa_projector)
+
+
+@pytest.fixture
+def lon_lat_grid() -> tuple[np.ndarray, np.ndarray]:
+    # Iowa and well past it, so errors that grow away from the central point show up
+    lons, lats = np.meshgrid(np.linspace(-105, -80, 26), np.linspace(33, 50, 18))
+    return lons.ravel(), lats.ravel()
+
+
+def _pyproj_lcc(lat_0: float, lon_0: float, llcrnrlon: float, llcrnrlat: float, lat_1: float, lat_2: float):
+    pyproj = pytest.importorskip('pyproj')
+    proj = pyproj.Proj(proj='lcc', R=BASEMAP_SPHERE_RADIUS, lat_0=lat_0, lon_0=lon_0, lat_1=lat_1, lat_2=lat_2)
+    # Shifted like Basemap, so the lower-left corner is (0, 0)
+    x_0, y_0 = proj(llcrnrlon, llcrnrlat)
+
+    def transform(lons, lats):
+        xs, ys = proj(lons, lats)
+        return np.asarray(xs) - x_0, np.asarray(ys) - y_0
+
+    return transform
+
+
+def test_iowa_projection_matches_basemap(lon_lat_grid):
+    basemap = pytest.importorskip('mpl_toolkits.basemap')
+    iowa_map = basemap.Basemap(projection='lcc', resolution=None, **IOWA_MAP_PARAMETERS)
+    lons, lats = lon_lat_grid
+
+    xs, ys = create_iowa_projector().project(lons, lats)
+    expected_xs, expected_ys = iowa_map(lons, lats)
+    np.testing.assert_allclose(xs, expected_xs, rtol=0, atol=1e-3)
+    np.testing.assert_allclose(ys, expected_ys, rtol=0, atol=1e-3)
+
+    inverse_lons, inverse_lats = iowa_map(xs, ys, inverse=True)
+    np.testing.assert_allclose(inverse_lons, lons, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(inverse_lats, lats, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('lat_1, lat_2', [(None, None), (33.0, 45.0), (45.0, 33.0)])
+def test_projection_matches_pyproj(lon_lat_grid, lat_1, lat_2):
+    lcc = LambertConformalConic(lat_0=41.5, lon_0=-93.5, llcrnrlon=-97, llcrnrlat=40, lat_1=lat_1, lat_2=lat_2)
+    expected = _pyproj_lcc(lat_0=41.5, lon_0=-93.5, llcrnrlon=-97, llcrnrlat=40,
+                           lat_1=41.5 if lat_1 is None else lat_1, lat_2=41.5 if lat_2 is None else lat_2)
+    lons, lats = lon_lat_grid
+
+    xs, ys = lcc(lons, lats)
+    expected_xs, expected_ys = expected(lons, lats)
+    np.testing.assert_allclose(xs, expected_xs, rtol=0, atol=1e-3)
+    np.testing.assert_allclose(ys, expected_ys, rtol=0, atol=1e-3)
+
+
+@pytest.mark.parametrize('lat_1, lat_2', [(None, None), (33.0, 45.0)])
+def test_inverse_round_trips(lon_lat_grid, lat_1, lat_2):
+    lcc = LambertConformalConic(lat_0=41.5, lon_0=-93.5, llcrnrlon=-97, llcrnrlat=40, lat_1=lat_1, lat_2=lat_2)
+    lons, lats = lon_lat_grid
+
+    inverse_lons, inverse_lats = lcc.inverse(*lcc(lons, lats))
+    np.testing.assert_allclose(inverse_lons, lons, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(inverse_lats, lats, rtol=0, atol=1e-9)
+
+
+def test_lower_left_corner_is_the_origin():
+    x, y = create_iowa_projector().project_coord((IOWA_MAP_PARAMETERS['llcrnrlon'], IOWA_MAP_PARAMETERS['llcrnrlat']))
+    assert x == pytest.approx(0.0, abs=1e-6)
+    assert y == pytest.approx(0.0, abs=1e-6)
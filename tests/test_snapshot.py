@@ -0,0 +1,47 @@
+import pandas as pd
+
+from entities.factory import EntitiesFactory
+from entities.snapshot import EntitiesSnapshotCache, compute_snapshot_key
+
+CITY_NAME_CHANGES = {
+    'Des Moines': ['West Des Moines', 'Ankeny', 'Johnston'],
+    'Omaha, NE': ['Council Bluffs']
+}
+
+
+def test_snapshot_round_trip_is_lossless(joined_csv_path, tmp_path):
+    snapshot_cache = EntitiesSnapshotCache(str(tmp_path))
+    created = EntitiesFactory.load_or_create_entities(joined_csv_path, snapshot_cache=snapshot_cache,
+                                                      city_name_changes=CITY_NAME_CHANGES, chunksize=100)
+    assert snapshot_cache.has_snapshot(compute_snapshot_key(joined_csv_path, city_name_changes=CITY_NAME_CHANGES))
+
+    loaded = EntitiesFactory.load_or_create_entities(joined_csv_path, snapshot_cache=snapshot_cache,
+                                                     city_name_changes=CITY_NAME_CHANGES)
+
+    # Every assignment compares equal, including the ones whose cities have no coordinates
+    assert len(created.provider_assignments) == len(pd.read_csv(joined_csv_path))
+    assert loaded.provider_assignments == created.provider_assignments
+    assert set(loaded.cities) == set(created.cities)
+    assert set(loaded.worksites) == set(created.worksites)
+    assert set(loaded.providers) == set(created.providers)
+    assert any(city.city_coord.lon != city.city_coord.lon for city in loaded.cities)
+
+
+def test_columnar_round_trip_is_lossless(joined_csv_path):
+    container = EntitiesFactory.create_entities(pd.read_csv(joined_csv_path))
+    converted = EntitiesFactory.convert_from_columnar(EntitiesFactory.convert_to_columnar(container))
+
+    assert converted.provider_assignments == container.provider_assignments
+    assert list(converted.cities) == list(container.cities)
+
+
+def test_snapshot_key_ignores_the_order_of_renamed_cities(joined_csv_path):
+    reordered = {
+        'Omaha, NE': ['Council Bluffs'],
+        'Des Moines': ['Johnston', 'West Des Moines', 'Ankeny']
+    }
+
+    assert compute_snapshot_key(joined_csv_path, city_name_changes=reordered) == \
+           compute_snapshot_key(joined_csv_path, city_name_changes=CITY_NAME_CHANGES)
+    assert compute_snapshot_key(joined_csv_path, city_name_changes={'Des Moines': ['Ankeny']}) != \
+           compute_snapshot_key(joined_csv_path, city_name_changes=CITY_NAME_CHANGES)
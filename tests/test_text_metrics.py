@@ -0,0 +1,64 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from mapping.text_metrics import TextMeasurer
+from shared.projection import create_iowa_projector
+
+DPI = 100
+LABELS = ['Nora Springs', 'Omaha, NE', 'Ely', 'Clear Lake']
+
+
+@pytest.fixture
+def axes():
+    fig, ax = plt.subplots(figsize=(20, 15), dpi=DPI)
+    yield ax
+    plt.close(fig)
+
+
+def _rendered_extent(ax, label: str, size: float, weight: str, rotation: float) -> tuple[float, float]:
+    text = ax.text(0.5, 0.5, label, fontsize=size, fontweight=weight, family='DejaVu Sans', rotation=rotation)
+    bbox = text.get_window_extent(ax.figure.canvas.get_renderer())
+    text.remove()
+    return bbox.width, bbox.height
+
+
+@pytest.mark.parametrize('size', [6, 10, 14, 22])
+@pytest.mark.parametrize('rotation', [0, 30, 90, 135])
+@pytest.mark.parametrize('weight', ['normal', 'bold'])
+def test_measured_extent_matches_the_rendered_text(axes, size, rotation, weight):
+    text_measurer = TextMeasurer(map_units_per_point_=1.0, dpi=DPI)
+
+    for label in LABELS:
+        width, height = text_measurer.measure(label, font='DejaVu Sans', size=size, weight=weight, rotation=rotation)
+        expected_width, expected_height = _rendered_extent(axes, label, size=size, weight=weight, rotation=rotation)
+        # Points to pixels at the figure's dpi
+        assert width * DPI / 72 == pytest.approx(expected_width, abs=1e-6)
+        assert height * DPI / 72 == pytest.approx(expected_height, abs=1e-6)
+
+
+def test_map_units_match_the_axes_data_transform(axes):
+    axes.set_xlim(0, 800000)
+    axes.set_ylim(0, 450000)
+    axes.set_aspect('equal')
+    text_measurer = TextMeasurer.from_axes(axes)
+
+    bounds = text_measurer.text_box_bounds(LABELS, xs=np.full(4, 400000.0), ys=np.full(4, 200000.0),
+                                           font='DejaVu Sans', size=10, weight='normal')
+    for label, (x_min, y_min, x_max, y_max) in zip(LABELS, bounds):
+        text = axes.text(400000, 200000, label, fontsize=10, family='DejaVu Sans', ha='center', va='center')
+        extent = text.get_window_extent(axes.figure.canvas.get_renderer()).transformed(axes.transData.inverted())
+        text.remove()
+        assert (x_min, y_min, x_max, y_max) == pytest.approx((extent.x0, extent.y0, extent.x1, extent.y1), abs=1.0)
+
+
+def test_extents_are_cached_per_label_and_style():
+    text_measurer = TextMeasurer.for_figure(create_iowa_projector(), fig_size=(20, 15), dpi=DPI)
+
+    text_measurer.measure_many(LABELS * 3, font='DejaVu Sans', size=10, weight='normal')
+    text_measurer.measure('Ely', font='DejaVu Sans', size=10, weight='normal', rotation=90)
+    assert len(text_measurer._extents) == len(LABELS)
@@ -0,0 +1,51 @@
+import time
+
+
+class PlacementBudget:
+
+    def __init__(self, max_seconds: float = None, max_evaluations: int = None, parent: 'PlacementBudget' = None):
+        # None or 0 leaves that limit off
+        self.max_seconds = max_seconds or None
+        self.max_evaluations = max_evaluations or None
+        self._parent = parent
+
+        self.evaluations = 0
+        self._start_time = time.perf_counter()
+
+    def for_city(self, max_seconds: float = None, max_evaluations: int = None) -> 'PlacementBudget':
+        # A city's budget also runs out when the map's budget does
+        return PlacementBudget(max_seconds=max_seconds, max_evaluations=max_evaluations, parent=self)
+
+    @property
+    def is_limited(self) -> bool:
+        own_limit = self.max_seconds is not None or self.max_evaluations is not None
+        return own_limit or (self._parent is not None and self._parent.is_limited)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self._start_time
+
+    @property
+    def remaining_evaluations(self) -> int | None:
+        remaining = None if self.max_evaluations is None else self.max_evaluations - self.evaluations
+        if self._parent is not None:
+            parent_remaining = self._parent.remaining_evaluations
+            if remaining is None or (parent_remaining is not None and parent_remaining < remaining):
+                remaining = parent_remaining
+
+        return None if remaining is None else max(remaining, 0)
+
+    @property
+    def expired(self) -> bool:
+        if self.max_seconds is not None and self.elapsed_seconds >= self.max_seconds:
+            return True
+
+        if self.remaining_evaluations == 0:
+            return True
+
+        return self._parent is not None and self._parent.expired
+
+    def record(self, num_evaluations: int):
+        self.evaluations += num_evaluations
+        if self._parent is not None:
+            self._parent.record(num_evaluations)
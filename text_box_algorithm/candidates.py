@@ -0,0 +1,151 @@
+import numpy as np
+import shapely
+
+from visualization_elements.element_classes import TextBox, TextBoxClassification
+
+
+def _walk(start: float, target: float, step: float, increasing: bool) -> np.ndarray:
+    # Positions visited by repeatedly stepping from start until target is reached or passed
+    distance = (target - start) if increasing else (start - target)
+    if distance <= 0:
+        return np.empty(0, dtype=np.float64)
+
+    # The return legs cover an exact multiple of the step, which float noise mustn't turn into an extra step
+    num_steps = int(np.ceil(distance / step - 1e-9))
+    offsets = step * np.arange(1, num_steps + 1, dtype=np.float64)
+    return start + offsets if increasing else start - offsets
+
+
+def perimeter_candidate_bounds(city_bounds: tuple,
+                               text_width: float,
+                               text_height: float,
+                               city_buffer: float,
+                               number_of_search_steps: int) -> np.ndarray:
+    """
+    Every text box position around the city box as an (N, 4) array of x_min, y_min, x_max, y_max.
+
+    The text box starts diagonally below-left of the (buffered) city box and walks right along its bottom edge,
+    up its right edge, left along its top edge and back down its left edge.
+    """
+    city_x_min, city_y_min, city_x_max, city_y_max = city_bounds
+    city_x_min, city_y_min = city_x_min - city_buffer, city_y_min - city_buffer
+    city_x_max, city_y_max = city_x_max + city_buffer, city_y_max + city_buffer
+
+    perimeter_movement_amount = (2 * text_height + 2 * text_width) / number_of_search_steps
+    x_step = min(perimeter_movement_amount, text_width)
+    y_step = min(perimeter_movement_amount, text_height)
+
+    x_start = city_x_min - text_width
+    y_start = city_y_min - text_height
+
+    # Each leg starts where the previous one ended
+    right_xs = _walk(x_start, city_x_max, x_step, increasing=True)
+    x_right = right_xs[-1] if len(right_xs) else x_start
+    up_ys = _walk(y_start, city_y_max, y_step, increasing=True)
+    y_top = up_ys[-1] if len(up_ys) else y_start
+    left_xs = _walk(x_right, city_x_min - text_width, x_step, increasing=False)
+    x_left = left_xs[-1] if len(left_xs) else x_right
+    down_ys = _walk(y_top, city_y_min - text_height, y_step, increasing=False)
+
+    x_mins = np.concatenate([right_xs,
+                             np.full(len(up_ys), x_right),
+                             left_xs,
+                             np.full(len(down_ys), x_left)])
+    y_mins = np.concatenate([np.full(len(right_xs), y_start),
+                             up_ys,
+                             np.full(len(left_xs), y_top),
+                             down_ys])
+    return np.column_stack([x_mins, y_mins, x_mins + text_width, y_mins + text_height])
+
+
+class PerimeterPath:
+
+    def __init__(self, city_bounds: tuple, text_width: float, text_height: float, city_buffer: float):
+        """
+        The loop traced by a text box's lower-left corner as it circles the (buffered) city box.
+
+        Positions are arc length offsets from the corner diagonally below-left of the city box, going right along
+        the bottom edge, up the right edge, left along the top edge and back down the left edge.
+        """
+        city_x_min, city_y_min, city_x_max, city_y_max = city_bounds
+        self.text_width = text_width
+        self.text_height = text_height
+
+        self.x_start = city_x_min - city_buffer - text_width
+        self.y_start = city_y_min - city_buffer - text_height
+        self.x_end = city_x_max + city_buffer
+        self.y_end = city_y_max + city_buffer
+
+        self.width = self.x_end - self.x_start
+        self.height = self.y_end - self.y_start
+        self.length = 2 * self.width + 2 * self.height
+
+    @property
+    def window(self) -> tuple:
+        # Bounds covering the text box at every position on the path
+        return self.x_start, self.y_start, self.x_end + self.text_width, self.y_end + self.text_height
+
+    def bounds_at(self, offsets: np.ndarray) -> np.ndarray:
+        offsets = np.mod(np.asarray(offsets, dtype=np.float64), self.length)
+        legs = np.cumsum([self.width, self.height, self.width])
+        x_mins = np.select([offsets < legs[0], offsets < legs[1], offsets < legs[2]],
+                           [self.x_start + offsets, np.full(len(offsets), self.x_end), self.x_end - (offsets - legs[1])],
+                           default=self.x_start)
+        y_mins = np.select([offsets < legs[0], offsets < legs[1], offsets < legs[2]],
+                           [np.full(len(offsets), self.y_start), self.y_start + (offsets - legs[0]),
+                            np.full(len(offsets), self.y_end)],
+                           default=self.y_end - (offsets - legs[2]))
+        return np.column_stack([x_mins, y_mins, x_mins + self.text_width, y_mins + self.text_height])
+
+
+def prioritize_candidates(candidate_bounds: np.ndarray,
+                          element_bounds: np.ndarray,
+                          element_invalid_mask: np.ndarray) -> np.ndarray:
+    """
+    Candidate ids ordered most promising first, judged from bounding boxes alone.
+
+    Candidates overlapping fewer non-line element boxes come first, then fewer element boxes of any kind, then
+    those furthest from the nearest element box. Remaining ties keep perimeter order.
+    """
+    candidate_ids = np.arange(len(candidate_bounds))
+    if len(element_bounds) == 0:
+        return candidate_ids
+
+    candidates = candidate_bounds[:, None, :]
+    elements = element_bounds[None, :, :]
+    gap_x = np.maximum(0.0, np.maximum(elements[..., 0] - candidates[..., 2], candidates[..., 0] - elements[..., 2]))
+    gap_y = np.maximum(0.0, np.maximum(elements[..., 1] - candidates[..., 3], candidates[..., 1] - elements[..., 3]))
+    overlaps = (gap_x == 0) & (gap_y == 0)
+
+    invalid_overlap_counts = (overlaps & element_invalid_mask).sum(axis=1)
+    overlap_counts = overlaps.sum(axis=1)
+    clearance = np.hypot(gap_x, gap_y).min(axis=1)
+    return np.lexsort((candidate_ids, -clearance, overlap_counts, invalid_overlap_counts))
+
+
+class PerimeterCandidates:
+
+    def __init__(self, city_name: str, bounds: np.ndarray):
+        self.city_name = city_name
+        self.bounds = bounds
+
+        self._polygons = None
+
+    def __len__(self):
+        return len(self.bounds)
+
+    @property
+    def polygons(self) -> np.ndarray:
+        # Built in one vectorized call, and only once something needs exact geometry
+        if self._polygons is None:
+            self._polygons = shapely.box(self.bounds[:, 0], self.bounds[:, 1], self.bounds[:, 2], self.bounds[:, 3])
+
+        return self._polygons
+
+    def create_text_boxes(self, candidate_ids, classification: TextBoxClassification) -> list[TextBox]:
+        return [
+            TextBox(classification=classification,
+                    polygon=self.polygons[candidate_id],
+                    algorithm_attributes={'city_name': self.city_name, 'candidate_id': int(candidate_id)})
+            for candidate_id in candidate_ids
+        ]
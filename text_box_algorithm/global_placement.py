@@ -0,0 +1,196 @@
+import logging
+
+import numpy as np
+import shapely
+
+from visualization_elements.element_classes import CityScatter, TextBoxClassification
+from .candidates import PerimeterCandidates, perimeter_candidate_bounds
+from .rtree_elements_manager import RtreeElementsManager
+from .textbox_placement_algorithm import score_finalists
+
+# Covering a city scatter or another label always costs more than crossing any number of lines
+INVALID_INTERSECTION_COST = 1e6
+LINE_INTERSECTION_COST = 1.0
+
+
+class PlacementRequest:
+    __slots__ = ('city_scatter', 'text_width', 'text_height')
+
+    def __init__(self, city_scatter: CityScatter, text_width: float, text_height: float):
+        self.city_scatter = city_scatter
+        self.text_width = text_width
+        self.text_height = text_height
+
+
+class GlobalPlacementResult:
+
+    def __init__(self, text_boxes: dict, total_cost: float, iterations: int):
+        # CityScatter -> TextBox for every placed city
+        self.text_boxes = text_boxes
+        self.total_cost = total_cost
+        self.iterations = iterations
+
+
+class _ConflictGraph:
+
+    def __init__(self, polygons: np.ndarray, candidate_cities: np.ndarray):
+        # Overlapping candidates of different cities, stored as CSR adjacency
+        pairs = shapely.STRtree(polygons).query(polygons, predicate='intersects')
+        pairs = pairs[:, candidate_cities[pairs[0]] != candidate_cities[pairs[1]]]
+        order = np.argsort(pairs[0], kind='stable')
+        self.indices = pairs[1][order]
+        self.indptr = np.zeros(len(polygons) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(np.bincount(pairs[0], minlength=len(polygons)))
+
+    def neighbors(self, candidate_id: int) -> np.ndarray:
+        return self.indices[self.indptr[candidate_id]:self.indptr[candidate_id + 1]]
+
+
+def repair_order(static_costs: list[np.ndarray]) -> np.ndarray:
+    # Cities with the fewest clean candidates go first, so they get first pick, then in request order
+    clean_counts = np.array([np.count_nonzero(costs == 0) for costs in static_costs], dtype=np.int64)
+    return np.lexsort((np.arange(len(static_costs)), clean_counts))
+
+
+class GlobalLabelPlacer:
+
+    def __init__(self,
+                 rtree_manager: RtreeElementsManager,
+                 city_buffer: int,
+                 number_of_search_steps: int,
+                 max_iterations: int = 20000):
+        self._rtree_manager = rtree_manager
+        self.city_buffer = city_buffer
+        self.number_of_search_steps = number_of_search_steps
+        # Each iteration re-evaluates every candidate of one city, the repair sweeps the cities in repair_order
+        self.max_iterations = max_iterations
+
+    def _create_candidates(self, request: PlacementRequest) -> PerimeterCandidates:
+        bounds = perimeter_candidate_bounds(city_bounds=request.city_scatter.polygon.bounds,
+                                            text_width=request.text_width,
+                                            text_height=request.text_height,
+                                            city_buffer=self.city_buffer,
+                                            number_of_search_steps=self.number_of_search_steps)
+        return PerimeterCandidates(city_name=request.city_scatter.algorithm_attributes.get('city_name'),
+                                   bounds=bounds)
+
+    def _static_costs(self, candidates: PerimeterCandidates, city_scatter: CityScatter) -> np.ndarray:
+        # Cost against everything already in the rtree, which doesn't change while labels are being placed
+        intersections = self._rtree_manager.query_intersections(candidates.polygons, elements_to_ignore=[city_scatter])
+        invalid_counts = intersections.invalid_counts
+        line_counts = intersections.counts - invalid_counts
+        return INVALID_INTERSECTION_COST * invalid_counts + LINE_INTERSECTION_COST * line_counts
+
+    def _distance_scores(self,
+                         candidate_sets: list[PerimeterCandidates],
+                         requests: list[PlacementRequest]) -> np.ndarray:
+        # The room-to-neighbors score the per-city search ranks its finalists by, higher is better
+        polygons = np.concatenate([candidates.polygons for candidates in candidate_sets])
+        candidate_cities = np.repeat(np.arange(len(requests)), [len(candidates) for candidates in candidate_sets])
+
+        # One bulk query for every candidate, then each candidate drops its own city scatter
+        rows, element_ids = self._rtree_manager.nearest_element_ids(polygons)
+        scatter_ids = self._rtree_manager.element_ids([request.city_scatter for request in requests])
+        keep = element_ids != scatter_ids[candidate_cities[rows]]
+        distances, invalid_mask = self._rtree_manager.element_distances(polygons, rows[keep], element_ids[keep])
+        return score_finalists(distances, invalid_mask)
+
+    def distance_scores(self, requests: list[PlacementRequest]) -> list[np.ndarray]:
+        if not requests:
+            return []
+
+        candidate_sets = [self._create_candidates(request) for request in requests]
+        offsets = np.cumsum([len(candidates) for candidates in candidate_sets])[:-1]
+        return np.split(self._distance_scores(candidate_sets, requests), offsets)
+
+    def static_costs(self, requests: list[PlacementRequest]) -> list[np.ndarray]:
+        return [self._static_costs(self._create_candidates(request), request.city_scatter) for request in requests]
+
+    def place(self,
+              requests: list[PlacementRequest],
+              commit: bool = True,
+              distance_scores: list[np.ndarray] = None,
+              static_costs: list[np.ndarray] = None) -> GlobalPlacementResult:
+        """
+        Chooses every request's text box together, breaking ties on cost by the distance score.
+
+        distance_scores and static_costs can be given when the rtree here doesn't hold everything near the
+        candidates, such as in a worker that only sees one cluster's surroundings.
+        """
+        if not requests:
+            return GlobalPlacementResult(text_boxes=dict(), total_cost=0.0, iterations=0)
+
+        candidate_sets = [self._create_candidates(request) for request in requests]
+        offsets = np.zeros(len(requests) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(candidates) for candidates in candidate_sets])
+        candidate_cities = np.repeat(np.arange(len(requests)), np.diff(offsets))
+        if static_costs is None:
+            static_costs = [self._static_costs(candidates, request.city_scatter)
+                            for candidates, request in zip(candidate_sets, requests)]
+        city_order = repair_order(static_costs)
+        static_costs = np.concatenate(static_costs)
+        if distance_scores is None:
+            scores = self._distance_scores(candidate_sets, requests)
+        else:
+            scores = np.concatenate(distance_scores)
+        graph = _ConflictGraph(np.concatenate([candidates.polygons for candidates in candidate_sets]),
+                               candidate_cities=candidate_cities)
+
+        selection = np.full(len(requests), -1, dtype=np.int64)
+        # Number of currently selected labels of other cities that overlap each candidate
+        conflict_counts = np.zeros(offsets[-1], dtype=np.int64)
+
+        def candidate_costs(city_id: int) -> np.ndarray:
+            start, end = offsets[city_id], offsets[city_id + 1]
+            return static_costs[start:end] + INVALID_INTERSECTION_COST * conflict_counts[start:end]
+
+        def best_candidate(city_id: int, costs: np.ndarray) -> int:
+            # Among the cheapest candidates, the one with the most room around it, then the first
+            tied = np.flatnonzero(costs == costs.min())
+            return int(tied[np.argmax(scores[offsets[city_id] + tied])])
+
+        def select(city_id: int, candidate_id: int):
+            previous = selection[city_id]
+            if previous >= 0:
+                conflict_counts[graph.neighbors(previous)] -= 1
+            conflict_counts[graph.neighbors(candidate_id)] += 1
+            selection[city_id] = candidate_id
+
+        # Greedy start, in the same order as the repair
+        for city_id in city_order:
+            select(city_id, offsets[city_id] + best_candidate(city_id, candidate_costs(city_id)))
+
+        # Repair: move any city that can lower its cost given everyone else's current labels
+        iterations = 0
+        improved = True
+        while improved and iterations < self.max_iterations:
+            improved = False
+            for city_id in city_order:
+                if iterations >= self.max_iterations:
+                    break
+
+                iterations += 1
+                start = offsets[city_id]
+                costs = candidate_costs(city_id)
+                best = best_candidate(city_id, costs)
+                current = selection[city_id] - start
+                # An equal cost move has to gain room, so the repair still can't cycle
+                if (costs[best], -scores[start + best]) < (costs[current], -scores[start + current]):
+                    select(city_id, offsets[city_id] + best)
+                    improved = True
+
+        if improved:
+            logging.info(f"Label placement stopped at its budget of {self.max_iterations} iterations.")
+
+        total_cost = float(static_costs[selection].sum()
+                           + INVALID_INTERSECTION_COST * conflict_counts[selection].sum() / 2)
+
+        text_boxes = dict()
+        for city_id, (request, candidates) in enumerate(zip(requests, candidate_sets)):
+            candidate_id = selection[city_id] - offsets[city_id]
+            text_box = candidates.create_text_boxes([candidate_id], TextBoxClassification.BEST)[0]
+            text_boxes[request.city_scatter] = text_box
+            if commit:
+                self._rtree_manager.add_visualization_element(text_box)
+
+        return GlobalPlacementResult(text_boxes=text_boxes, total_cost=total_cost, iterations=iterations)
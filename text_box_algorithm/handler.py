@@ -1,12 +1,14 @@
 import logging
 
-from things import box_geometry
-
 import config_manager
 from polygons import polygon_factory
-from polygons.polygon_factory import PolygonFactory
-from visualization_elements.element_classes import TextBoxClassification
+from visualization_elements.element_classes import CityScatter, TextBox, TextBoxClassification
+from .budget import PlacementBudget
+from .global_placement import GlobalLabelPlacer, GlobalPlacementResult, PlacementRequest
+from .incremental_layout import IncrementalLayoutUpdater
+from .parallel_placement import ParallelLabelPlacer
 from .plotter import AlgorithmPlotter
+from .rtree_elements_manager import RtreeElementsManager
 from .textbox_placement_algorithm import TextboxPlacementAlgorithm
 
 
@@ -26,22 +28,44 @@ class AlgorithmHandler:
         else:
             self._algorithm_plotter = None
 
-        self._rtree_analyzer = rtree_analyzer.RtreeElementsManager()
+        self._rtree_analyzer = RtreeElementsManager()
+        # Shared by every city placed through this handler, 0 in the config means no limit
+        self._placement_budget = PlacementBudget(max_seconds=self._config('algo.map_time_budget', float),
+                                                 max_evaluations=self._config('algo.map_evaluation_budget', int))
         self._polygon_factory_ = polygon_factory_
 
+    def add_visualization_element(self, visualization_element):
+        # Scatters and lines the text boxes have to be placed around
+        self._rtree_analyzer.add_visualization_element(visualization_element)
+
+    def create_incremental_updater(self) -> IncrementalLayoutUpdater:
+        # Finds and releases the placed text boxes a change to the map could have moved
+        return IncrementalLayoutUpdater(rtree_manager=self._rtree_analyzer,
+                                        search_width=self._config('algo.nearby_poly_search_width', float),
+                                        search_height=self._config('algo.nearby_poly_search_height', float))
+
     def find_best_polygon(self,
                           city_scatter: CityScatter,
                           text_box: TextBox,
                           city_buffer: int,
                           number_of_steps: int):
+        # Imported here so the rest of the placement code doesn't need things installed
+        from things import box_geometry
+
         logging.info(f"Finding best poly for city '{city_scatter.city_name}'")
         text_box = box_geometry.BoxGeometry(**text_box.bounds)
 
         algo = TextboxPlacementAlgorithm(
-            config=self._config,
             rtree_manager=self._rtree_analyzer,
             city_buffer=city_buffer,
-            number_of_search_steps=number_of_steps
+            number_of_search_steps=number_of_steps,
+            show_candidates=self._plot_algorithm,
+            budget=self._placement_budget,
+            city_max_seconds=self._config('algo.city_time_budget', float),
+            city_max_evaluations=self._config('algo.city_evaluation_budget', int),
+            batch_size=self._config('algo.anytime_batch_size', int),
+            refinement_levels=self._config('algo.refinement_levels', int),
+            refinement_candidates=self._config('algo.refinement_candidates', int)
         )
         for elements, classification in algo.find_best_poly(text_box=text_box,
                                                             city_scatter=city_scatter):
@@ -56,5 +80,32 @@ class AlgorithmHandler:
                 
                 logging.info(f"Found best poly for {city_scatter.city_name}.")
                 
-                return PolygonFactory.create_rectangle(**best.bounds)
+                return best.polygon
 
+    def place_text_boxes(self,
+                         requests: list[PlacementRequest],
+                         city_buffer: int,
+                         number_of_steps: int) -> GlobalPlacementResult:
+        # Every city's label is chosen together, instead of one city at a time in iteration order
+        max_workers = self._config('algo.placement_workers', int)
+        if max_workers > 1:
+            placer = ParallelLabelPlacer(
+                rtree_manager=self._rtree_analyzer,
+                city_buffer=city_buffer,
+                number_of_search_steps=number_of_steps,
+                search_width=self._config('algo.nearby_poly_search_width', float),
+                search_height=self._config('algo.nearby_poly_search_height', float),
+                max_workers=max_workers,
+                max_iterations=self._config('algo.placement_max_iterations', int)
+            )
+        else:
+            placer = GlobalLabelPlacer(
+                rtree_manager=self._rtree_analyzer,
+                city_buffer=city_buffer,
+                number_of_search_steps=number_of_steps,
+                max_iterations=self._config('algo.placement_max_iterations', int)
+            )
+        result = placer.place(requests)
+        logging.info(f"Placed {len(result.text_boxes)} text boxes in {result.iterations} iterations, "
+                     f"total cost {result.total_cost}.")
+        return result
@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+import pandas as pd
+import shapely
+
+from entities.entity_classes import City
+from shared.shared_utils import Coordinate
+from visualization_elements.element_classes import TextBox, TextBoxClassification
+from .rtree_elements_manager import RtreeElementsManager
+
+_BOUNDS_COLUMNS = ['x_min', 'y_min', 'x_max', 'y_max']
+
+
+class IncrementalLayoutUpdater:
+
+    def __init__(self, rtree_manager: RtreeElementsManager, search_width: float, search_height: float):
+        self._rtree_manager = rtree_manager
+        self._search_width = search_width
+        self._search_height = search_height
+
+    def _search_window(self, poly) -> tuple:
+        x_min, y_min, x_max, y_max = poly.bounds
+        return (x_min - self._search_width,
+                y_min - self._search_height,
+                x_max + self._search_width,
+                y_max + self._search_height)
+
+    def find_stale_cities(self,
+                          changed_cities: set[City],
+                          changed_polys: list,
+                          text_boxes_by_city: dict[City, TextBox]) -> set[City]:
+        # Cities whose own assignments changed are always re-placed
+        stale_cities = set(city for city in changed_cities if city in text_boxes_by_city)
+
+        # Any placed text box within the nearby search window of a changed element may have placed differently
+        city_by_text_box = {text_box: city for city, text_box in text_boxes_by_city.items()}
+        for poly in changed_polys:
+            for element in self._rtree_manager.find_elements_in_window(self._search_window(poly)):
+                if element in city_by_text_box:
+                    stale_cities.add(city_by_text_box[element])
+
+        return stale_cities
+
+    def release_text_boxes(self, cities: set[City], text_boxes_by_city: dict[City, TextBox]):
+        # Stale text boxes leave the rtree so the cities can be re-placed against the current layout
+        for city in cities:
+            text_box = text_boxes_by_city.pop(city, None)
+            if text_box is not None:
+                self._rtree_manager.remove_visualization_element(text_box)
+
+
+class LayoutCache:
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _layout_path(self, key: str, map_name: str) -> str:
+        return os.path.join(self.cache_dir, key, f"{map_name}.csv")
+
+    def load(self, key: str, map_name: str) -> dict[City, TextBox]:
+        layout_path = self._layout_path(key, map_name)
+        if not os.path.exists(layout_path):
+            return dict()
+
+        df = pd.read_csv(layout_path, float_precision='round_trip')
+        polygons = shapely.box(*df[_BOUNDS_COLUMNS].to_numpy().T)
+        return {
+            City(city_name, Coordinate(lon, lat)): TextBox(classification=TextBoxClassification.BEST,
+                                                           polygon=polygon,
+                                                           algorithm_attributes={'city_name': city_name})
+            for city_name, lon, lat, polygon in zip(df['city_name'], df['lon'], df['lat'], polygons)
+        }
+
+    def save(self, key: str, map_name: str, text_boxes_by_city: dict[City, TextBox]):
+        layout_dir = os.path.dirname(self._layout_path(key, map_name))
+        os.makedirs(layout_dir, exist_ok=True)
+
+        df = pd.DataFrame(
+            [(city.city_name, city.city_coord.lon, city.city_coord.lat, *text_box.polygon.bounds)
+             for city, text_box in text_boxes_by_city.items()],
+            columns=['city_name', 'lon', 'lat', *_BOUNDS_COLUMNS]
+        )
+
+        # Written next to the layout and moved over it, so a half-written layout is never loaded
+        fd, temp_path = tempfile.mkstemp(dir=layout_dir, prefix=f".{map_name}.", suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w', newline='') as f:
+                df.to_csv(f, index=False, float_format='%.17g')
+            os.replace(temp_path, self._layout_path(key, map_name))
+        except Exception:
+            os.remove(temp_path)
+            raise
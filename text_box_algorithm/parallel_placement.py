@@ -0,0 +1,220 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+from visualization_elements.element_classes import CityScatter, Line, TextBox, TextBoxClassification
+from .global_placement import GlobalLabelPlacer, GlobalPlacementResult, PlacementRequest, repair_order
+from .rtree_elements_manager import RtreeElementsManager
+
+
+def _find_root(parents: list[int], node: int) -> int:
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+
+def _reach_bounds(requests: list[PlacementRequest], city_buffer: float, search_width: float,
+                  search_height: float) -> np.ndarray:
+    # Everywhere a city's label could end up, widened by the nearby search window
+    city_bounds = np.array([request.city_scatter.polygon.bounds for request in requests], dtype=np.float64)
+    x_margin = np.array([request.text_width for request in requests]) + city_buffer + search_width
+    y_margin = np.array([request.text_height for request in requests]) + city_buffer + search_height
+    return np.column_stack([city_bounds[:, 0] - x_margin, city_bounds[:, 1] - y_margin,
+                            city_bounds[:, 2] + x_margin, city_bounds[:, 3] + y_margin])
+
+
+def partition_requests(requests: list[PlacementRequest],
+                       city_buffer: float,
+                       search_width: float,
+                       search_height: float) -> list[np.ndarray]:
+    """
+    Splits the requests into clusters whose labels can't interact with any other cluster's labels.
+
+    Clusters are returned as arrays of request ids, sorted and ordered by their first id, so the partition only
+    depends on the requests and not on how they're placed afterwards.
+    """
+    if not requests:
+        return []
+
+    reach = _reach_bounds(requests, city_buffer=city_buffer, search_width=search_width, search_height=search_height)
+    reach_polygons = shapely.box(reach[:, 0], reach[:, 1], reach[:, 2], reach[:, 3])
+    pairs = shapely.STRtree(reach_polygons).query(reach_polygons, predicate='intersects')
+
+    parents = list(range(len(requests)))
+    for left, right in zip(*pairs[:, pairs[0] < pairs[1]]):
+        left_root, right_root = _find_root(parents, left), _find_root(parents, right)
+        if left_root != right_root:
+            parents[max(left_root, right_root)] = min(left_root, right_root)
+
+    roots = np.array([_find_root(parents, node) for node in range(len(requests))])
+    return [np.flatnonzero(roots == root) for root in np.unique(roots)]
+
+
+class _ClusterTask:
+    """Everything a worker process needs to place one cluster, without the rtree or the caller's elements."""
+
+    def __init__(self, cluster: np.ndarray, requests: list[PlacementRequest], obstacles: list,
+                 distance_scores: list[np.ndarray], static_costs: list[np.ndarray], max_iterations: int):
+        self.cluster = cluster
+        self.city_names = [requests[request_id].city_scatter.algorithm_attributes.get('city_name')
+                           for request_id in cluster]
+        self.text_sizes = np.array([(requests[request_id].text_width, requests[request_id].text_height)
+                                    for request_id in cluster], dtype=np.float64)
+        self.obstacle_polygons = np.array([obstacle.polygon for obstacle in obstacles], dtype=object)
+        self.obstacle_is_line = np.array([isinstance(obstacle, Line) for obstacle in obstacles], dtype=bool)
+
+        obstacle_ids = {id(obstacle): obstacle_id for obstacle_id, obstacle in enumerate(obstacles)}
+        self.scatter_obstacle_ids = np.array([obstacle_ids.get(id(requests[request_id].city_scatter), -1)
+                                              for request_id in cluster], dtype=np.int64)
+        self.scatter_polygons = np.array([requests[request_id].city_scatter.polygon for request_id in cluster],
+                                         dtype=object)
+        # Scored and costed against the whole rtree, the worker's private one only holds the cluster's surroundings
+        self.distance_scores = distance_scores
+        self.static_costs = static_costs
+        # The cluster's share of the map's repair budget, see ParallelLabelPlacer._cluster_budgets
+        self.max_iterations = max_iterations
+
+
+def _place_cluster_tasks(tasks: list[_ClusterTask],
+                         city_buffer: float,
+                         number_of_search_steps: int) -> list[tuple[list, float, int]]:
+    results = []
+    for task in tasks:
+        # Rebuild the cluster's surroundings as lightweight elements in a private rtree
+        rtree_manager = RtreeElementsManager()
+        obstacles = [Line(polygon=polygon) if is_line else CityScatter(polygon=polygon)
+                     for polygon, is_line in zip(task.obstacle_polygons, task.obstacle_is_line)]
+        for obstacle in obstacles:
+            rtree_manager.add_visualization_element(obstacle)
+
+        requests = []
+        for city_name, (text_width, text_height), obstacle_id, polygon in zip(
+                task.city_names, task.text_sizes, task.scatter_obstacle_ids, task.scatter_polygons):
+            city_scatter = obstacles[obstacle_id] if obstacle_id >= 0 else CityScatter(polygon=polygon)
+            city_scatter.algorithm_attributes['city_name'] = city_name
+            requests.append(PlacementRequest(city_scatter, text_width=text_width, text_height=text_height))
+
+        placer = GlobalLabelPlacer(rtree_manager=rtree_manager,
+                                   city_buffer=city_buffer,
+                                   number_of_search_steps=number_of_search_steps,
+                                   max_iterations=task.max_iterations)
+        result = placer.place(requests, commit=False, distance_scores=task.distance_scores,
+                              static_costs=task.static_costs)
+        # (request index, candidate id, bounds) for each placed label, the text boxes themselves stay in the worker
+        placements = []
+        for request_id, request in zip(task.cluster.tolist(), requests):
+            text_box = result.text_boxes[request.city_scatter]
+            placements.append((request_id, text_box.algorithm_attributes['candidate_id'], text_box.polygon.bounds))
+        results.append((placements, result.total_cost, result.iterations))
+
+    return results
+
+
+class ParallelLabelPlacer:
+
+    def __init__(self,
+                 rtree_manager: RtreeElementsManager,
+                 city_buffer: int,
+                 number_of_search_steps: int,
+                 search_width: float,
+                 search_height: float,
+                 max_workers: int,
+                 max_iterations: int = 20000):
+        self._rtree_manager = rtree_manager
+        self.city_buffer = city_buffer
+        self.number_of_search_steps = number_of_search_steps
+        self.search_width = search_width
+        self.search_height = search_height
+        self.max_workers = max_workers
+        # Budget for the whole map, shared out between the clusters the way GlobalLabelPlacer would spend it
+        self.max_iterations = max_iterations
+
+    def _cluster_budgets(self, clusters: list[np.ndarray], city_order: np.ndarray) -> list[int]:
+        """
+        Each cluster's share of max_iterations, the visits GlobalLabelPlacer's repair would make to its cities.
+
+        The serial repair sweeps every city in city_order until the budget runs out, and a cluster's own repair
+        visits its cities in the same relative order. So each cluster gets its full sweeps plus its cities in the
+        unfinished last sweep, and ends exactly where the serial repair would leave it.
+        """
+        num_sweeps, remainder = divmod(self.max_iterations, len(city_order))
+        in_last_sweep = np.zeros(len(city_order), dtype=bool)
+        in_last_sweep[city_order[:remainder]] = True
+        return [num_sweeps * len(cluster) + int(in_last_sweep[cluster].sum()) for cluster in clusters]
+
+    def _create_tasks(self, clusters: list[np.ndarray], requests: list[PlacementRequest]) -> list[_ClusterTask]:
+        reach = _reach_bounds(requests, city_buffer=self.city_buffer, search_width=self.search_width,
+                              search_height=self.search_height)
+        scorer = GlobalLabelPlacer(rtree_manager=self._rtree_manager,
+                                   city_buffer=self.city_buffer,
+                                   number_of_search_steps=self.number_of_search_steps)
+        distance_scores = scorer.distance_scores(requests)
+        static_costs = scorer.static_costs(requests)
+        cluster_budgets = self._cluster_budgets(clusters, repair_order(static_costs))
+
+        tasks = []
+        for cluster, max_iterations in zip(clusters, cluster_budgets):
+            cluster_reach = reach[cluster]
+            window = (cluster_reach[:, 0].min(), cluster_reach[:, 1].min(),
+                      cluster_reach[:, 2].max(), cluster_reach[:, 3].max())
+            obstacles = self._rtree_manager.find_elements_in_window(window)
+            tasks.append(_ClusterTask(cluster, requests=requests, obstacles=obstacles,
+                                      distance_scores=[distance_scores[request_id] for request_id in cluster],
+                                      static_costs=[static_costs[request_id] for request_id in cluster],
+                                      max_iterations=max_iterations))
+        return tasks
+
+    def _batch_tasks(self, tasks: list[_ClusterTask]) -> list[list[_ClusterTask]]:
+        # Many small clusters are shipped together so process overhead doesn't dominate, largest first
+        num_batches = min(len(tasks), self.max_workers * 4)
+        batches = [[] for _ in range(num_batches)]
+        batch_sizes = np.zeros(num_batches, dtype=np.int64)
+        for task in sorted(tasks, key=lambda task: (-len(task.cluster), task.cluster[0])):
+            batch_id = int(np.argmin(batch_sizes))
+            batches[batch_id].append(task)
+            batch_sizes[batch_id] += len(task.cluster)
+        return batches
+
+    def place(self, requests: list[PlacementRequest]) -> GlobalPlacementResult:
+        if not requests:
+            return GlobalPlacementResult(text_boxes=dict(), total_cost=0.0, iterations=0)
+
+        clusters = partition_requests(requests, city_buffer=self.city_buffer, search_width=self.search_width,
+                                      search_height=self.search_height)
+        tasks = self._create_tasks(clusters, requests)
+        batches = self._batch_tasks(tasks)
+        logging.info(f"Placing {len(requests)} text boxes as {len(clusters)} independent clusters.")
+
+        args = (self.city_buffer, self.number_of_search_steps)
+        if self.max_workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(_place_cluster_tasks, batch, *args) for batch in batches]
+                batch_results = [future.result() for future in futures]
+        else:
+            batch_results = [_place_cluster_tasks(batch, *args) for batch in batches]
+
+        placements_by_request = dict()
+        total_cost = 0.0
+        iterations = 0
+        for results in batch_results:
+            for placements, cost, task_iterations in results:
+                for request_id, candidate_id, bounds in placements:
+                    placements_by_request[request_id] = (candidate_id, bounds)
+                total_cost += cost
+                iterations += task_iterations
+
+        # Clusters don't interact, so committing in request order gives the same rtree however the work was split
+        text_boxes = dict()
+        for request_id, request in enumerate(requests):
+            candidate_id, bounds = placements_by_request[request_id]
+            city_name = request.city_scatter.algorithm_attributes.get('city_name')
+            text_box = TextBox(classification=TextBoxClassification.BEST,
+                               polygon=shapely.box(*bounds),
+                               algorithm_attributes={'city_name': city_name, 'candidate_id': candidate_id})
+            self._rtree_manager.add_visualization_element(text_box)
+            text_boxes[request.city_scatter] = text_box
+
+        return GlobalPlacementResult(text_boxes=text_boxes, total_cost=total_cost, iterations=iterations)
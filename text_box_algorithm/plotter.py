@@ -2,11 +2,10 @@ import logging
 
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
-from mpl_toolkits import basemap
 
 from config_manager import ConfigManager
-from polygons import polygon_utils
-from visualization_elements.element_classes import VisualizationElement, Line
+from mapping.background import get_background_layer_cache
+from visualization_elements.element_classes import VisualizationElement
 
 
 def check_show_display(func):
@@ -28,7 +27,6 @@ class AlgorithmPlotter:
         self.show_pause = show_pause
 
         self.fig, self.ax = None, None
-        self.map_plot = None
 
         if show_display:
             self._create_figure(fig_size=display_fig_size,
@@ -54,13 +52,8 @@ class AlgorithmPlotter:
     def _create_figure(self, fig_size, county_line_width):
         self.fig, self.ax = plt.subplots(figsize=fig_size)
         self.ax.set_title("Rtree Polygons")
-        self.map_plot = basemap.Basemap(projection='lcc', resolution='i',
-                                        lat_0=41.5, lon_0=-93.5,  # Central latitude and longitude
-                                        llcrnrlon=-97, llcrnrlat=40,  # Lower-left corner
-                                        urcrnrlon=-89, urcrnrlat=44,  # Upper-right corner
-                                        ax=self.ax)
-        self.map_plot.drawstates()
-        self.map_plot.drawcounties(linewidth=county_line_width)
+        background_cache = get_background_layer_cache(self.config('display.background_cache_dir', str))
+        background_cache.draw(self.ax, county_line_width=county_line_width)
         plt.draw()
         plt.pause(0.1)
 
@@ -70,8 +63,6 @@ class AlgorithmPlotter:
 
     @check_show_display
     def plot_element(self, vis_element: VisualizationElement, poly_override=None):
-        if isinstance(vis_element, Line):
-            cpack = polygon_utils.shorten_line(x_data=)
         # Below was brought in from algorithm_handler. Hvae to work that out still
         new_poly = None
         # Shorten the line for the text_box_algorithm
@@ -1,9 +1,59 @@
 
 import itertools
 
+import numpy as np
+import shapely
 from rtree import index
 
-from visualization_elements.element_classes import VisualizationElement
+from visualization_elements.element_classes import VisualizationElement, Line, CityScatter, TextBox
+
+
+class CandidateIntersections:
+
+    def __init__(self, pairs: np.ndarray, elements: list[VisualizationElement], num_candidates: int):
+        # pairs[0] are candidate ids and pairs[1] ids into elements, one column per intersecting pair
+        self.pairs = pairs
+        self.elements = elements
+        self.num_candidates = num_candidates
+
+        # Lines may be crossed by a text box, anything else makes the candidate invalid
+        self.invalid_element_mask = np.array([not isinstance(element, Line) for element in elements], dtype=bool)
+
+    @property
+    def counts(self) -> np.ndarray:
+        return np.bincount(self.pairs[0], minlength=self.num_candidates)
+
+    @property
+    def invalid_counts(self) -> np.ndarray:
+        invalid_pairs = self.invalid_element_mask[self.pairs[1]]
+        return np.bincount(self.pairs[0][invalid_pairs], minlength=self.num_candidates)
+
+    @property
+    def invalid_flags(self) -> np.ndarray:
+        return self.invalid_counts > 0
+
+    def elements_for(self, candidate_id: int) -> list[VisualizationElement]:
+        element_ids = self.pairs[1][self.pairs[0] == candidate_id]
+        return [self.elements[element_id] for element_id in element_ids]
+
+    def invalid_elements_for(self, candidate_id: int) -> list[VisualizationElement]:
+        element_ids = self.pairs[1][self.pairs[0] == candidate_id]
+        return [self.elements[element_id] for element_id in element_ids if self.invalid_element_mask[element_id]]
+
+
+class ElementWindow:
+
+    def __init__(self, elements: list[VisualizationElement]):
+        # Elements around a group of candidates, queried repeatedly without going back to the rtree
+        self.elements = elements
+        self._tree = shapely.STRtree([element.polygon for element in elements]) if elements else None
+
+    def query_intersections(self, polygons: np.ndarray) -> CandidateIntersections:
+        if self._tree is None or len(polygons) == 0:
+            return CandidateIntersections(np.empty((2, 0), dtype=np.int64), [], num_candidates=len(polygons))
+
+        pairs = self._tree.query(polygons, predicate='intersects')
+        return CandidateIntersections(pairs, self.elements, num_candidates=len(polygons))
 
 
 class RtreeElementsManager:
@@ -12,6 +62,7 @@ class RtreeElementsManager:
         self._rtree_idx = index.Index()
 
         self._elements = {}
+        self._element_indices = {}
         self._poly_idx_counter = itertools.count()
 
     @staticmethod
@@ -24,11 +75,101 @@ class RtreeElementsManager:
         poly_idx = next(self._poly_idx_counter)
         self._rtree_idx.insert(poly_idx, poly.bounds, obj=poly)
         self._elements[poly_idx] = visualization_element
+        self._element_indices[visualization_element] = poly_idx
+
+    def remove_visualization_element(self, visualization_element: VisualizationElement):
+        poly_idx = self._element_indices.pop(visualization_element, None)
+        if poly_idx is None:
+            return
+
+        self._rtree_idx.delete(poly_idx, visualization_element.polygon.bounds)
+        del self._elements[poly_idx]
+
+    def element_ids(self, elements) -> np.ndarray:
+        # rtree ids of the elements, -1 for any that aren't in the rtree
+        return np.array([self._element_indices.get(element, -1) for element in elements], dtype=np.int64)
+
+    def find_elements_in_window(self, bounds: tuple) -> list[VisualizationElement]:
+        return [self._elements[idx] for idx in self._rtree_idx.intersection(bounds)]
+
+    def element_bounds_in_window(self, bounds: tuple, elements_to_ignore=()) -> tuple[np.ndarray, np.ndarray]:
+        # Bounding boxes of the elements in the window, and which of them are anything other than a line
+        elements_to_ignore = set(elements_to_ignore)
+        elements = [element for element in self.find_elements_in_window(bounds) if element not in elements_to_ignore]
+        element_bounds = np.array([element.polygon.bounds for element in elements], dtype=np.float64).reshape(-1, 4)
+        invalid_mask = np.array([not isinstance(element, Line) for element in elements], dtype=bool)
+        return element_bounds, invalid_mask
+
+    def create_element_window(self, bounds: tuple, elements_to_ignore=()) -> ElementWindow:
+        elements_to_ignore = set(elements_to_ignore)
+        return ElementWindow([element for element in self.find_elements_in_window(bounds)
+                              if element not in elements_to_ignore])
+
+    def query_intersections(self, polygons: np.ndarray, elements_to_ignore=()) -> CandidateIntersections:
+        if len(polygons) == 0:
+            return CandidateIntersections(np.empty((2, 0), dtype=np.int64), [], num_candidates=0)
+
+        # One rtree query for the window around every candidate, then one bulk predicate query over the result
+        bounds = shapely.bounds(polygons)
+        window = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+        return self.create_element_window(window, elements_to_ignore=elements_to_ignore).query_intersections(polygons)
+
+    def nearest_element_ids(self,
+                            polygons: np.ndarray,
+                            elements_to_ignore=(),
+                            num_nearest: int = 15) -> tuple[np.ndarray, np.ndarray]:
+        # (polygon row, element id) pairs for each polygon's nearest elements, grouped by row
+        if len(polygons) == 0 or not self._elements:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        # One bulk rtree query for every polygon's nearest elements, returned as flat ids with per-polygon counts
+        bounds = shapely.bounds(polygons)
+        nearest_ids, counts = self._rtree_idx.nearest_v(bounds[:, :2], bounds[:, 2:], num_results=num_nearest)
+        rows = np.repeat(np.arange(len(polygons)), counts.astype(np.int64))
+
+        ignored_ids = [self._element_indices[element] for element in elements_to_ignore
+                       if element in self._element_indices]
+        keep = ~np.isin(nearest_ids, ignored_ids)
+        return rows[keep], nearest_ids[keep].astype(np.int64)
+
+    def element_distances(self,
+                          polygons: np.ndarray,
+                          rows: np.ndarray,
+                          element_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Distances from each polygon to the elements paired with it, as a (polygons, neighbors) matrix padded with inf.
+
+        rows and element_ids pair polygons with elements and must be grouped by row. Also returns a same shaped mask
+        of which neighbors are city scatters or text boxes.
+        """
+        num_polygons = len(polygons)
+
+        # Column of each neighbor within its polygon's row
+        counts = np.bincount(rows, minlength=num_polygons)
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        cols = np.arange(len(rows)) - offsets[rows]
+
+        num_neighbors = int(counts.max()) if len(rows) else 0
+        distances = np.full((num_polygons, num_neighbors), np.inf)
+        invalid_mask = np.zeros((num_polygons, num_neighbors), dtype=bool)
+        if num_neighbors == 0:
+            return distances, invalid_mask
+
+        # Neighboring finalists share most of their neighbors, so each element is looked up once
+        unique_ids, inverse = np.unique(element_ids, return_inverse=True)
+        neighbors = [self._elements[int(idx)] for idx in unique_ids]
+        neighbor_polygons = np.array([element.polygon for element in neighbors], dtype=object)
+        neighbor_invalid = np.array([isinstance(element, (CityScatter, TextBox)) for element in neighbors], dtype=bool)
 
-    def determine_nearest_elements(self, query_poly, elements_to_ignore: list) -> dict:
-        nearest_ids = list(self._rtree_idx.nearest(query_poly.bounds, 15))
-        elements = {idx: self._elements[idx] for idx in nearest_ids
-                    if self._elements[idx] not in elements_to_ignore}
-        distances = {nearby_ele.distance(query_poly): nearby_ele for nearby_ele in elements}
-        return distances
+        # Every (polygon, neighbor) pair is measured in one vectorized call
+        distances[rows, cols] = shapely.distance(polygons[rows], neighbor_polygons[inverse])
+        invalid_mask[rows, cols] = neighbor_invalid[inverse]
+        return distances, invalid_mask
 
+    def nearest_element_distances(self,
+                                  polygons: np.ndarray,
+                                  elements_to_ignore=(),
+                                  num_nearest: int = 15) -> tuple[np.ndarray, np.ndarray]:
+        rows, element_ids = self.nearest_element_ids(polygons, elements_to_ignore=elements_to_ignore,
+                                                     num_nearest=num_nearest)
+        return self.element_distances(polygons, rows, element_ids)
@@ -1,94 +1,159 @@
-from things import box_geometry
+import logging
+from typing import TYPE_CHECKING
 
-from polygons import polygon_functions
-from polygons.polygon_factory import PolygonFactory
-from shared.shared_utils import Direction
-from visualization_elements.element_classes import TextBoxClassification, CityScatter, TextBox
-from .rtree_elements_manager import RtreeElementsManager
+import numpy as np
 
+from visualization_elements.element_classes import TextBoxClassification, CityScatter
+from .budget import PlacementBudget
+from .candidates import PerimeterCandidates, PerimeterPath, perimeter_candidate_bounds, prioritize_candidates
+from .rtree_elements_manager import ElementWindow, RtreeElementsManager
 
-class BestFits:
+if TYPE_CHECKING:
+    # Only the text box's bounds are read, any object with x_min, y_min, x_max and y_max works
+    from things import box_geometry
 
-    def __init__(self):
-        self._lowest_num_intersections = float('inf')
-        self._best_fits = list()
-
-        self._intersects_non_starter = True
-
-    def add_result(self, num_intersections: int, text_box, intersects_non_starter: bool):
-        # If we've found a text box that doesn't intersect a non-starter element and this text box does, then skip it
-        if intersects_non_starter and not self._intersects_non_starter:
-            return
 
-        if num_intersections < self._lowest_num_intersections:
-            self._lowest_num_intersections = num_intersections
-            self._best_fits = [text_box]
-        elif num_intersections == self._lowest_num_intersections:
-            self._best_fits.append(text_box)
+def select_finalists(counts: np.ndarray, invalid_flags: np.ndarray) -> np.ndarray:
+    # Candidates clear of non-starter elements win outright, then the fewest intersections
+    eligible = ~invalid_flags if not invalid_flags.all() else np.ones(len(counts), dtype=bool)
+    lowest = counts[eligible].min()
+    return np.flatnonzero(eligible & (counts == lowest))
 
-        if not intersects_non_starter:
-            self._intersects_non_starter = False
 
-    def fetch_best_fits(self):
-        return self._best_fits
+def score_finalists(distances: np.ndarray, invalid_mask: np.ndarray) -> np.ndarray:
+    # Room to the closest element of any kind, weighted heavily by room to the closest scatter or text box
+    closest_element = distances.min(axis=1, initial=np.inf)
+    closest_invalid = np.where(invalid_mask, distances, np.inf).min(axis=1, initial=np.inf)
+    with np.errstate(invalid='ignore'):
+        scores = closest_element * closest_invalid ** 2
+    # A finalist touching an element scores zero even with no scatter or text box nearby (0 * inf)
+    return np.where(closest_element == 0, 0.0, scores)
 
 
-class _TextBoxCandidatesResolver:
+def inherit_neighbors(rows: np.ndarray,
+                      element_ids: np.ndarray,
+                      num_parents: int,
+                      parent_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Each child gets a copy of its parent's (row, element id) group, rows and element_ids must be grouped by row
+    parent_counts = np.bincount(rows, minlength=num_parents)
+    parent_starts = np.concatenate([[0], np.cumsum(parent_counts)[:-1]])
 
-    def __init__(self, rtree_manager: RtreeElementsManager):
-        self._rtree_manager = rtree_manager
+    child_counts = parent_counts[parent_ids]
+    child_starts = np.concatenate([[0], np.cumsum(child_counts)[:-1]])
+    child_rows = np.repeat(np.arange(len(parent_ids)), child_counts)
+    positions = np.repeat(parent_starts[parent_ids] - child_starts, child_counts) + np.arange(child_counts.sum())
+    return child_rows, element_ids[positions]
 
-        self._best_fits = BestFits()
 
-    def _get_intersecting_vis_elements(self,
-                                       city_text_box: TextBox,
-                                       city_scatter
-                                       ) -> list:
-        # See what elements are within the city text box Rtree bounding box
-        intersection_indices = list(self._rtree_manager._rtree_idx.intersection(city_text_box.algorithm_poly.bounds))
-        intersecting_vis_elements = [self._rtree_manager._elements[idx] for idx in intersection_indices]
+class _CandidateRanking:
 
-        vis_elements = [ve for ve in intersecting_vis_elements if ve != city_scatter]
+    def __init__(self):
+        # (invalid, intersections, -score, candidate id) of the best candidate so far, lower is better
+        self._best_key = None
 
-        # Check whether it actually intersects
-        vis_elements = [ve for ve in vis_elements if city_text_box.algorithm_poly.intersects(ve.poly)]
+    @property
+    def best_candidate_id(self) -> int | None:
+        return None if self._best_key is None else self._best_key[3]
 
-        return vis_elements
+    @property
+    def is_optimal(self) -> bool:
+        # A valid candidate clear of everything with an infinite score can't be beaten by any other candidate
+        return self._best_key is not None and self._best_key[:3] == (False, 0, -np.inf)
 
-    def determine_best_finalist(self, finalists: list[TextBox], city_scatter):
-        finalist_scores = dict()
-        for i, finalist in enumerate(finalists):
-            nearby_elements = self._rtree_manager.determine_nearest_elements(query_poly=finalist.poly,
-                                                                             elements_to_ignore=city_scatter)
-            nearby_invalids = [d for d, ele in nearby_elements.items()
-                               if isinstance(ele, CityScatter) or isinstance(ele, CityTextBox)]
-            closest_invalid = min(nearby_invalids) if nearby_invalids else float('inf')
+    def could_improve(self, invalid: bool, count: int) -> bool:
+        return self._best_key is None or (invalid, count) <= self._best_key[:2]
 
-            closest_element = min([d for d, ele in nearby_elements.items()])
+    def update(self, candidate_ids: np.ndarray, invalid: bool, count: int, scores: np.ndarray):
+        # candidate_ids are ascending, so argmax breaks ties towards the earliest candidate on the perimeter
+        best = int(np.argmax(scores))
+        key = (invalid, count, -float(scores[best]), int(candidate_ids[best]))
+        if self._best_key is None or key < self._best_key:
+            self._best_key = key
 
-            score = closest_element * (closest_invalid ** 2)
-            finalist_scores[score] = finalist
 
-        best_score = max(list(finalist_scores.keys()))
-        yield [finalist_scores[best_score]], TextBoxClassification.BEST
+class _TextBoxCandidatesResolver:
 
-    def determine_text_box_finalists(self, city_text_boxes):
-        for city_text_box in enumerate(city_text_boxes):
-            yield [city_text_box], TextBoxClassification.REFERENCE
+    def __init__(self, rtree_manager: RtreeElementsManager):
+        self._rtree_manager = rtree_manager
 
-            intersecting_elements = self._get_intersecting_vis_elements(city_text_box=city_text_box)
-            yield intersecting_elements, TextBoxClassification.INTERSECT
+    def order_candidates(self, candidates: PerimeterCandidates, city_scatter) -> np.ndarray:
+        bounds = candidates.bounds
+        window = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+        element_bounds, invalid_mask = self._rtree_manager.element_bounds_in_window(window,
+                                                                                    elements_to_ignore=[city_scatter])
+        return prioritize_candidates(bounds, element_bounds, invalid_mask)
 
-            invalid_elements = [ve for ve in intersecting_elements if not isinstance(ve, Line)]
-            yield invalid_elements, TextBoxClassification.INVALID
+    def create_element_window(self, bounds: tuple, city_scatter) -> ElementWindow:
+        return self._rtree_manager.create_element_window(bounds, elements_to_ignore=[city_scatter])
 
-            self._best_fits.add_result(
-                num_intersections=len(intersecting_elements),
-                text_box=city_text_box,
-                intersects_non_starter=bool(invalid_elements)
-            )
+    @staticmethod
+    def _display_candidates(candidates: PerimeterCandidates, candidate_ids, intersections):
+        for i, candidate_id in enumerate(candidate_ids):
+            yield candidates.create_text_boxes([candidate_id], TextBoxClassification.SCAN), TextBoxClassification.SCAN
+            yield intersections.elements_for(i), TextBoxClassification.INTERSECT
+            yield intersections.invalid_elements_for(i), TextBoxClassification.INVALID
+
+    def evaluate_positions(self,
+                           candidates: PerimeterCandidates,
+                           element_window: ElementWindow,
+                           city_scatter,
+                           num_ranked: int,
+                           neighbors: tuple[np.ndarray, np.ndarray] = None,
+                           show_candidates: bool = False):
+        """
+        Intersections and scores for ranking candidates against each other.
+
+        Only candidates whose validity and intersection count could put them in the top num_ranked are scored, the
+        rest score -inf. neighbors are (row, element id) pairs to score against, found with a nearest query when not
+        given. Returns the intersections, the scores and the neighbors.
+        """
+        polygons = candidates.polygons
+        intersections = element_window.query_intersections(polygons)
+        if show_candidates:
+            yield from self._display_candidates(candidates, range(len(candidates)), intersections)
+
+        counts, invalid_flags = intersections.counts, intersections.invalid_flags
+        order = np.lexsort((counts, invalid_flags))
+        cutoff = order[min(num_ranked, len(order)) - 1]
+        contenders = np.flatnonzero((invalid_flags < invalid_flags[cutoff])
+                                    | ((invalid_flags == invalid_flags[cutoff]) & (counts <= counts[cutoff])))
+
+        if neighbors is None:
+            rows, element_ids = self._rtree_manager.nearest_element_ids(polygons[contenders],
+                                                                        elements_to_ignore=[city_scatter])
+            neighbors = contenders[rows], element_ids
+        else:
+            keep = np.isin(neighbors[0], contenders)
+            neighbors = neighbors[0][keep], neighbors[1][keep]
+        distances, invalid_mask = self._rtree_manager.element_distances(polygons, *neighbors)
+
+        scores = np.full(len(candidates), -np.inf)
+        scores[contenders] = score_finalists(distances[contenders], invalid_mask[contenders])
+        return intersections, scores, neighbors
+
+    def evaluate_candidates(self,
+                            candidates: PerimeterCandidates,
+                            candidate_ids: np.ndarray,
+                            city_scatter,
+                            ranking: _CandidateRanking,
+                            show_candidates: bool):
+        polygons = candidates.polygons[candidate_ids]
+        intersections = self._rtree_manager.query_intersections(polygons, elements_to_ignore=[city_scatter])
+        if show_candidates:
+            yield from self._display_candidates(candidates, candidate_ids, intersections)
+
+        counts, invalid_flags = intersections.counts, intersections.invalid_flags
+        finalists = select_finalists(counts, invalid_flags)
+        invalid, count = bool(invalid_flags[finalists[0]]), int(counts[finalists[0]])
+        # Distances are only measured for finalists that could still beat the best candidate so far
+        if not ranking.could_improve(invalid, count):
+            return
 
-        yield self._best_fits.fetch_best_fits(), TextBoxClassification.FINALIST
+        # Finalists are scored in ascending candidate id order so ties resolve the same in every batch
+        finalists = finalists[np.argsort(candidate_ids[finalists], kind='stable')]
+        distances, invalid_mask = self._rtree_manager.nearest_element_distances(polygons[finalists],
+                                                                               elements_to_ignore=[city_scatter])
+        ranking.update(candidate_ids[finalists], invalid, count, score_finalists(distances, invalid_mask))
 
 
 class TextboxPlacementAlgorithm:
@@ -96,107 +161,148 @@ class TextboxPlacementAlgorithm:
     def __init__(self,
                  rtree_manager: RtreeElementsManager,
                  city_buffer: int,
-                 number_of_search_steps: int):
+                 number_of_search_steps: int,
+                 show_candidates: bool = False,
+                 budget: PlacementBudget = None,
+                 city_max_seconds: float = None,
+                 city_max_evaluations: int = None,
+                 batch_size: int = 16,
+                 refinement_levels: int = 0,
+                 refinement_candidates: int = 3):
         self.text_box_resolver = _TextBoxCandidatesResolver(rtree_manager=rtree_manager)
         self.city_buffer = city_buffer
         self.number_of_search_steps = number_of_search_steps
+        # Per-candidate scan and intersection elements are only created when something will display them
+        self.show_candidates = show_candidates
 
-        self.best_fits = BestFits()
-
-    @staticmethod
-    def _orient_text_box_for_algorithm_start(text_box: box_geometry.BoxGeometry,
-                                             city_box: box_geometry.BoxGeometry):
-        # Text box to the right of city box
-        if text_box.x_max > city_box.x_max:
-            x_distance = text_box.x_max - city_box.x_min
-            text_box.move_box('left', x_distance)
-        # Text box to the left of city box
-        else:
-            x_distance = city_box.x_min - text_box.x_max
-            text_box.move_box('right', x_distance)
+        # Map-wide budget shared by every find_best_poly call, each city also gets its own limits within it
+        self.budget = budget or PlacementBudget()
+        self.city_max_seconds = city_max_seconds
+        self.city_max_evaluations = city_max_evaluations
+        # Candidates evaluated between budget checks
+        self.batch_size = batch_size
 
-        # Text box above city box
-        if text_box.y_max > city_box.y_max:
-            y_distance = text_box.y_max - city_box.y_min
-            text_box.move_box('down', y_distance)
-        else:
-            # Text box below city box
-            y_distance = city_box.y_min - text_box.y_max
-            text_box.move_box('up', y_distance)
-
-    @staticmethod
-    def _move_and_create_text_box(text_box, direction: Direction, distance, city_name):
-        text_box.move(direction=direction,
-                      distance=distance)
-        new_poly = PolygonFactory.create_rectangle(**text_box.bounds)
-        new_text_box = TextBox(poly=new_poly,
-                               text=city_name)
-        return new_text_box
+        # With refinement levels, number_of_search_steps positions form a coarse ring and each level halves the
+        # spacing around the best refinement_candidates positions of the level before
+        self.refinement_levels = refinement_levels
+        self.refinement_candidates = refinement_candidates
 
     def _create_surrounding_text_boxes(self,
                                        city_scatter_element,
                                        text_box
-                                       ) -> list[TextBox]:
-        city_scatter_bounds = polygon_functions.fetch_bounds(polygon=city_scatter_element.algorithm_poly)
-        city_box = BoxGeometry(dimensions=city_scatter_bounds)
-        city_box.add_buffer(self.city_buffer)
-
-        self._orient_text_box_for_algorithm_start(text_box=text_box,
-                                                  city_box=city_box)
-
-        box_width = text_box.x_max - text_box.x_min
-        box_height = text_box.y_max - text_box.y_min
-
-        city_perimeter = (2 * box_height) + (2 * box_width)
-        perimeter_movement_amount = city_perimeter / self.number_of_search_steps
-
-        city_text_boxes = []
-
-        while text_box.x_min < city_box.x_max:
-            text_box = self._move_and_create_text_box(text_box=text_box,
-                                                      direction=Direction.RIGHT,
-                                                      distance=min(perimeter_movement_amount, box_width),
-                                                      city_name=city_name)
-            city_text_boxes.append(text_box)
-
-        while text_box.y_min < city_box.y_max:
-            text_box = self._move_and_create_text_box(text_box=text_box,
-                                                      direction=Direction.UP,
-                                                      distance=min(perimeter_movement_amount, box_height),
-                                                      city_name=city_name)
-            city_text_boxes.append(text_box)
-
-        while text_box.x_max > city_box.x_min:
-            text_box = self._move_and_create_text_box(text_box=text_box,
-                                                      direction=Direction.LEFT,
-                                                      distance=min(perimeter_movement_amount, box_width),
-                                                      city_name=city_name)
-            city_text_boxes.append(text_box)
-
-        while text_box.y_max > city_box.y_min:
-            text_box = self._move_and_create_text_box(text_box=text_box,
-                                                      direction=Direction.DOWN,
-                                                      distance=min(perimeter_movement_amount, box_height),
-                                                      city_name=city_name)
-            city_text_boxes.append(text_box)
-
-        return city_text_boxes
+                                       ) -> PerimeterCandidates:
+        bounds = perimeter_candidate_bounds(city_bounds=city_scatter_element.polygon.bounds,
+                                            text_width=text_box.x_max - text_box.x_min,
+                                            text_height=text_box.y_max - text_box.y_min,
+                                            city_buffer=self.city_buffer,
+                                            number_of_search_steps=self.number_of_search_steps)
+        city_name = city_scatter_element.algorithm_attributes.get('city_name')
+        return PerimeterCandidates(city_name=city_name, bounds=bounds)
+
+    def _create_batches(self, candidates: PerimeterCandidates, city_scatter, city_budget: PlacementBudget) -> list:
+        if not city_budget.is_limited:
+            # Exhaustive, every candidate in one batch
+            return [np.arange(len(candidates))]
+
+        order = self.text_box_resolver.order_candidates(candidates, city_scatter)
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def _find_best_poly_coarse_to_fine(self,
+                                       text_box: 'box_geometry.BoxGeometry',
+                                       city_scatter: CityScatter):
+        path = PerimeterPath(city_bounds=city_scatter.polygon.bounds,
+                             text_width=text_box.x_max - text_box.x_min,
+                             text_height=text_box.y_max - text_box.y_min,
+                             city_buffer=self.city_buffer)
+        city_name = city_scatter.algorithm_attributes.get('city_name')
+        city_budget = self.budget.for_city(max_seconds=self.city_max_seconds,
+                                           max_evaluations=self.city_max_evaluations)
+        ranking = _CandidateRanking()
+
+        # Every level stays on the same path, so one window query serves all of them
+        element_window = self.text_box_resolver.create_element_window(path.window, city_scatter)
+
+        steps = self.number_of_search_steps
+        offsets = path.length / steps * np.arange(steps)
+        neighbors = None
+        evaluated_offsets = []
+        for level in range(self.refinement_levels + 1):
+            if level > 0 and city_budget.expired:
+                logging.info(f"Placement budget ran out for {city_name} after {level} of "
+                             f"{self.refinement_levels + 1} levels, using the best so far.")
+                break
+
+            candidates = PerimeterCandidates(city_name=city_name, bounds=path.bounds_at(offsets))
+            intersections, scores, (rows, element_ids) = yield from self.text_box_resolver.evaluate_positions(
+                candidates=candidates,
+                element_window=element_window,
+                city_scatter=city_scatter,
+                num_ranked=self.refinement_candidates,
+                neighbors=neighbors,
+                show_candidates=self.show_candidates)
+            city_budget.record(len(candidates))
+
+            # Position ids carry on across levels, so ties go to the position evaluated first
+            counts, invalid_flags = intersections.counts, intersections.invalid_flags
+            position_ids = len(evaluated_offsets) + np.arange(len(offsets))
+            evaluated_offsets.extend(offsets)
+            order = np.lexsort((position_ids, -scores, counts, invalid_flags))
+            best = order[:1]
+            ranking.update(position_ids[best], bool(invalid_flags[best[0]]), int(counts[best[0]]), scores[best])
+            if ranking.is_optimal or level == self.refinement_levels:
+                break
+
+            # Children either side of the best few positions, keeping one child where two parents' children meet
+            steps *= 2
+            parents = order[:self.refinement_candidates]
+            parent_ids = np.concatenate([parents, parents])
+            # Positions sit on a grid of path.length / steps, parents land on even grid ids and children on odd
+            parent_grid_ids = np.rint(offsets[parents] / path.length * steps)
+            grid_ids = np.concatenate([parent_grid_ids - 1, parent_grid_ids + 1])
+            grid_ids, unique_ids = np.unique(np.mod(grid_ids, steps), return_index=True)
+            offsets = path.length / steps * grid_ids
+            # Children are scored against their parent's nearest elements instead of running a new nearest query
+            neighbors = inherit_neighbors(rows, element_ids, num_parents=len(candidates),
+                                          parent_ids=parent_ids[unique_ids])
+
+        best_offset = evaluated_offsets[ranking.best_candidate_id]
+        best_candidates = PerimeterCandidates(city_name=city_name, bounds=path.bounds_at([best_offset]))
+        yield best_candidates.create_text_boxes([0], TextBoxClassification.BEST), TextBoxClassification.BEST
 
     def find_best_poly(self,
-                       text_box: box_geometry.BoxGeometry,
+                       text_box: 'box_geometry.BoxGeometry',
                        city_scatter: CityScatter,
                        ):
-        finalists = []
-
-        city_text_boxes = self._create_surrounding_text_boxes(text_box=text_box,
-                                                              city_scatter_element=city_scatter)
-
-        for elements, classification in self.text_box_resolver.determine_text_box_finalists(city_text_boxes=city_text_boxes):
-            # We don't display finalists until we are determining the best finalist
-            if classification == TextBoxClassification.FINALIST:
-                finalists.extend(elements)
-            else:
-                yield elements, classification
+        if self.refinement_levels > 0:
+            yield from self._find_best_poly_coarse_to_fine(text_box=text_box, city_scatter=city_scatter)
+            return
 
-        for elements, classification in self.text_box_resolver.determine_best_finalist(finalists):
-            yield elements, classification
+        candidates = self._create_surrounding_text_boxes(text_box=text_box,
+                                                         city_scatter_element=city_scatter)
+        city_budget = self.budget.for_city(max_seconds=self.city_max_seconds,
+                                           max_evaluations=self.city_max_evaluations)
+        ranking = _CandidateRanking()
+
+        for batch_number, candidate_ids in enumerate(self._create_batches(candidates, city_scatter, city_budget)):
+            # The first batch always runs so every city gets a text box, even on a spent budget
+            if batch_number > 0:
+                if city_budget.expired:
+                    logging.info(f"Placement budget ran out for {candidates.city_name} after "
+                                 f"{city_budget.evaluations} of {len(candidates)} candidates, using the best so far.")
+                    break
+                remaining = city_budget.remaining_evaluations
+                if remaining is not None:
+                    candidate_ids = candidate_ids[:remaining]
+
+            yield from self.text_box_resolver.evaluate_candidates(candidates=candidates,
+                                                                  candidate_ids=candidate_ids,
+                                                                  city_scatter=city_scatter,
+                                                                  ranking=ranking,
+                                                                  show_candidates=self.show_candidates)
+            city_budget.record(len(candidate_ids))
+
+            if ranking.is_optimal:
+                break
+
+        yield candidates.create_text_boxes([ranking.best_candidate_id], TextBoxClassification.BEST), \
+            TextBoxClassification.BEST
@@ -1,2 +0,0 @@
-from .visualization_element_filler import VisualizationElementFiller
-